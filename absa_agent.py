@@ -3,16 +3,26 @@ import json
 import argparse
 import uuid
 from typing import List, Optional
-from langgraph.graph import StateGraph, END
 from nodes.state import GraphState
-from nodes.generate_query import generate_query_node
-from nodes.retrieval import retrieval_node
-from nodes.extract import extract_and_detect_node
-from nodes.repair import repair_reviews_node
-from nodes.verify import verify_reviews_node
+from nodes.frontier import URLFrontier, canonicalize_url, CRAWL_ORDERS
 from helpers import save_json
+from monitor import summarize_metrics
+import profiling
+from checkpoint import CrawlCheckpointer
+from budget import get_budget, EnergyCharger
+from dedup import get_dedup_index, DedupRecorder, superseded, apply_replacements
+from fingerprint import get_fingerprint_store
+from sink import ReviewSink, STREAM_FILE
+from store import write_session, partition_path, iter_jsonl
 from const import (DEFAULT_LLM_URL, DEFAULT_LLM_MODEL, DEFAULT_REASONING_MODEL, 
-                   DEFAULT_TEMPERATURE, DEFAULT_MAX_REVIEWS, DEFAULT_LANGUAGE, DEFAULT_RETRIEVER_MAX_RESULTS)
+                   DEFAULT_TEMPERATURE, DEFAULT_MAX_REVIEWS, DEFAULT_LANGUAGE, DEFAULT_RETRIEVER_MAX_RESULTS,
+                   DEFAULT_PROMPT_LAYOUT, DEFAULT_FAN_OUT, DEFAULT_CRAWL_ORDER,
+                   DEFAULT_MAX_PAGES_PER_DOMAIN, DEFAULT_DOMAIN_PRUNE_AFTER, DEFAULT_STREAM_OUTPUT,
+                   DEFAULT_PIPELINE, PIPELINE_FETCH_WORKERS, DEFAULT_DEADLINE_SECONDS, DEFAULT_MAX_LLM_CALLS,
+                   DEFAULT_MAX_PROMPT_TOKENS, DEFAULT_MAX_FETCHED_BYTES, DEFAULT_MAX_ENERGY_JOULES,
+                   SEARCH_CACHE_TTL_SECONDS, DEFAULT_PROFILE,
+                   DEFAULT_DEDUP, DEFAULT_PAGE_FINGERPRINT, DEFAULT_FINGERPRINT_REUSE, PROMPT_LAYOUTS,
+                   DEFAULT_RESULTS_STORE)
 from dotenv import load_dotenv
 
 # Load explicitly
@@ -26,61 +36,158 @@ DEFAULT_CONFIG = {
     "llm_url": os.getenv("LLM_URL", DEFAULT_LLM_URL),
     "llm_temperature": float(os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE)),
     "retriever_max_results": int(os.getenv("RETRIEVER_MAX_RESULTS", DEFAULT_RETRIEVER_MAX_RESULTS)),
+    "search_cache_ttl": float(os.getenv("SEARCH_CACHE_TTL", SEARCH_CACHE_TTL_SECONDS)),
+    "stream_search": os.getenv("STREAM_SEARCH", "false").lower() in ("1", "true", "yes"),
     "max_reviews": int(os.getenv("MAX_REVIEWS", DEFAULT_MAX_REVIEWS)),
     "language": os.getenv("LANGUAGE", DEFAULT_LANGUAGE),
+    "prompt_layout": os.getenv("PROMPT_LAYOUT", DEFAULT_PROMPT_LAYOUT),
+    "session_id": None,
     "forbidden_urls": ["opentable.com"],
     "skip_reformulation": False,
     "initial_urls": [],
-    "disable_discovery": False
+    "disable_discovery": False,
+    "fan_out": int(os.getenv("FAN_OUT", DEFAULT_FAN_OUT)),
+    "pipeline": os.getenv("PIPELINE", str(DEFAULT_PIPELINE)).lower() in ("1", "true", "yes"),
+    "pipeline_fetch_workers": int(os.getenv("PIPELINE_FETCH_WORKERS", PIPELINE_FETCH_WORKERS)),
+    "crawl_order": os.getenv("CRAWL_ORDER", DEFAULT_CRAWL_ORDER),
+    "max_pages_per_domain": int(os.getenv("MAX_PAGES_PER_DOMAIN", DEFAULT_MAX_PAGES_PER_DOMAIN)),
+    "domain_prune_after": int(os.getenv("DOMAIN_PRUNE_AFTER", DEFAULT_DOMAIN_PRUNE_AFTER)),
+    # Run budgets (0 = unlimited)
+    "deadline_seconds": float(os.getenv("DEADLINE_SECONDS", DEFAULT_DEADLINE_SECONDS)),
+    "max_llm_calls": int(os.getenv("MAX_LLM_CALLS", DEFAULT_MAX_LLM_CALLS)),
+    "max_prompt_tokens": int(os.getenv("MAX_PROMPT_TOKENS", DEFAULT_MAX_PROMPT_TOKENS)),
+    "max_fetched_bytes": int(os.getenv("MAX_FETCHED_BYTES", DEFAULT_MAX_FETCHED_BYTES)),
+    "max_energy_joules": float(os.getenv("MAX_ENERGY_JOULES", DEFAULT_MAX_ENERGY_JOULES)),
+    "stream_output": os.getenv("STREAM_OUTPUT", str(DEFAULT_STREAM_OUTPUT)).lower() in ("1", "true", "yes"),
+    "profile": os.getenv("PROFILE", str(DEFAULT_PROFILE)).lower() in ("1", "true", "yes"),
+    "dedup": os.getenv("DEDUP", str(DEFAULT_DEDUP)).lower() in ("1", "true", "yes"),
+    "fingerprint": os.getenv("PAGE_FINGERPRINT", str(DEFAULT_PAGE_FINGERPRINT)).lower() in ("1", "true", "yes"),
+    "fingerprint_reuse": os.getenv("FINGERPRINT_REUSE", str(DEFAULT_FINGERPRINT_REUSE)).lower() in ("1", "true", "yes"),
+    "results_store": os.getenv("RESULTS_STORE", str(DEFAULT_RESULTS_STORE)).lower() in ("1", "true", "yes")
 }
 
 
-def create_graph(config_dict: dict):
-    """Constructs the agentic LangGraph workflow based on the provided configuration."""
+def with_listeners(name: str, node, listeners: list):
+    """Wraps a node so that every listener sees its update once the node has finished.
+
+    A listener may return a replacement update (e.g. the review sink drops streamed reviews).
+    """
+    if not listeners:
+        return node
+
+    def wrapped(state):
+        update = node(state)
+        for listener in listeners:
+            update = listener.on_update(name, state, update) or update
+        return update
+
+    wrapped.__name__ = getattr(node, "__name__", name)
+    return wrapped
+
+
+def get_loop_nodes(config_dict: dict):
+    """Returns the (head, tail) nodes of the crawl loop for the configured execution mode."""
+    if config_dict.get("pipeline"):
+        return "pipeline", "pipeline"
+    if config_dict.get("fan_out", DEFAULT_FAN_OUT) > 1:
+        return "schedule", "merge"
+    return "extract", "verify"
+
+
+def create_graph(config_dict: dict, listeners: Optional[list] = None, entry_point: Optional[str] = None):
+    """Constructs the agentic LangGraph workflow based on the provided configuration.
+
+    listeners: objects with on_update(node, state, update), e.g. the run checkpointer.
+    entry_point: overrides the config-driven entry node (used when resuming a run).
+    """
+    # LangGraph, the LLM client and the nodes' dependencies are only loaded once a graph is built
+    # (keeps --help, argument errors and imports of DEFAULT_CONFIG/save_results fast)
+    from langgraph.graph import StateGraph, END
+    from nodes.generate_query import generate_query_node
+    from nodes.retrieval import retrieval_node
+    from nodes.extract import extract_and_detect_node
+    from nodes.repair import repair_reviews_node
+    from nodes.verify import verify_reviews_node
+    from nodes.pipeline import make_pipeline_node
+    from nodes.fan_out import schedule_node, dispatch_branches, process_url_node, merge_branches_node
+    from nodes.prompts import get_prompt_registry
+
+    # Load and validate all prompt templates and schemas once, before any node runs
+    get_prompt_registry()
+    if config_dict.get("profile"):
+        profiling.enable()
+
     workflow = StateGraph(GraphState)
+    # The run budgets are charged with the energy of every finished step (before the checkpointer
+    # journals their usage); accepted reviews are registered for the duplicate check before the
+    # sink and the checkpointer see them
+    recorder = [DedupRecorder()] if config_dict.get("dedup", DEFAULT_DEDUP) else []
+    listeners = [EnergyCharger()] + recorder + (listeners or [])
+
+    def add_node(name, node):
+        workflow.add_node(name, with_listeners(name, node, listeners))
 
     # Adding nodes
-    workflow.add_node("generate_query", generate_query_node)
-    workflow.add_node("retrieval", retrieval_node)
-    workflow.add_node("extract", extract_and_detect_node)
-    workflow.add_node("repair", repair_reviews_node)
-    workflow.add_node("verify", verify_reviews_node)
+    add_node("generate_query", generate_query_node)
+    add_node("retrieval", retrieval_node)
+
+    # Pipeline mode: one node runs all pages through concurrent stages.
+    # Fan-out mode: each superstep processes up to N URLs in parallel branches (map-reduce)
+    loop_head, loop_tail = get_loop_nodes(config_dict)
 
     # Building Flow using config-driven entry points
-    if config_dict.get("initial_urls"):
+    workflow.add_edge("generate_query", "retrieval")
+    if entry_point:
+        # Resumed runs continue after the last checkpointed node
+        workflow.set_entry_point(entry_point)
+    elif config_dict.get("initial_urls"):
         # If seed URLs are provided, we start directly at the extraction/discovery phase
-        workflow.set_entry_point("extract")
+        workflow.set_entry_point(loop_head)
     elif config_dict.get("skip_reformulation"):
         # If reformulation is disabled, we skip the query optimization agent
         workflow.set_entry_point("retrieval")
     else:
         # Standard flow: Reformulate -> Search -> Extract
         workflow.set_entry_point("generate_query")
-        workflow.add_edge("generate_query", "retrieval")
 
     # Connect retrieval result to the loop
-    workflow.add_edge("retrieval", "extract")
-
-    def check_extraction_results(state: GraphState):
-        """Routing logic: If no reviews extracted, skip repair and go to verification side-effects."""
-        if not state.get("temp_reviews"):
-            return "skip_to_router"
-        return "process_reviews"
-
-    workflow.add_conditional_edges(
-        "extract",
-        check_extraction_results,
-        {
-            "process_reviews": "repair",
-            "skip_to_router": "verify"
-        }
-    )
-
-    workflow.add_edge("repair", "verify")
+    workflow.add_edge("retrieval", loop_head)
+
+    if loop_head == "pipeline":
+        # The pipeline reports each finished page to the listeners itself
+        workflow.add_node("pipeline", make_pipeline_node(listeners))
+    elif loop_head == "schedule":
+        # schedule -> N x process_url (extract -> repair -> verify) -> merge
+        add_node("schedule", schedule_node)
+        add_node("process_url", process_url_node)
+        add_node("merge", merge_branches_node)
+        workflow.add_conditional_edges("schedule", dispatch_branches, ["process_url"])
+        workflow.add_edge("process_url", "merge")
+    else:
+        add_node("extract", extract_and_detect_node)
+        add_node("repair", repair_reviews_node)
+        add_node("verify", verify_reviews_node)
+
+        def check_extraction_results(state: GraphState):
+            """Routing logic: If no reviews extracted, skip repair and go to verification side-effects."""
+            if not state.get("temp_reviews"):
+                return "skip_to_router"
+            return "process_reviews"
+
+        workflow.add_conditional_edges(
+            "extract",
+            check_extraction_results,
+            {
+                "process_reviews": "repair",
+                "skip_to_router": "verify"
+            }
+        )
+
+        workflow.add_edge("repair", "verify")
 
     def router(state: GraphState):
-        """BFS termination logic: Stop if limit reached or discovery queue is empty."""
-        current_count = len(state.get("reviews", []))
+        """BFS termination logic: Stop if limit reached, a run budget is exhausted or discovery queue is empty."""
+        current_count = state.get("review_count", 0)
         max_req = state.get("max_reviews", state["config"].get("max_reviews", DEFAULT_MAX_REVIEWS))
 
         if current_count >= max_req:
@@ -88,6 +195,10 @@ def create_graph(config_dict: dict):
                 f"--- LIMIT REACHED ({current_count}/{max_req}). STOPPING. ---")
             return END
 
+        if get_budget(state["config"]).exhausted():
+            print("--- BUDGET EXHAUSTED. STOPPING. ---")
+            return END
+
         if not state.get("found_review_urls"):
             print("--- QUEUE EMPTY. STOPPING. ---")
             return END
@@ -95,10 +206,10 @@ def create_graph(config_dict: dict):
         return "continue"
 
     workflow.add_conditional_edges(
-        "verify",
+        loop_tail,
         router,
         {
-            "continue": "extract",
+            "continue": loop_head,
             END: END
         }
     )
@@ -106,26 +217,91 @@ def create_graph(config_dict: dict):
     return workflow.compile()
 
 
-def save_results(state, session_id):
-    """Saves the final results using the helper utility."""
-    reviews = state.get("reviews", [])
-    relevance_results = state.get("relevance_results", [])
-    step_metrics = state.get("step_metrics", [])
+def get_resume_point(state: dict, last_node: Optional[str]) -> Optional[str]:
+    """Returns the node a checkpointed run continues with, or None if nothing is left to do."""
+    from langgraph.graph import END
+
+    config = state["config"]
+    loop_head, _ = get_loop_nodes(config)
+    if last_node is None:
+        return None  # Not even the first node finished: start over with the normal entry point
+    if last_node == "generate_query":
+        return "retrieval"
+    if last_node == "extract" and state.get("temp_reviews"):
+        return "repair"
+    if last_node in ("extract", "repair"):
+        return "verify"
+
+    # After 'retrieval', 'verify', 'merge' and 'pipeline' the router decides whether the loop continues
+    max_req = state.get("max_reviews", config.get("max_reviews", DEFAULT_MAX_REVIEWS))
+    if (state.get("review_count", 0) >= max_req or not state.get("found_review_urls")
+            or get_budget(config).exhausted()):
+        return END
+    return loop_head
+
+
+def get_stop_reason(state: dict) -> str:
+    """Why the run ended: 'max_reviews', 'budget:<name>' or 'queue_empty'."""
+    config = state.get("config", {})
+    max_req = state.get("max_reviews", config.get("max_reviews", DEFAULT_MAX_REVIEWS))
+    if state.get("review_count", 0) >= max_req:
+        return "max_reviews"
+    exhausted = get_budget(config).exhausted()
+    if exhausted:
+        return f"budget:{exhausted}"
+    return "queue_empty"
+
+
+def save_results(state, session_id, sink: Optional[ReviewSink] = None):
+    """Saves the final results using the helper utility.
+
+    With a streaming sink the reviews are already in 'reviews.jsonl'; only summary and metrics are added.
+    Snippets replaced by their complete version (see DedupIndex) are dropped from the saved reviews;
+    the stream keeps both, the complete one with its 'replaces' marker.
+    """
+    # Append-only logs are materialized as plain lists for JSON
+    reviews = list(state.get("reviews", []))
+    reviews = list(apply_replacements(reviews, superseded(reviews)))
+    relevance_results = list(state.get("relevance_results", []))
+    step_metrics = list(state.get("step_metrics", []))
+    frontier = state.get("found_review_urls")
 
     folder_path = f"results/{session_id}"
 
     # Structure of the output matches the previous version but uses save_json helper
-    save_json({
+    output = {
         "reviews": reviews,
         "metrics": step_metrics,
         "summary": {
-            "total_reviews": len(reviews),
-            "total_duration": sum(m["duration"] for m in step_metrics) if step_metrics else 0,
-            "total_avg_wattage": sum(m["avg_gpu_power_watts"] for m in step_metrics) / len(step_metrics) if step_metrics else 0
+            "total_reviews": state.get("review_count", len(reviews)),
+            **summarize_metrics(step_metrics, state.get("review_count", len(reviews))),
+            "language_rejected": sum(m.get("language_rejected", 0) for m in step_metrics),
+            "dedup": get_dedup_index(state.get("config", {})).summary(),
+            "page_fingerprints": get_fingerprint_store().summary(state.get("config", {}).get("session_id")),
+            "stop_reason": get_stop_reason(state),
+            "budget": get_budget(state.get("config", {})).summary(),
+            "frontier": frontier.summary() if isinstance(frontier, URLFrontier) else {}
         }
-    }, folder_path, "reviews.json")
+    }
+    if profiling.enabled():
+        # Span histograms are process-wide (a batch reports the spans of all its runs so far)
+        output["profile"] = profiling.profiler.snapshot()
+        profiling.profiler.write_prometheus(folder_path)
+    if sink:
+        sink.close()
+        del output["reviews"]
+        output["reviews_file"] = STREAM_FILE
+    save_json(output, folder_path, "reviews.json")
 
     save_json(relevance_results, folder_path, "relevance_url.json")
+
+    if state.get("config", {}).get("results_store", DEFAULT_RESULTS_STORE):
+        # Streamed reviews are read back from the stream file one at a time
+        rows = apply_replacements(iter_jsonl(sink.path), superseded(iter_jsonl(sink.path))) if sink else reviews
+        counts = write_session(partition_path(session_id), session_id, state.get("topic"), rows, step_metrics,
+                               relevance_results, output["summary"])
+        print(f"  [STORE] {counts['reviews']} reviews, {counts['step_metrics']} step metrics and "
+              f"{counts['relevance']} relevance results written to {partition_path(session_id)}")
     print(f"\n--- SUCCESS: Results saved to {folder_path} ---")
 
 
@@ -133,9 +309,13 @@ def main():
     parser = argparse.ArgumentParser(
         description="Autonomous ABSA Scraper Agent")
     parser.add_argument(
-        "topic", help="The research topic or entity to scrape reviews for")
+        "topic", nargs="?", help="The research topic or entity to scrape reviews for")
     parser.add_argument(
         "--id", help="Session ID for result folder naming", default=uuid.uuid4().hex[:8])
+    parser.add_argument("--resume", metavar="ID",
+                        help="Resume the interrupted run with this session ID from its last checkpoint")
+    parser.add_argument("--no_checkpoint", action="store_true",
+                        help="Do not write the run journal (the run cannot be resumed)")
     parser.add_argument("--max_reviews", type=int, default=DEFAULT_CONFIG["max_reviews"],
                         help="Target number of reviews to collect")
     parser.add_argument("--language", type=str, default=DEFAULT_CONFIG["language"],
@@ -148,6 +328,43 @@ def main():
                         help="Skip LLM query reformulation step")
     parser.add_argument("--disable_discovery", action="store_true",
                         help="Disable hyperlink/pagination discovery")
+    parser.add_argument("--stream_search", action="store_true",
+                        help="Start extracting after the first page of search results; the rest is queued as it arrives")
+    parser.add_argument("--search_cache_ttl", type=float,
+                        help="Max age in seconds of cached search results (0 disables the cache)")
+
+    parser.add_argument("--fan_out", type=int,
+                        help="Number of URLs processed in parallel per superstep (default: 1, serial)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run fetch, extract, repair and verify as concurrent stages over different pages")
+    parser.add_argument("--crawl_order", choices=CRAWL_ORDERS,
+                        help="Frontier order: 'fifo' (BFS) or 'best_first' (by observed domain review yield)")
+    parser.add_argument("--max_pages_per_domain", type=int,
+                        help="Max pages fetched per domain (0 = unlimited)")
+    parser.add_argument("--prune_after", type=int,
+                        help="Prune domains after N fetched pages without verified reviews (0 = never)")
+    parser.add_argument("--stream_output", action="store_true",
+                        help="Append verified reviews to reviews.jsonl as they are accepted (flat memory use)")
+    parser.add_argument("--no_dedup", action="store_true",
+                        help="Keep near-duplicate reviews and snippets (no MinHash/LSH dedup after extraction)")
+    parser.add_argument("--results_store", action="store_true",
+                        help="Also write the results to the session's SQLite partition (query/merge with store.py)")
+    parser.add_argument("--no_fingerprint", action="store_true",
+                        help="Analyze every page, even near-duplicates of pages already analyzed in this run")
+    parser.add_argument("--reuse_fingerprints", action="store_true",
+                        help="Reuse the analysis of near-identical pages from earlier runs of the topic "
+                             "(same models, prompt layout and language only)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record latency histograms of fetch, HTML cleaning, LLM calls and language detection")
+    parser.add_argument("--prompt_layout", choices=PROMPT_LAYOUTS,
+                        help="Prompt layout ('prefix_stable' puts variable content last for prompt-prefix reuse)")
+
+    # Run budgets (0 = unlimited); the run stops and saves partial results when one runs out
+    parser.add_argument("--deadline", type=float, help="Wall-clock deadline of the run in seconds")
+    parser.add_argument("--max_llm_calls", type=int, help="Max number of LLM calls")
+    parser.add_argument("--max_prompt_tokens", type=int, help="Max total prompt tokens")
+    parser.add_argument("--max_fetched_bytes", type=int, help="Max bytes fetched from the network")
+    parser.add_argument("--max_joules", type=float, help="Max GPU energy in joules")
 
     # Advanced LLM overrides
     parser.add_argument(
@@ -156,6 +373,15 @@ def main():
                         help="Override LLM temperature (0.0 to 1.0)")
 
     args = parser.parse_args()
+    if not args.topic and not args.resume:
+        parser.error("a topic is required unless --resume is given")
+    if args.resume and args.no_checkpoint:
+        parser.error("--no_checkpoint cannot be combined with --resume (resuming reads and extends the journal)")
+
+    checkpointer = None if args.no_checkpoint else CrawlCheckpointer()
+    if args.resume:
+        resume_run(args.resume, checkpointer)
+        return
 
     # Consolidate configuration
     config = DEFAULT_CONFIG.copy()
@@ -169,36 +395,119 @@ def main():
         config["skip_reformulation"] = True
     if args.disable_discovery:
         config["disable_discovery"] = True
+    if args.stream_search:
+        config["stream_search"] = True
+    if args.search_cache_ttl is not None:
+        config["search_cache_ttl"] = args.search_cache_ttl
     if args.model:
         config["llm_model"] = args.model
     if args.temp is not None:
         config["llm_temperature"] = args.temp
+    if args.fan_out:
+        config["fan_out"] = args.fan_out
+    if args.pipeline:
+        config["pipeline"] = True
+    if args.crawl_order:
+        config["crawl_order"] = args.crawl_order
+    if args.max_pages_per_domain is not None:
+        config["max_pages_per_domain"] = args.max_pages_per_domain
+    if args.prune_after is not None:
+        config["domain_prune_after"] = args.prune_after
+    if args.prompt_layout:
+        config["prompt_layout"] = args.prompt_layout
+    if args.stream_output:
+        config["stream_output"] = True
+    if args.profile:
+        config["profile"] = True
+    if args.no_dedup:
+        config["dedup"] = False
+    if args.no_fingerprint:
+        config["fingerprint"] = False
+    if args.reuse_fingerprints:
+        config["fingerprint_reuse"] = True
+    if args.results_store:
+        config["results_store"] = True
+    for key, value in (("deadline_seconds", args.deadline), ("max_llm_calls", args.max_llm_calls),
+                       ("max_prompt_tokens", args.max_prompt_tokens),
+                       ("max_fetched_bytes", args.max_fetched_bytes), ("max_energy_joules", args.max_joules)):
+        if value is not None:
+            config[key] = value
+
+    config["session_id"] = args.id
+    get_budget(config)  # Starts the deadline clock before the first node (query generation, model load)
+
+    # The checkpointer journals reviews before the sink takes them out of the state
+    sink = ReviewSink(f"results/{args.id}").open() if config["stream_output"] else None
+    listeners = [listener for listener in (checkpointer, sink) if listener]
 
     # Compile the graph with current config
-    app = create_graph(config)
+    app = create_graph(config, listeners=listeners)
 
     # Initialize state with consolidated settings
-    initial_state = {
-        "query": args.topic,
-        "max_reviews": args.max_reviews,
+    initial_state = build_initial_state(args.topic, args.max_reviews, config)
+
+    # Execute workflow
+    print(f"--- STARTING RUN ({args.id}) ---")
+    if checkpointer:
+        checkpointer.start(initial_state)
+    final_state = app.invoke(initial_state)
+
+    # Persist data
+    save_results(final_state, args.id, sink)
+    if checkpointer:
+        checkpointer.finish(args.id)
+
+
+def build_initial_state(topic: str, max_reviews: int, config: dict) -> dict:
+    """Initial graph state for one topic (config must carry the run's session_id)."""
+    return {
+        "query": topic,
+        "topic": topic,
+        "max_reviews": max_reviews,
         "retrieved_content": [],
         "relevant_ids": [],
         "reviews": [],
+        "review_count": 0,
         "temp_reviews": [],
-        "seed_urls": config["initial_urls"],         # Track origins
-        "found_review_urls": config["initial_urls"],  # Seed queue
+        "seed_urls": [canonicalize_url(u) for u in config["initial_urls"]],  # Track origins
+        "found_review_urls": URLFrontier.from_config(config, config["initial_urls"]),  # Seed queue
         "visited_urls": [],
         "relevance_results": [],
         "step_metrics": [],
         "config": config  # Pass config to nodes via state
     }
 
-    # Execute workflow
-    print(f"--- STARTING RUN ({args.id}) ---")
-    final_state = app.invoke(initial_state)
 
-    # Persist data
-    save_results(final_state, args.id)
+def resume_run(session_id: str, checkpointer: CrawlCheckpointer):
+    """Continues an interrupted run from its journal and saves the results."""
+    from langgraph.graph import END
+
+    if not checkpointer.exists(session_id):
+        raise SystemExit(f"No checkpoint found for session '{session_id}' in {checkpointer.root}")
+
+    state, last_node, finished, budget = checkpointer.load(session_id)
+    if budget:
+        # The deadline and the usage counters continue where the interrupted run stopped
+        get_budget(state["config"]).restore(budget)
+    # Reviews accepted before the interruption still count as seen for the duplicate check
+    get_dedup_index(state["config"]).seed(state.get("reviews", []))
+    entry_point = get_resume_point(state, last_node)
+    print(f"--- RESUMING RUN ({session_id}) at '{entry_point or 'start'}' ---")
+
+    sink = None
+    if state["config"].get("stream_output"):
+        # Rewrite the stream from the journal (its unsynced tail may have been lost in the crash)
+        sink = ReviewSink(f"results/{session_id}").open(state.get("reviews", []))
+        state["reviews"] = []
+
+    if not finished and entry_point != END:
+        listeners = [listener for listener in (checkpointer, sink) if listener]
+        app = create_graph(state["config"], listeners=listeners, entry_point=entry_point)
+        state = app.invoke(state)
+
+    save_results(state, session_id, sink)
+    if not finished:
+        checkpointer.finish(session_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+import time
+import uuid
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from absa_agent import DEFAULT_CONFIG, create_graph, build_initial_state, save_results, get_stop_reason
+from checkpoint import CrawlCheckpointer
+from sink import SessionSinks
+from budget import get_budget
+from helpers import save_json
+from const import DEFAULT_BATCH_CONCURRENCY
+
+
+class BatchRunner:
+    """Runs many topics concurrently in one process with a single compiled graph.
+
+    All topics share the configuration, the compiled graph and the in-process caches (fetched
+    pages, parsed page texts, LLM clients, prompt registry). Each topic is its own session:
+    results go to results/<session_id> exactly as with absa_agent.py, budgets and checkpoints
+    are kept per session.
+    """
+
+    def __init__(self, config: Optional[dict] = None, concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                 checkpoint: bool = True):
+        self.config = dict(config or DEFAULT_CONFIG)
+        self.concurrency = max(1, concurrency)
+        self.checkpointer = CrawlCheckpointer() if checkpoint else None
+        self.sinks = SessionSinks() if self.config.get("stream_output") else None
+        listeners = [listener for listener in (self.checkpointer, self.sinks) if listener]
+        self.app = create_graph(self.config, listeners=listeners)
+
+    def run_topic(self, session_id: str, topic: str, max_reviews: int) -> dict:
+        """Runs one topic to completion and saves its results; never raises."""
+        config = {**self.config, "session_id": session_id, "max_reviews": max_reviews}
+        start = time.time()
+        get_budget(config)  # Starts the deadline clock of this session
+        report = {"session_id": session_id, "topic": topic}
+        try:
+            sink = self.sinks.open(session_id, f"results/{session_id}") if self.sinks else None
+            state = build_initial_state(topic, max_reviews, config)
+            print(f"--- STARTING RUN ({session_id}): {topic} ---")
+            if self.checkpointer:
+                self.checkpointer.start(state)
+            final_state = self.app.invoke(state)
+            save_results(final_state, session_id, sink)
+            if self.checkpointer:
+                self.checkpointer.finish(session_id)
+            report.update({
+                "reviews": final_state.get("review_count", 0),
+                "pages": len(final_state.get("visited_urls", [])),
+                "llm_calls": int(get_budget(config).used["llm_calls"]),
+                "stop_reason": get_stop_reason(final_state),
+            })
+        except Exception as e:
+            print(f"  [BATCH] Run {session_id} failed: {e}")
+            report["error"] = str(e)
+        finally:
+            if self.sinks:
+                self.sinks.close(session_id)
+        report["seconds"] = time.time() - start
+        return report
+
+    def run(self, topics: Dict[str, str], max_reviews: Optional[int] = None, batch_id: Optional[str] = None) -> dict:
+        """Runs {session_id: topic} with the configured concurrency; returns and saves the batch report."""
+        max_reviews = max_reviews or self.config["max_reviews"]
+        batch_id = batch_id or uuid.uuid4().hex[:8]
+        print(f"--- BATCH {batch_id}: {len(topics)} topics, concurrency {self.concurrency} ---")
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="topic") as pool:
+            futures = [pool.submit(self.run_topic, sid, topic, max_reviews) for sid, topic in topics.items()]
+            runs = [future.result() for future in futures]
+        wall = time.time() - start
+
+        done = [r for r in runs if "error" not in r]
+        total_reviews = sum(r["reviews"] for r in done)
+        total_pages = sum(r["pages"] for r in done)
+        report = {
+            "batch_id": batch_id,
+            "concurrency": self.concurrency,
+            "topics": len(runs),
+            "succeeded": len(done),
+            "failed": len(runs) - len(done),
+            "wall_seconds": wall,
+            "total_reviews": total_reviews,
+            "total_pages": total_pages,
+            "total_llm_calls": sum(r["llm_calls"] for r in done),
+            "reviews_per_minute": total_reviews / wall * 60 if wall else 0,
+            "pages_per_minute": total_pages / wall * 60 if wall else 0,
+            "mean_topic_seconds": sum(r["seconds"] for r in runs) / len(runs) if runs else 0,
+            "runs": runs,
+        }
+        save_json(report, f"results/batch_{batch_id}", "batch_report.json")
+        print_report(report)
+        return report
+
+
+def print_report(report: dict):
+    print(f"\n--- BATCH {report['batch_id']} REPORT ---")
+    for r in report["runs"]:
+        status = r.get("stop_reason") or f"ERROR: {r['error']}"
+        print(f"  {r['session_id']:<40} {r.get('reviews', 0):>5} reviews {r.get('pages', 0):>5} pages "
+              f"{r['seconds']:>8.1f}s  {status}")
+    print(f"  {report['succeeded']}/{report['topics']} topics in {report['wall_seconds']:.1f}s | "
+          f"{report['reviews_per_minute']:.1f} reviews/min, {report['pages_per_minute']:.1f} pages/min, "
+          f"{report['total_llm_calls']} LLM calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several ABSA scraping topics in one process")
+    parser.add_argument("topics", nargs="+", help="Research topics, one run each")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY,
+                        help="Number of topics processed at the same time")
+    parser.add_argument("--max_reviews", type=int, default=DEFAULT_CONFIG["max_reviews"])
+    parser.add_argument("--id", help="Batch ID (session IDs are '<id>_<n>')", default=uuid.uuid4().hex[:8])
+    parser.add_argument("--no_checkpoint", action="store_true")
+    args = parser.parse_args()
+
+    runner = BatchRunner(concurrency=args.concurrency, checkpoint=not args.no_checkpoint)
+    topics = {f"{args.id}_{i}": topic for i, topic in enumerate(args.topics)}
+    runner.run(topics, max_reviews=args.max_reviews, batch_id=args.id)
+
+
+if __name__ == "__main__":
+    main()
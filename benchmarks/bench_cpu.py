@@ -0,0 +1,233 @@
+"""Micro-benchmarks of the CPU hot paths that run on every page and review.
+
+  clean_page            BeautifulSoup parse, boilerplate removal and get_text (extract node)
+  parse_html            BeautifulSoup parse only (repair node, once per review URL)
+  get_contexts_for_term term search in a parsed page (repair node, per search attempt)
+  simhash               page fingerprint of the cleaned text (extract node, fingerprint.py)
+  langdetect            per-review langdetect.detect (the previous verify-node filter)
+  language_filter       batched pre-filter of the verify node (language.py: lingua or seeded langdetect)
+  cache_index_load      JSON load of the HTML cache index
+  cache_index_save      save_to_cache_index (rewrites the whole index per fetched page)
+
+Runs over the pages in _html_cache (if any) plus synthetic pages of growing size, offline and
+deterministic. Reports ops/sec, allocations per op (tracemalloc) and the scaling exponent with page
+size (1.0 = linear).
+
+Usage: python benchmarks/bench_cpu.py [--quick] [--sizes 10000 100000 1000000] [--json out.json]
+"""
+import os
+import sys
+import math
+import glob
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup  # noqa: E402
+from langdetect import detect, DetectorFactory  # noqa: E402
+from nodes import extract  # noqa: E402
+from nodes.repair import get_contexts_for_term  # noqa: E402
+from language import filter_by_language, get_detector  # noqa: E402
+from fingerprint import simhash  # noqa: E402
+from const import HTML_CACHE_DIR  # noqa: E402
+
+WORDS = ("pasta pizza service waiter table dinner lunch dessert wine friendly slow cozy loud price "
+         "portion fresh tasty cold warm staff view booking menu starter sauce bread coffee cake").split()
+REVIEW_LANGUAGES = {
+    "en": "The pasta was excellent and the staff very friendly, we will definitely come back soon.",
+    "de": "Die Pasta war ausgezeichnet und das Personal sehr freundlich, wir kommen bestimmt wieder.",
+    "fr": "Les pâtes étaient excellentes et le personnel très sympathique, nous reviendrons bientôt.",
+    "it": "La pasta era ottima e il personale molto gentile, torneremo sicuramente presto.",
+}
+
+
+def synthetic_page(size: int, seed: int = 0) -> str:
+    """Review page of roughly `size` bytes with the usual boilerplate (scripts, nav, footer)."""
+    rng = random.Random(seed)
+    head = ("<html><head><style>.r{color:red}</style><script>var t = 1;</script></head><body>"
+            "<nav><a href='/'>Home</a><a href='/menu'>Menu</a></nav><div id='reviews'>")
+    tail = "</div><footer>Imprint</footer></body></html>"
+    blocks, total, i = [], len(head) + len(tail), 0
+    while total < size:
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+        block = (f"<div class='review'><div class='meta'><span>User {i}</span><span>{rng.randint(1, 5)} stars"
+                 f"</span></div><p>{text.capitalize()}.</p><a href='/review/{i}'>more</a></div>")
+        blocks.append(block)
+        total += len(block)
+        i += 1
+    return head + "".join(blocks) + tail
+
+
+def load_corpus(cache_dir: str, limit: int) -> list:
+    paths = sorted(glob.glob(os.path.join(cache_dir, "*.html")))[:limit]
+    pages = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+    return pages
+
+
+def time_op(fn, min_seconds: float) -> float:
+    """Ops/sec of fn(), repeated for at least min_seconds (best of 3 rounds)."""
+    fn()  # Warm-up
+    best = 0.0
+    for _ in range(3):
+        n, start = 0, time.perf_counter()
+        while True:
+            fn()
+            n += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds / 3:
+                break
+        best = max(best, n / elapsed)
+    return best
+
+
+def allocations(fn) -> tuple:
+    """(peak bytes, allocated blocks) of one fn() call."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "filename"))
+    return peak, blocks
+
+
+def measure(name: str, label: str, fn, size: int, min_seconds: float) -> dict:
+    ops = time_op(fn, min_seconds)
+    peak, blocks = allocations(fn)
+    row = {"bench": name, "input": label, "bytes": size, "ops_per_sec": ops,
+           "mb_per_sec": ops * size / 1e6 if size else None, "peak_alloc_kb": peak / 1024, "alloc_blocks": blocks}
+    mb = f"{row['mb_per_sec']:>8.2f} MB/s" if size else " " * 13
+    print(f"  {name:<22} {label:<18} {ops:>10.1f} ops/s {mb} {peak / 1024:>10.0f} KB peak {blocks:>8} blocks")
+    return row
+
+
+def scaling_exponent(rows: list) -> float:
+    """Log-log slope of time per op against input size (1.0 = linear)."""
+    points = [(math.log(r["bytes"]), math.log(1 / r["ops_per_sec"])) for r in rows if r["bytes"]]
+    if len(points) < 2:
+        return float("nan")
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else float("nan")
+
+
+def bench_pages(pages: list, min_seconds: float) -> list:
+    clean = extract.clean_page.__wrapped__  # Bypass the memoization
+    rows = []
+    for label, html in pages:
+        size = len(html.encode())
+        rows.append(measure("clean_page", label, lambda: clean(html), size, min_seconds))
+        rows.append(measure("parse_html", label, lambda: BeautifulSoup(html, "html.parser"), size, min_seconds))
+        text = clean(html)
+        rows.append(measure("simhash", label, lambda: simhash(text), size, min_seconds))
+
+        soup = BeautifulSoup(html, "html.parser")
+        words = soup.get_text(" ", strip=True).split()
+        term = words[len(words) // 2] if words else "pasta"
+        rows.append(measure("get_contexts_for_term", label, lambda: get_contexts_for_term(soup, term),
+                            size, min_seconds))
+        rows.append(measure("get_contexts_for_term", f"{label} (miss)",
+                            lambda: get_contexts_for_term(soup, "zzzunmatchedzzz"), size, min_seconds))
+    return rows
+
+
+def bench_langdetect(min_seconds: float) -> list:
+    DetectorFactory.seed = 0
+    start = time.perf_counter()
+    detect("warm up the language profiles")
+    print(f"  {'langdetect':<22} {'profile load':<18} {time.perf_counter() - start:>10.3f} s (first call)")
+    rows = []
+    for lang, text in REVIEW_LANGUAGES.items():
+        for repeat in (1, 8):
+            review = " ".join([text] * repeat)
+            rows.append(measure("langdetect", f"{lang} {len(review)} chars", lambda: detect(review),
+                                len(review.encode()), min_seconds))
+
+    batch = [{"review_text": text} for text in REVIEW_LANGUAGES.values()] * 8
+    size = sum(len(r["review_text"].encode()) for r in batch)
+    rows.append(measure("language_filter", f"{len(batch)} reviews ({get_detector().name})",
+                        lambda: filter_by_language(batch, "en"), size, min_seconds))
+    return rows
+
+
+def bench_cache_index(entries: list, min_seconds: float) -> list:
+    """Index load/save with n entries, in a scratch directory."""
+    rows = []
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_cpu_")
+    try:
+        os.chdir(workdir)
+        os.makedirs(HTML_CACHE_DIR, exist_ok=True)
+        for n in entries:
+            index = {f"https://example.com/restaurant/{i}/reviews?page={i % 7}": f"cache_{i:032x}.html"
+                     for i in range(n)}
+            with open(extract.CACHE_INDEX_FILE, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2)
+            size = os.path.getsize(extract.CACHE_INDEX_FILE)
+
+            def load():
+                extract.global_cache_index = None
+                return extract.get_cache_index()
+
+            rows.append(measure("cache_index_load", f"{n} entries", load, size, min_seconds))
+            extract.global_cache_index = dict(index)
+            rows.append(measure("cache_index_save", f"{n} entries",
+                                lambda: extract.save_to_cache_index("https://example.com/new", "cache_new.html"),
+                                size, min_seconds))
+    finally:
+        os.chdir(previous)
+        extract.global_cache_index = None
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Sizes of the synthetic pages in bytes")
+    parser.add_argument("--cache_dir", default=os.path.join(ROOT, HTML_CACHE_DIR))
+    parser.add_argument("--cache_pages", type=int, default=5, help="Max pages taken from the HTML cache")
+    parser.add_argument("--index_entries", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--min_seconds", type=float, default=1.0, help="Timing budget per measurement")
+    parser.add_argument("--quick", action="store_true", help="Small sizes and short timings (CI smoke run)")
+    parser.add_argument("--json", help="Write all measurements to this file")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.index_entries, args.min_seconds, args.cache_pages = [10_000, 100_000], [100, 1_000], 0.2, 2
+
+    synthetic = [(f"synthetic {size // 1000}KB", synthetic_page(size)) for size in args.sizes]
+    cached = [(f"cache page {i + 1}", html) for i, html in enumerate(load_corpus(args.cache_dir, args.cache_pages))]
+    print(f"--- CPU BENCHMARKS: {len(synthetic)} synthetic pages, {len(cached)} cached pages ---")
+
+    rows = bench_pages(synthetic + cached, args.min_seconds)
+    rows += bench_langdetect(args.min_seconds)
+    rows += bench_cache_index(args.index_entries, args.min_seconds)
+
+    print("\nScaling with input size (exponent of time per op; 1.0 = linear):")
+    scaling = {}
+    for name in ("clean_page", "parse_html", "simhash", "get_contexts_for_term", "cache_index_save"):
+        # Synthetic pages and index sizes form the size series; cached pages and misses are excluded
+        series = [r for r in rows if r["bench"] == name and "(miss)" not in r["input"]
+                  and (r["input"].startswith("synthetic") or r["input"].endswith(" entries"))]
+        scaling[name] = scaling_exponent(series)
+        print(f"  {name:<22} {scaling[name]:.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "scaling": scaling}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""End-to-end graph throughput on a recorded run (see replay.py), compared against a saved baseline.
+
+Every repetition replays the cassette in a fresh process (cold caches, separate peak RSS) and
+reports pages/sec, reviews/sec, LLM calls per review and peak RSS. The medians are compared with
+the baseline; the script exits with status 1 if a metric regressed by more than --tolerance.
+
+Usage:
+  python replay.py record "Italian restaurants in Berlin" --cassette _replay/berlin --max_reviews 20
+  python benchmarks/bench_graph.py --cassette _replay/berlin --runs 3 --llm_scale 1.0 --save_baseline
+  python benchmarks/bench_graph.py --cassette _replay/berlin --runs 3 --llm_scale 1.0
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from const import REPLAY_LLM_MS, REPLAY_LLM_SCALE, REPLAY_FETCH_MS, REPLAY_SEARCH_MS  # noqa: E402
+
+# Metric -> True if higher is better
+METRICS = {
+    "pages_per_sec": True,
+    "reviews_per_sec": True,
+    "llm_calls_per_review": False,
+    "peak_rss_mb": False,
+}
+
+
+def replay_once(args) -> dict:
+    cmd = [sys.executable, os.path.join(ROOT, "replay.py"), "replay", "--json", "--cassette", args.cassette,
+           "--llm_ms", str(args.llm_ms), "--llm_scale", str(args.llm_scale),
+           "--fetch_ms", str(args.fetch_ms), "--search_ms", str(args.search_ms)]
+    if args.fan_out:
+        cmd += ["--fan_out", str(args.fan_out)]
+    if args.pipeline:
+        cmd.append("--pipeline")
+    out = subprocess.run(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Names of the metrics that are worse than the baseline by more than tolerance."""
+    regressions = []
+    for name, higher_is_better in METRICS.items():
+        base, value = baseline["metrics"].get(name), result["metrics"][name]
+        if not base:
+            continue
+        change = (value - base) / base
+        worse = -change if higher_is_better else change
+        flag = "REGRESSION" if worse > tolerance else "ok"
+        print(f"  {name:<22} {base:>10.3f} -> {value:>10.3f} ({change:+.1%}) {flag}")
+        if worse > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", required=True, help="Cassette folder written by 'replay.py record'")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm_ms", type=float, default=REPLAY_LLM_MS)
+    parser.add_argument("--llm_scale", type=float, default=REPLAY_LLM_SCALE)
+    parser.add_argument("--fetch_ms", type=float, default=REPLAY_FETCH_MS)
+    parser.add_argument("--search_ms", type=float, default=REPLAY_SEARCH_MS)
+    parser.add_argument("--fan_out", type=int)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--baseline", help="Baseline file (default: <cassette>/baseline.json)")
+    parser.add_argument("--save_baseline", action="store_true", help="Store this result as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown")
+    parser.add_argument("--out", help="Write the result as JSON")
+    args = parser.parse_args()
+    args.cassette = os.path.abspath(args.cassette)
+
+    runs = []
+    for i in range(args.runs):
+        report = replay_once(args)
+        runs.append(report)
+        print(f"  run {i + 1}/{args.runs}: {report['seconds']:.2f}s, {report['pages']} pages, "
+              f"{report['reviews']} reviews, {report['llm_calls']} LLM calls, {report['peak_rss_mb']:.0f} MB, "
+              f"misses {report['misses']}")
+
+    result = {
+        "settings": {k: getattr(args, k) for k in ("llm_ms", "llm_scale", "fetch_ms", "search_ms",
+                                                   "fan_out", "pipeline")},
+        "metrics": {name: statistics.median(r[name] for r in runs) for name in METRICS},
+        "seconds": statistics.median(r["seconds"] for r in runs),
+        "runs": runs,
+    }
+    print(f"\nMedian of {args.runs} runs ({result['seconds']:.2f}s): "
+          + ", ".join(f"{k}={v:.3f}" for k, v in result["metrics"].items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    baseline_path = args.baseline or os.path.join(args.cassette, "baseline.json")
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path} (run with --save_baseline first).")
+        return
+
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != result["settings"]:
+        print(f"  [WARNING] Baseline settings differ: {baseline.get('settings')}")
+    print(f"\nCompared with {baseline_path} (tolerance {args.tolerance:.0%}):")
+    if compare(result, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
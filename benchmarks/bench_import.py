@@ -0,0 +1,121 @@
+"""Startup cost of the CLI entry points, from `python -X importtime` in fresh interpreters.
+
+  import_agent     import absa_agent (what batch.py, run_experiments.py and replay.py pay first)
+  cli_help         python absa_agent.py --help
+  import_batch     import run_experiments (in-process batch runner)
+  create_graph     import absa_agent + create_graph(DEFAULT_CONFIG) (everything a run loads before its first node)
+
+Each scenario runs --runs times; the medians of the wall time and of the total import time are
+reported together with the heaviest direct imports of the top-level modules. --summary writes the
+result as markdown (benchmarks/importtime.md is the checked-in reference).
+
+Usage: python benchmarks/bench_import.py [--runs 5] [--top 10] [--summary benchmarks/importtime.md]
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import platform
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import_agent": ["-c", "import absa_agent"],
+    "cli_help": ["absa_agent.py", "--help"],
+    "import_batch": ["-c", "import run_experiments"],
+    "create_graph": ["-c", "import absa_agent; absa_agent.create_graph(absa_agent.DEFAULT_CONFIG)"],
+}
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self us, cumulative us, depth) per -X importtime line (depth 0 = top-level import)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def run_once(args: list) -> tuple:
+    """(wall seconds, importtime rows) of one fresh interpreter."""
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=ROOT,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if out.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{out.stderr[-2000:]}")
+    return elapsed, parse_importtime(out.stderr)
+
+
+def measure(name: str, args: list, runs: int, top: int) -> dict:
+    walls, totals, last = [], [], []
+    for _ in range(runs):
+        wall, rows = run_once(args)
+        walls.append(wall)
+        # Nested imports are included in the cumulative time of their depth-0 importer
+        totals.append(sum(cum for _, _, cum, depth in rows if depth == 0))
+        last = rows
+    # Direct imports of the top-level modules (e.g. langgraph.graph under absa_agent)
+    heaviest = sorted((r for r in last if r[3] == 1), key=lambda r: -r[2])[:top]
+    result = {
+        "scenario": name,
+        "command": shlex.join(["python", "-X", "importtime"] + args),
+        "wall_ms": statistics.median(walls) * 1000,
+        "import_ms": statistics.median(totals) / 1000,
+        "modules": len(last),
+        "heaviest": [{"module": m, "cumulative_ms": cum / 1000} for m, _, cum, _ in heaviest],
+    }
+    print(f"  {name:<14} wall {result['wall_ms']:>8.1f} ms   imports {result['import_ms']:>8.1f} ms   "
+          f"{result['modules']:>5} modules")
+    for entry in result["heaviest"]:
+        print(f"      {entry['cumulative_ms']:>8.1f} ms  {entry['module']}")
+    return result
+
+
+def to_markdown(results: list, runs: int) -> str:
+    lines = [
+        "# Import-time summary",
+        "",
+        f"Generated by `python benchmarks/bench_import.py --runs {runs} --summary benchmarks/importtime.md` "
+        f"(Python {platform.python_version()}, {platform.system()}, medians of {runs} runs).",
+        "",
+        "| scenario | wall ms | import ms | modules |",
+        "|---|---:|---:|---:|",
+    ]
+    lines += [f"| {r['scenario']} | {r['wall_ms']:.0f} | {r['import_ms']:.0f} | {r['modules']} |" for r in results]
+    for r in results:
+        lines += ["", f"## {r['scenario']}", "", f"`{r['command']}`", "", "| import | cumulative ms |",
+                  "|---|---:|"]
+        lines += [f"| {e['module']} | {e['cumulative_ms']:.1f} |" for e in r["heaviest"]]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Heaviest imports listed per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--summary", help="Write a markdown summary to this file")
+    parser.add_argument("--json", help="Write all measurements to this file")
+    args = parser.parse_args()
+
+    print(f"--- IMPORT TIME ({args.runs} runs per scenario) ---")
+    results = [measure(name, SCENARIOS[name], args.runs, args.top) for name in args.scenarios]
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(to_markdown(results, args.runs))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
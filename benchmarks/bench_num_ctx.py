@@ -0,0 +1,96 @@
+"""Measures what changing num_ctx between calls of one model costs in Ollama.
+
+The crawl alternates a large-window call (page relevance on a long page) with short ones
+(review verification) on the same model. 'per_call' requests the smallest fitting window for
+every call, as pick_num_ctx alone would; 'held' requests the largest window used so far, as
+invoke_llm does via hold_num_ctx. Ollama reloads the model whenever num_ctx changes, which shows
+up as load time and as lost prompt-cache reuse (prefill of the short calls).
+
+Usage: python benchmarks/bench_num_ctx.py --rounds 5 [--model gpt-oss:20b] [--output num_ctx.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from const import (DEFAULT_LLM_URL, DEFAULT_REASONING_MODEL, MAX_FILTER_TOKENS, DEFAULT_PROMPT_LAYOUT,  # noqa: E402
+                   PROMPT_LAYOUTS)
+from nodes.prompts import get_prompt_registry  # noqa: E402
+from tokens import fit_prompt  # noqa: E402
+from bench_prompt_layout import call_ollama, variable_content, SAMPLE_TEXTS  # noqa: E402
+
+POLICIES = ("per_call", "held")
+
+
+def build_calls(args) -> list:
+    """(kind, prompt, fitting num_ctx) for one round: a long relevance check, then short verifications."""
+    registry = get_prompt_registry()
+    page = registry.get("02_filter_page.md", args.layout)
+    verify = registry.get("08_verify_reviews.md", args.layout)
+    page_text = " ".join(SAMPLE_TEXTS) * 400
+    calls = [("page", *fit_prompt(page.template, "page_snippet", page_text, reserved_output=256,
+                                  max_content_tokens=MAX_FILTER_TOKENS, query=args.query,
+                                  json_schema=page.schema))]
+    for i in range(args.reviews):
+        calls.append(("verify", *fit_prompt(verify.template, "review_text", variable_content(i),
+                                            reserved_output=256, query=args.query, json_schema=verify.schema)))
+    return calls
+
+
+def run_policy(args, policy: str, calls: list) -> dict:
+    load_ms, verify_prefill_ms = [], []
+    held = 0
+    for round_index in range(args.rounds + 1):
+        for kind, prompt, num_ctx in calls:
+            held = max(held, num_ctx)
+            meta = call_ollama(args.url, args.model, prompt, held if policy == "held" else num_ctx)
+            if round_index == 0:
+                continue  # Warm-up round loads the model at every size once
+            load_ms.append(meta.get("load_duration", 0) / 1e6)
+            if kind == "verify":
+                verify_prefill_ms.append(meta.get("prompt_eval_duration", 0) / 1e6)
+    return {
+        "policy": policy,
+        "rounds": args.rounds,
+        "total_load_ms": sum(load_ms),
+        "mean_verify_prefill_ms": statistics.mean(verify_prefill_ms),
+        "median_verify_prefill_ms": statistics.median(verify_prefill_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("LLM_URL", DEFAULT_LLM_URL))
+    parser.add_argument("--model", default=os.getenv("LLM_REASONING_MODEL", DEFAULT_REASONING_MODEL))
+    parser.add_argument("--layout", default=DEFAULT_PROMPT_LAYOUT, choices=PROMPT_LAYOUTS)
+    parser.add_argument("--query", default="Restaurants in Chicago")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--reviews", type=int, default=5, help="Verification calls per round")
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    calls = build_calls(args)
+    print(f"Windows per round: {[num_ctx for _, _, num_ctx in calls]}")
+    results = []
+    for policy in POLICIES:
+        start = time.time()
+        stats = run_policy(args, policy, calls)
+        stats["wall_seconds"] = time.time() - start
+        results.append(stats)
+        print(f"{policy:>9}: load {stats['total_load_ms']:9.1f} ms, verify prefill mean "
+              f"{stats['mean_verify_prefill_ms']:8.1f} ms, median {stats['median_verify_prefill_ms']:8.1f} ms, "
+              f"wall {stats['wall_seconds']:6.1f} s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measures Ollama prefill time for the 'default' vs. 'prefix_stable' prompt layouts.
+
+Each layout is called repeatedly with changing variable content (as the nodes do per page or
+review). With 'prefix_stable' the static instructions and schema form a shared prefix, so Ollama
+only evaluates the variable tail on repeated calls.
+
+Usage: python benchmarks/bench_prompt_layout.py --template 08_verify_reviews.md --calls 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from const import DEFAULT_LLM_URL, DEFAULT_LLM_MODEL, DEFAULT_TEMPERATURE  # noqa: E402
+from nodes.prompts import get_prompt_registry, PROMPT_LAYOUTS, PROMPT_SPECS, get_placeholders  # noqa: E402
+from tokens import fit_prompt  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "The pasta was cooked perfectly and the waiter recommended a great wine. Will come back!",
+    "Terrible service, we waited 45 minutes for cold pizza. Not recommended.",
+    "Cozy place with friendly staff. The tiramisu is the best I have had in the city.",
+    "Overpriced for what you get, but the view over the river is worth a visit.",
+    "We booked for a birthday dinner and everything from starters to dessert was excellent.",
+]
+
+
+def variable_content(i: int) -> str:
+    """Builds a distinct variable payload per call."""
+    return f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} (entry #{i})"
+
+
+def call_ollama(url, model, prompt, num_ctx):
+    """Runs one non-streaming chat call and returns Ollama's timing metadata."""
+    res = requests.post(f"{url}/api/chat", json={
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "format": "json",
+        "stream": False,
+        "options": {"temperature": DEFAULT_TEMPERATURE, "num_ctx": num_ctx, "num_predict": 1}
+    }, timeout=600)
+    res.raise_for_status()
+    return res.json()
+
+
+def run_layout(args, layout):
+    """Calls the model args.calls times with the given layout; returns per-call prefill stats."""
+    compiled = get_prompt_registry().get(args.template, layout)
+    _, fields = PROMPT_SPECS[args.template]
+    # Templates whose only input is the query (e.g. 01_generate_query.md) vary the query itself
+    fill_field = args.field or min(get_placeholders(compiled.template) - {"json_schema", "query"}, default="query")
+    static_fields = {f: args.query for f in fields if f not in (fill_field, "json_schema")}
+
+    durations, counts = [], []
+    for i in range(args.calls + 1):
+        prompt, num_ctx = fit_prompt(compiled.template, fill_field, variable_content(i),
+                                     reserved_output=256, json_schema=compiled.schema, **static_fields)
+        meta = call_ollama(args.url, args.model, prompt, num_ctx)
+        if i == 0:
+            continue  # Warm-up call loads the model and fills the cache
+        durations.append(meta.get("prompt_eval_duration", 0) / 1e6)
+        counts.append(meta.get("prompt_eval_count", 0))
+
+    return {
+        "layout": layout,
+        "calls": args.calls,
+        "mean_prefill_ms": statistics.mean(durations),
+        "median_prefill_ms": statistics.median(durations),
+        "mean_evaluated_prompt_tokens": statistics.mean(counts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt layout prefill benchmark")
+    parser.add_argument("--url", default=os.getenv("LLM_URL", DEFAULT_LLM_URL))
+    parser.add_argument("--model", default=os.getenv("LLM_MODEL", DEFAULT_LLM_MODEL))
+    parser.add_argument("--template", default="08_verify_reviews.md", choices=sorted(PROMPT_SPECS))
+    parser.add_argument("--field", help="Placeholder that receives the changing content "
+                                        "(default: the template's first input besides the query, else the query)")
+    parser.add_argument("--query", default="Restaurants in Chicago")
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for layout in PROMPT_LAYOUTS:
+        start = time.time()
+        stats = run_layout(args, layout)
+        stats["wall_seconds"] = time.time() - start
+        results.append(stats)
+        print(f"{layout:>14}: prefill mean {stats['mean_prefill_ms']:8.1f} ms, "
+              f"median {stats['median_prefill_ms']:8.1f} ms, "
+              f"evaluated prompt tokens {stats['mean_evaluated_prompt_tokens']:7.1f}")
+
+    baseline, stable = results
+    if baseline["mean_prefill_ms"]:
+        saved = 1 - stable["mean_prefill_ms"] / baseline["mean_prefill_ms"]
+        print(f"Prefill time saved per repeated call: {saved:.1%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
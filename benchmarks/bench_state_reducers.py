@@ -0,0 +1,106 @@
+"""Per-step LangGraph state overhead as the number of reviews and visited URLs grows.
+
+Compares three ways of growing the list fields of the state:
+  copy          no reducer, the node returns `old_list + [new]` (previous GraphState behaviour)
+  operator_add  Annotated[List, operator.add], the node returns only the delta
+  append_log    Annotated[List, append_only] (nodes.state.AppendLog), the node returns only the delta
+
+Usage: python benchmarks/bench_state_reducers.py --steps 5000 --window 500
+"""
+import os
+import sys
+import time
+import json
+import operator
+import argparse
+from typing import TypedDict, Annotated, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langgraph.graph import StateGraph, END  # noqa: E402
+from nodes.state import append_only  # noqa: E402
+
+REVIEW = {"review_title": "Great place", "review_text": "The pasta was excellent. " * 20, "stars": 5,
+          "website_url": "https://example.com/reviews?page=1", "cache_id": "cache_x.html",
+          "found_via_discovery": True}
+
+
+class CopyState(TypedDict):
+    reviews: List[dict]
+    visited_urls: List[str]
+    step: int
+
+
+class AddState(TypedDict):
+    reviews: Annotated[List[dict], operator.add]
+    visited_urls: Annotated[List[str], operator.add]
+    step: int
+
+
+class LogState(TypedDict):
+    reviews: Annotated[List[dict], append_only]
+    visited_urls: Annotated[List[str], append_only]
+    step: int
+
+
+def build(schema, delta: bool, steps: int, timestamps: list):
+    """Single-node loop that adds one review and one visited URL per superstep."""
+    def node(state):
+        timestamps.append(time.perf_counter())
+        step = state["step"]
+        review, url = dict(REVIEW, id=step), f"https://example.com/reviews?page={step}"
+        if delta:
+            return {"reviews": [review], "visited_urls": [url], "step": step + 1}
+        return {"reviews": state["reviews"] + [review], "visited_urls": state["visited_urls"] + [url],
+                "step": step + 1}
+
+    graph = StateGraph(schema)
+    graph.add_node("step", node)
+    graph.set_entry_point("step")
+    graph.add_conditional_edges("step", lambda s: END if s["step"] >= steps else "step",
+                                {"step": "step", END: END})
+    return graph.compile()
+
+
+def run(name, schema, delta, args):
+    timestamps = []
+    app = build(schema, delta, args.steps, timestamps)
+    final = app.invoke({"reviews": [], "visited_urls": [], "step": 0},
+                       config={"recursion_limit": args.steps + 10})
+    assert len(final["reviews"]) == args.steps
+
+    gaps = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    windows = [sum(gaps[i:i + args.window]) / len(gaps[i:i + args.window]) * 1e6
+               for i in range(0, len(gaps), args.window)]
+    return {"variant": name, "us_per_step_by_window": windows, "total_seconds": timestamps[-1] - timestamps[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GraphState reducer overhead benchmark")
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--window", type=int, default=500)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = [
+        run("copy", CopyState, False, args),
+        run("operator_add", AddState, True, args),
+        run("append_log", LogState, True, args),
+    ]
+
+    header = "reviews".rjust(8) + "".join(r["variant"].rjust(14) for r in results)
+    print("Mean per-step overhead (us) by state size")
+    print(header)
+    for i in range(len(results[0]["us_per_step_by_window"])):
+        size = (i + 1) * args.window
+        print(str(size).rjust(8) + "".join(f"{r['us_per_step_by_window'][i]:14.1f}" for r in results))
+    print("total (s)".rjust(8) + "".join(f"{r['total_seconds']:14.2f}" for r in results))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
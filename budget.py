@@ -0,0 +1,127 @@
+import time
+import threading
+from monitor import window_energy
+from const import (DEFAULT_DEADLINE_SECONDS, DEFAULT_MAX_LLM_CALLS, DEFAULT_MAX_PROMPT_TOKENS,
+                   DEFAULT_MAX_FETCHED_BYTES, DEFAULT_MAX_ENERGY_JOULES)
+
+# Budget name -> (config key, default limit); a limit of 0 means unlimited
+BUDGET_LIMITS = {
+    "deadline_seconds": ("deadline_seconds", DEFAULT_DEADLINE_SECONDS),
+    "llm_calls": ("max_llm_calls", DEFAULT_MAX_LLM_CALLS),
+    "prompt_tokens": ("max_prompt_tokens", DEFAULT_MAX_PROMPT_TOKENS),
+    "fetched_bytes": ("max_fetched_bytes", DEFAULT_MAX_FETCHED_BYTES),
+    "energy_joules": ("max_energy_joules", DEFAULT_MAX_ENERGY_JOULES),
+}
+
+
+class RunBudget:
+    """Run-wide resource budget: wall-clock deadline, LLM calls, prompt tokens, fetched bytes and energy.
+
+    Nodes charge usage as it happens; the router and the per-review loops poll exhausted().
+    """
+
+    def __init__(self, limits: dict = None):
+        self.limits = {name: float(limit or 0) for name, limit in (limits or {}).items()}
+        self.used = {name: 0.0 for name in BUDGET_LIMITS}
+        self.start_time = time.time()
+        self.reason = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RunBudget":
+        return cls({name: config.get(key, default) for name, (key, default) in BUDGET_LIMITS.items()})
+
+    def charge(self, name: str, amount: float):
+        with self._lock:
+            self.used[name] += amount
+
+    def charge_llm_call(self, prompt_tokens: int):
+        with self._lock:
+            self.used["llm_calls"] += 1
+            self.used["prompt_tokens"] += prompt_tokens
+
+    def exhausted(self) -> str:
+        """Returns the name of the first exhausted budget (sticky), or None."""
+        if self.reason:
+            return self.reason
+        self.used["deadline_seconds"] = time.time() - self.start_time
+        for name, limit in self.limits.items():
+            if limit and self.used[name] >= limit:
+                self.reason = name
+                print(f"  [BUDGET] '{name}' exhausted ({self.used[name]:.0f}/{limit:.0f}). Stopping.")
+                break
+        return self.reason
+
+    def snapshot(self) -> dict:
+        """Start time and usage, as journaled by the checkpointer."""
+        with self._lock:
+            return {"start_time": self.start_time, "used": dict(self.used)}
+
+    def restore(self, snapshot: dict):
+        """Continues from a journaled snapshot (resumed runs keep their deadline and counters)."""
+        with self._lock:
+            self.start_time = snapshot["start_time"]
+            self.used.update(snapshot["used"])
+
+    def summary(self) -> dict:
+        self.exhausted()
+        return {"limits": dict(self.limits), "used": dict(self.used), "exhausted": self.reason}
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_budget(config: dict) -> RunBudget:
+    """Returns the budget of the run identified by config['session_id'] (created on first use)."""
+    session_id = (config or {}).get("session_id")
+    with _budgets_lock:
+        if session_id not in _budgets:
+            _budgets[session_id] = RunBudget.from_config(config or {})
+        return _budgets[session_id]
+
+
+class EnergyCharger:
+    """Graph listener: charges the energy of finished steps to their run's budget.
+
+    Fan-out branches and pipeline stages overlap in time; only the parts of a step's window that
+    were not charged before are integrated, so the same GPU time is charged once (as in run_energy).
+    """
+
+    def __init__(self):
+        self._charged = {}  # session_id -> sorted, disjoint (start, end) windows already charged
+        self._lock = threading.Lock()
+
+    def _uncharged(self, session_id: str, start: float, end: float) -> list:
+        """Parts of [start, end] not charged yet; the whole window counts as charged afterwards."""
+        with self._lock:
+            windows = self._charged.setdefault(session_id, [])
+            gaps, cursor = [], start
+            for s, e in windows:
+                if s >= end:
+                    break
+                if s > cursor:
+                    gaps.append((cursor, s))
+                cursor = max(cursor, e)
+            if cursor < end:
+                gaps.append((cursor, end))
+            merged = []
+            for s, e in sorted(windows + [(start, end)]):
+                if merged and s <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+                else:
+                    merged.append((s, e))
+            self._charged[session_id] = merged
+            return gaps
+
+    def on_update(self, node: str, state: dict, update: dict):
+        config = state.get("config") or {}
+        budget = get_budget(config)
+        for m in (update or {}).get("step_metrics", []):
+            if "start" not in m:
+                energy = m.get("energy_joules", m.get("duration", 0) * m.get("avg_gpu_power_watts", 0))
+                budget.charge("energy_joules", energy)
+                continue
+            for start, end in self._uncharged(config.get("session_id"), m["start"], m["end"]):
+                budget.charge("energy_joules", window_energy(start, end, m))
+        return None
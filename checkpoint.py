@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+from nodes.state import AppendLog, apply_update
+from nodes.frontier import URLFrontier
+from budget import get_budget
+from const import CHECKPOINT_DIR
+
+# Nodes whose updates are not journaled: parallel branches only feed 'merge', which is recorded
+UNRECORDED_NODES = {"process_url"}
+
+
+def _to_json(value):
+    """JSON fallback for state values (append-only logs are written as plain lists)."""
+    if isinstance(value, AppendLog):
+        return list(value)
+    if isinstance(value, URLFrontier):
+        return value.pending()
+    return str(value)
+
+
+class CrawlCheckpointer:
+    """Crash-safe, incremental run journal: one JSONL file per session.
+
+    The first record holds the initial state, every further record only the update a node
+    returned plus the frontier operations it caused and the run budget's usage. Each record is
+    fsynced, so after a crash the journal can be replayed up to the last completed node.
+    """
+
+    def __init__(self, root: str = CHECKPOINT_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.root, f"{session_id}.jsonl")
+
+    def exists(self, session_id: str) -> bool:
+        return os.path.exists(self.path(session_id))
+
+    def _write(self, session_id: str, record: dict):
+        line = json.dumps(record, default=_to_json, ensure_ascii=False)
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.path(session_id), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, state: dict):
+        """Writes the initial state; the frontier is stored as operations that rebuild it."""
+        session_id = state["config"]["session_id"]
+        frontier = state.get("found_review_urls")
+        ops = frontier.track_changes() if isinstance(frontier, URLFrontier) else []
+        initial = {k: v for k, v in state.items() if k != "found_review_urls"}
+        self._write(session_id, {"type": "start", "state": initial, "frontier_ops": ops,
+                                 "budget": get_budget(state["config"]).snapshot()})
+
+    def on_update(self, node: str, state: dict, update: dict):
+        """Graph listener: journals the update of a finished node."""
+        if node in UNRECORDED_NODES or not update:
+            return
+        session_id = state["config"]["session_id"]
+        # Nodes mutate the frontier in place; only its logged operations are written
+        frontier = update.get("found_review_urls", state.get("found_review_urls"))
+        record = {"type": "update", "node": node,
+                  "update": {k: v for k, v in update.items() if k != "found_review_urls"},
+                  "budget": get_budget(state["config"]).snapshot()}
+        if isinstance(frontier, URLFrontier):
+            if frontier.tracks_changes:
+                record["frontier_ops"] = frontier.drain_changes()
+            else:
+                # A new frontier object (e.g. from 'retrieval') replaces the old one
+                record["frontier_reset"] = True
+                record["frontier_ops"] = frontier.track_changes()
+        self._write(session_id, record)
+
+    def finish(self, session_id: str):
+        self._write(session_id, {"type": "end"})
+
+    def load(self, session_id: str):
+        """Rebuilds the state from the journal.
+
+        Returns (state, last recorded node or None, finished, last budget snapshot or None).
+        """
+        records, valid_bytes = [], 0
+        with open(self.path(session_id), "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                    valid_bytes += len(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+        if valid_bytes < os.path.getsize(self.path(session_id)):
+            # A crash mid-write leaves one truncated record at the end; cut it so appending can continue
+            print(f"  [CHECKPOINT] Dropping truncated record at the end of {self.path(session_id)}")
+            with open(self.path(session_id), "r+b") as f:
+                f.truncate(valid_bytes)
+
+        if not records or records[0]["type"] != "start":
+            raise ValueError(f"Checkpoint {self.path(session_id)} has no start record")
+
+        state = records[0]["state"]
+        config = state["config"]
+        frontier = URLFrontier.from_config(config)
+        frontier.replay(records[0]["frontier_ops"])
+        last_node, finished, budget = None, False, records[0].get("budget")
+
+        for record in records[1:]:
+            if record["type"] == "end":
+                finished = True
+                continue
+            if record.get("frontier_reset"):
+                frontier = URLFrontier.from_config(config)
+            frontier.replay(record.get("frontier_ops", []))
+            apply_update(state, record["update"])
+            last_node = record["node"]
+            budget = record.get("budget", budget)
+
+        # URLs handed out but not finished before the crash (e.g. a scheduled fan-out batch) are queued again
+        requeued = frontier.requeue_in_flight()
+        if requeued:
+            print(f"  [CHECKPOINT] Re-queued {requeued} URLs that were in progress")
+        state["found_review_urls"] = frontier
+        frontier.track_changes()
+        print(f"  [CHECKPOINT] Restored {len(records)} records: {len(state.get('reviews', []))} reviews, "
+              f"{len(frontier)} URLs in queue, last node '{last_node}'")
+        return state, last_node, finished, budget
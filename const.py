@@ -1,8 +1,10 @@
 import os
 
 # --- LLM & Computational Constants ---
-# Global context window size for Ollama models (2048 * 8 = 16k tokens)
+# Upper bound for the Ollama context window (2048 * 8 = 16k tokens)
 NUM_CTX = 2048 * 8
+# Smallest context window requested per call; windows are powers of two between this and NUM_CTX
+MIN_NUM_CTX = 2048
 
 # --- Environment Fallbacks & Defaults ---
 # Default Ollama instance URL (fallback if LLM_URL env is missing)
@@ -17,30 +19,154 @@ DEFAULT_TEMPERATURE = 0.0
 DEFAULT_MAX_REVIEWS = 50
 # Default language for reviews (e.g. 'en', 'de'). Set to None to disable filtering.
 DEFAULT_LANGUAGE = "en"
+# Reviews shorter than this (characters) pass the language pre-filter (detection is unreliable on short texts)
+LANGUAGE_SHORT_TEXT_CHARS = 40
+# Minimum detector confidence for rejecting a review written in another language
+LANGUAGE_MIN_CONFIDENCE = 0.5
+# Number of URLs processed in parallel per graph superstep (1 = strictly serial BFS)
+DEFAULT_FAN_OUT = 1
+# Pipeline mode: fetch/parse, extract, repair and verify run as concurrent stages over different pages
+DEFAULT_PIPELINE = False
+# Max pages waiting between two pipeline stages (backpressure)
+PIPELINE_QUEUE_SIZE = 2
+# Concurrent fetch/parse workers feeding the pipeline
+PIPELINE_FETCH_WORKERS = 2
+# Number of topics run at the same time by the in-process batch runner (batch.py)
+DEFAULT_BATCH_CONCURRENCY = 4
 # Initial amount of search results requested by the 'Retrieval' node
 DEFAULT_RETRIEVER_MAX_RESULTS = 100
 
+# --- Run Budgets (0 = unlimited) ---
+# Wall-clock deadline of a run in seconds
+DEFAULT_DEADLINE_SECONDS = 0
+# Total number of LLM calls
+DEFAULT_MAX_LLM_CALLS = 0
+# Total prompt tokens sent to the LLMs
+DEFAULT_MAX_PROMPT_TOKENS = 0
+# Total bytes fetched from the network (cache hits are free)
+DEFAULT_MAX_FETCHED_BYTES = 0
+# Total GPU energy in joules (sum of step duration x average GPU power)
+DEFAULT_MAX_ENERGY_JOULES = 0
+
+# --- GPU Power Monitoring ---
+# Sampling interval of the persistent GPU power sampler (nvidia-smi --loop-ms)
+GPU_SAMPLE_INTERVAL_MS = 100
+# Readings kept in the sampler's ring buffer (100ms x 36000 = 1h)
+GPU_SAMPLE_BUFFER = 36000
+# Mean power reported by the 'fake' sampler (GPU_SAMPLER=fake)
+GPU_FAKE_WATTS = float(os.getenv("GPU_FAKE_WATTS", 250.0))
+
+# --- Profiling ---
+# Fine-grained timing spans (fetch, HTML cleaning, LLM calls, repair context search, language detection)
+DEFAULT_PROFILE = False
+# Range and resolution of the span latency histograms (log-spaced buckets)
+PROFILE_BUCKET_MIN_SECONDS = 1e-5
+PROFILE_BUCKET_MAX_SECONDS = 1e3
+PROFILE_BUCKETS_PER_DOUBLING = 4
+
+# --- Prompts ---
+# Folder holding the markdown prompt templates
+PROMPT_TEMPLATE_DIR = "prompt_template"
+# Prompt layout: 'default' keeps the templates as written, 'prefix_stable' puts static
+# instructions and schema first and variable content last (enables Ollama prefix reuse)
+DEFAULT_PROMPT_LAYOUT = "default"
+PROMPT_LAYOUTS = ("default", "prefix_stable")
+
 # --- Caching & Storage ---
 # Directory where raw HTML content is persisted to avoid redundant fetching
 HTML_CACHE_DIR = "_html_cache"
 # JSON file mapping URLs to deterministic filenames in the cache directory
 CACHE_INDEX_FILE = os.path.join(HTML_CACHE_DIR, "cache_index.json")
+# Directory where search results are cached per normalized query and max_results
+SEARCH_CACHE_DIR = "_search_cache"
+# Max age of cached search results in seconds (0 disables the search cache)
+SEARCH_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Results requested per page when search results are streamed into the frontier
+SEARCH_PAGE_SIZE = 10
+# Directory holding the per-session run journals used for '--resume'
+CHECKPOINT_DIR = "_checkpoints"
+# Stream verified reviews to 'reviews.jsonl' as they are accepted instead of keeping them in memory
+DEFAULT_STREAM_OUTPUT = False
+# The streaming sink fsyncs after this many reviews or seconds, whichever comes first
+STREAM_FSYNC_EVERY = 50
+STREAM_FSYNC_SECONDS = 5.0
+# Folder of the record/replay cassettes (replay.py, benchmarks/bench_graph.py)
+REPLAY_CASSETTE_DIR = "_replay"
+# Also write each run to a per-session SQLite partition (store.py) for queries across sessions
+DEFAULT_RESULTS_STORE = False
+# Folder of the session folders and name of the per-session SQLite partition in each of them
+RESULTS_DIR = "results"
+RESULTS_STORE_FILE = "results.sqlite"
+# Merged store of all sessions written by 'python store.py merge'
+RESULTS_MERGED_FILE = os.path.join(RESULTS_DIR, "merged.sqlite")
+# Rows per executemany() batch when writing or merging
+RESULTS_STORE_BATCH = 1000
 
-# --- Character Limits for LLM Context Windows ---
+# --- Replay Latency (synthetic delays added by the replay server) ---
+# Fixed latency per LLM call in milliseconds
+REPLAY_LLM_MS = 0.0
+# Share of the recorded Ollama duration added per LLM call (1.0 = as fast as the recorded GPU)
+REPLAY_LLM_SCALE = 0.0
+# Latency per page fetch and per search request in milliseconds
+REPLAY_FETCH_MS = 0.0
+REPLAY_SEARCH_MS = 0.0
+
+# --- Token Budgets for LLM Context Windows ---
+# Initial characters-per-token ratio of the token estimator (conservative for mixed HTML/text)
+DEFAULT_CHARS_PER_TOKEN = 3.0
+# Relative safety margin added on top of every token estimate
+TOKEN_SAFETY_MARGIN = 0.1
+# Optional path to a local HuggingFace 'tokenizer.json' used instead of the estimator
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH")
 # Max number of HTML fragments sent to the 'Repair' node to prevent context overflow
 MAX_REPAIR_CONTEXTS = 5
-# Max total characters allowed for ALL repair context snippets combined
-MAX_REPAIR_TOTAL_CHARS = 20000
 # Max characters for a single repair context snippet
 MAX_REPAIR_CHARS = 10000
-# Max text length passed to the Intelligent Repair 'Check' phase
-MAX_SNIPPET_LEN = 15000
-# Text sample size used by the 'Extract' node to determine if a page is relevant
-MAX_FILTER_SNIPPET = 30000
-# Max page content size passed to the actual Extraction LLM
-MAX_EXTRACT_SNIPPET = 40000
-# Content size used for Hyperlink/Pagination discovery in the 'Extract' node
-MAX_DETECT_SNIPPET = 30000
+# Max tokens allowed for ALL repair context snippets combined
+MAX_REPAIR_SEGMENT_TOKENS = 6000
+# Max page tokens passed to the Intelligent Repair 'Check' phase
+MAX_CHECK_TOKENS = 4000
+# Page sample size (tokens) used by the 'Extract' node to determine if a page is relevant
+MAX_FILTER_TOKENS = 8000
+# Page content size (tokens) used for Hyperlink/Pagination discovery in the 'Extract' node
+MAX_DETECT_TOKENS = 8000
+# Tokens reserved for the model answer (incl. reasoning traces) per prompt type
+QUERY_OUTPUT_TOKENS = 256
+FILTER_OUTPUT_TOKENS = 1024
+EXTRACT_OUTPUT_TOKENS = 6144
+DETECT_OUTPUT_TOKENS = 1024
+CHECK_OUTPUT_TOKENS = 1024
+REPAIR_SEARCH_OUTPUT_TOKENS = 256
+REPAIR_OUTPUT_TOKENS = 2048
+VERIFY_OUTPUT_TOKENS = 1024
+
+# --- Near-Duplicate Reviews (dedup.py) ---
+# Drop near-duplicate reviews and truncated snippets right after extraction
+DEFAULT_DEDUP = True
+# MinHash signature length and LSH bands (rows per band = DEDUP_NUM_PERM / DEDUP_BANDS)
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16
+# Estimated Jaccard similarity from which two reviews count as duplicates
+DEDUP_THRESHOLD = 0.75
+# Words per shingle
+DEDUP_SHINGLE_WORDS = 2
+# Normalized characters a snippet must share with the complete review (prefix index key length)
+DEDUP_PREFIX_CHARS = 60
+
+# --- Page Fingerprints (fingerprint.py) ---
+# Skip pages whose SimHash is close to a page already analyzed in the same run
+DEFAULT_PAGE_FINGERPRINT = True
+# Also reuse the analysis of near-identical pages from earlier runs of the topic (same models,
+# prompt layout and language only); off by default so that runs comparing settings stay independent
+DEFAULT_FINGERPRINT_REUSE = False
+# Fingerprints and stored analysis results per topic (append-only JSONL), next to the HTML cache index
+FINGERPRINT_FILE = os.path.join(HTML_CACHE_DIR, "fingerprints.jsonl")
+# Max Hamming distance (of 64 bits) between fingerprints of near-identical pages
+FINGERPRINT_MAX_DISTANCE = 3
+# Words per shingle
+FINGERPRINT_SHINGLE_WORDS = 3
+# Pages with fewer words are not fingerprinted (too little text for a reliable match)
+FINGERPRINT_MIN_WORDS = 50
 
 # --- Intelligent Repair Algorithm Constants ---
 # Maximum attempts the 'Repair' node makes to find a missing fragment in HTML
@@ -52,8 +178,28 @@ REPAIR_CONTEXT_MIN_CHARS = 2500
 # Minimal length of a review fragment before we consider it "scrappable" for repair
 MIN_REPAIR_LENGTH = 150
 
+# --- URL Frontier ---
+# Query parameters stripped by the URL canonicalizer (exact names and prefixes)
+TRACKING_QUERY_PARAMS = {"gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid",
+                         "igshid", "ref_src", "_ga", "_gl"}
+TRACKING_QUERY_PREFIXES = ("utm_",)
+# Crawl order of the frontier: 'fifo' (plain BFS) or 'best_first' (yield-driven)
+DEFAULT_CRAWL_ORDER = "fifo"
+# Max pages fetched per domain (0 = unlimited)
+DEFAULT_MAX_PAGES_PER_DOMAIN = 0
+# Prune a domain after this many fetched pages without a verified review (0 = never)
+DEFAULT_DOMAIN_PRUNE_AFTER = 0
+# Prior number of verified reviews per page assumed for domains that were not crawled yet
+CRAWL_YIELD_PRIOR = 1.0
+# Score multiplier per link hop away from a seed/search result
+CRAWL_DEPTH_DECAY = 0.8
+# Score multiplier per discovery source
+CRAWL_SOURCE_WEIGHTS = {"seed": 1.2, "search": 1.0, "discovery": 1.0}
+
 # --- Networking & Scraping (Extract Node) ---
 # Network timeout in seconds for fetching website content
 FETCH_TIMEOUT_SECONDS = 10
 # Standard headers to bypass basic anti-bot detection during scraping
 USER_AGENT_STRING = "Mozilla/5.0"
+# Number of parsed page texts kept in memory (shared by all runs of a process)
+PAGE_TEXT_CACHE_SIZE = 256
@@ -0,0 +1,240 @@
+import re
+import zlib
+import random
+import threading
+from typing import Iterable, Iterator, List, Tuple
+from const import (DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_THRESHOLD, DEDUP_SHINGLE_WORDS, DEDUP_PREFIX_CHARS)
+
+# Trailing "read more" links that extractions of truncated review snippets often keep
+SNIPPET_MARKERS = ("read more", "see more", "show more", "more", "mehr lesen", "weiterlesen", "mehr",
+                   "lire la suite", "leggi di più")
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(42)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(DEDUP_NUM_PERM)]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase alphanumeric words, without trailing snippet markers."""
+    norm = " ".join(re.sub(r"[\W_]+", " ", (text or "").lower()).split())
+    stripped = True
+    while stripped:
+        stripped = False
+        for marker in SNIPPET_MARKERS:
+            if norm.endswith(" " + marker):
+                norm = norm[:-len(marker) - 1]
+                stripped = True
+    return norm
+
+
+def shingles(norm: str) -> frozenset:
+    """Hashed word shingles of a normalized text."""
+    words = norm.split()
+    n = DEDUP_SHINGLE_WORDS
+    return frozenset(zlib.crc32(" ".join(words[i:i + n]).encode()) for i in range(max(len(words) - n + 1, 1)))
+
+
+def minhash(shingle_set: frozenset) -> Tuple[int, ...]:
+    """MinHash signature of a shingle set (only used to find LSH candidates)."""
+    return tuple(min((a * x + b) % _MERSENNE_PRIME for x in shingle_set) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def review_key(rev: dict) -> tuple:
+    """Identifies an accepted review in the output (for 'replaces' markers)."""
+    return rev.get("website_url"), rev.get("review_text")
+
+
+def superseded(reviews: Iterable[dict]) -> set:
+    """Keys of output reviews that a later complete version replaces ('replaces' marker)."""
+    return {tuple(rev["replaces"]) for rev in reviews if rev.get("replaces")}
+
+
+def apply_replacements(reviews: Iterable[dict], replaced: set) -> Iterator[dict]:
+    """Output reviews without the replaced snippets; the complete versions lose their marker."""
+    for rev in reviews:
+        if review_key(rev) in replaced:
+            continue
+        yield {k: v for k, v in rev.items() if k != "replaces"} if "replaces" in rev else rev
+
+
+class DedupIndex:
+    """Run-wide near-duplicate index over review texts (MinHash/LSH plus a prefix index for snippets).
+
+    LSH over MinHash signatures finds the candidates; a review is dropped if its shingle Jaccard
+    similarity with a candidate is >= DEDUP_THRESHOLD or if it is a truncated snippet of one.
+    Only accepted reviews (those that reached the output, see DedupRecorder) are indexed, so a review
+    dropped later by verification or the budget does not block its copies. A complete review
+    replaces its snippet: within a batch the snippet is dropped; an already accepted snippet is
+    replaced in the output by a correction: the complete review carries 'replaces' (the snippet's
+    review_key), which save_results applies and a streamed reviews.jsonl keeps as is.
+    """
+
+    # Relation to a known review -> stats counter of the dropped one
+    DROPPED = {"duplicate": "duplicates", "snippet": "snippets_dropped", "complete": "snippets_replaced"}
+
+    def __init__(self):
+        self.entries = []  # [normalized text, shingles, signature, review_key]
+        self.buckets = [{} for _ in range(DEDUP_BANDS)]
+        self.prefixes = {}
+        self.stats = {"seen": 0, "duplicates": 0, "snippets_dropped": 0, "snippets_replaced": 0}
+        self._rows = DEDUP_NUM_PERM // DEDUP_BANDS
+        self._lock = threading.Lock()
+
+    def _bands(self, sig: tuple):
+        return [sig[i * self._rows:(i + 1) * self._rows] for i in range(DEDUP_BANDS)]
+
+    def _candidates(self, norm: str, sig: tuple) -> set:
+        ids = set()
+        for bucket, band in zip(self.buckets, self._bands(sig)):
+            ids.update(bucket.get(band, ()))
+        ids.update(self.prefixes.get(norm[:DEDUP_PREFIX_CHARS], ()))
+        return ids
+
+    def _insert(self, entry: list) -> int:
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        self._index(entry_id)
+        return entry_id
+
+    def _index(self, entry_id: int):
+        norm, _, sig, _ = self.entries[entry_id]
+        for bucket, band in zip(self.buckets, self._bands(sig)):
+            bucket.setdefault(band, []).append(entry_id)
+        if len(norm) >= DEDUP_PREFIX_CHARS:
+            self.prefixes.setdefault(norm[:DEDUP_PREFIX_CHARS], []).append(entry_id)
+
+    def _match(self, entry: list):
+        """(entry id, relation) of the first matching entry: 'duplicate', 'snippet' (new is a snippet
+        of the entry) or 'complete' (the entry is a snippet of new); (None, None) otherwise."""
+        norm, shingle_set, sig, _ = entry
+        for entry_id in sorted(self._candidates(norm, sig)):
+            known, known_shingles, _, _ = self.entries[entry_id]
+            if norm == known or jaccard(shingle_set, known_shingles) >= DEDUP_THRESHOLD:
+                return entry_id, "duplicate"
+            if len(norm) >= DEDUP_PREFIX_CHARS and known.startswith(norm):
+                return entry_id, "snippet"
+            if len(known) >= DEDUP_PREFIX_CHARS and norm.startswith(known):
+                return entry_id, "complete"
+        return None, None
+
+    @staticmethod
+    def _entry(rev: dict):
+        norm = normalize_text(rev.get("review_text"))
+        if not norm:
+            return None
+        shingle_set = shingles(norm)
+        return [norm, shingle_set, minhash(shingle_set), review_key(rev)]
+
+    def seed(self, reviews: List[dict]):
+        """Registers reviews accepted earlier (e.g. restored from a checkpoint) without counting them."""
+        with self._lock:
+            for rev in apply_replacements(reviews, superseded(reviews)):
+                entry = self._entry(rev)
+                if entry:
+                    self._insert(entry)
+
+    def filter(self, reviews: List[dict]) -> List[dict]:
+        """Returns the reviews of a newly extracted batch that are not duplicates of accepted ones
+        (or of each other). Nothing is indexed yet; see accept()."""
+        batch = DedupIndex()
+        kept = {}  # batch entry id -> review
+        textless = []  # Nothing to compare; left to repair and verification
+        with self._lock:
+            for rev in reviews:
+                self.stats["seen"] += 1
+                entry = self._entry(rev)
+                if not entry:
+                    textless.append(rev)
+                    continue
+                _, relation = self._match(entry)
+                if relation in ("duplicate", "snippet"):
+                    self.stats[self.DROPPED[relation]] += 1
+                    continue
+                # A complete version of an accepted snippet goes on; accept() turns it into a replacement
+                entry_id, relation = batch._match(entry)
+                if relation == "complete":
+                    # The complete text replaces its snippet of this batch
+                    self.stats["snippets_replaced"] += 1
+                    batch.entries[entry_id] = entry
+                    batch._index(entry_id)
+                    kept[entry_id] = rev
+                elif relation:
+                    self.stats[self.DROPPED[relation]] += 1
+                else:
+                    kept[batch._insert(entry)] = rev
+        unique = textless + list(kept.values())
+        if len(unique) < len(reviews):
+            print(f"  [DEDUP] Dropped {len(reviews) - len(unique)} duplicate reviews ({len(unique)} new).")
+        return unique
+
+    def accept(self, reviews: List[dict]) -> List[dict]:
+        """Indexes reviews that reach the output.
+
+        Reviews matching one accepted in the meantime (pages processed concurrently by fan-out or
+        the pipeline) are dropped; the complete version of an accepted snippet replaces it in the
+        index and is returned with a 'replaces' marker.
+        """
+        kept, replaced = [], 0
+        with self._lock:
+            for rev in reviews:
+                rev = {k: v for k, v in rev.items() if k != "replaces"} if "replaces" in rev else rev
+                entry = self._entry(rev)
+                if entry:
+                    entry_id, relation = self._match(entry)
+                    if relation == "complete":
+                        self.stats["snippets_replaced"] += 1
+                        rev = {**rev, "replaces": list(self.entries[entry_id][3])}
+                        self.entries[entry_id] = entry
+                        self._index(entry_id)
+                        replaced += 1
+                    elif relation:
+                        self.stats[self.DROPPED[relation]] += 1
+                        continue
+                    else:
+                        self._insert(entry)
+                kept.append(rev)
+        if len(kept) < len(reviews):
+            print(f"  [DEDUP] Dropped {len(reviews) - len(kept)} reviews accepted from another page meanwhile.")
+        if replaced:
+            print(f"  [DEDUP] Replaced {replaced} accepted snippets with their complete text.")
+        return kept
+
+    def summary(self) -> dict:
+        with self._lock:
+            dropped = self.stats["duplicates"] + self.stats["snippets_dropped"] + self.stats["snippets_replaced"]
+            return {**self.stats, "unique": len(self.entries),
+                    "dedup_ratio": dropped / self.stats["seen"] if self.stats["seen"] else 0.0}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_dedup_index(config: dict) -> DedupIndex:
+    """Returns the review index of the run identified by config['session_id'] (created on first use)."""
+    session_id = (config or {}).get("session_id")
+    with _indexes_lock:
+        if session_id not in _indexes:
+            _indexes[session_id] = DedupIndex()
+        return _indexes[session_id]
+
+
+class DedupRecorder:
+    """Graph listener: indexes the reviews an update adds to the output (runs before the sink and checkpointer).
+
+    Replacements (reviews with 'replaces') are corrections of an accepted review and add no count.
+    """
+
+    def on_update(self, node: str, state: dict, update: dict):
+        reviews = (update or {}).get("reviews")
+        if not reviews:
+            return None
+        kept = get_dedup_index(state.get("config")).accept(reviews)
+        added = sum(1 for rev in kept if not rev.get("replaces"))
+        if kept == list(reviews) and added == len(reviews):
+            return None
+        return {**update, "reviews": kept, "review_count": update["review_count"] - len(reviews) + added}
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import threading
+from collections import Counter
+from typing import Optional
+from const import (FINGERPRINT_FILE, FINGERPRINT_MAX_DISTANCE, FINGERPRINT_SHINGLE_WORDS,
+                   FINGERPRINT_MIN_WORDS)
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word shingles (weighted by count); None for pages too short to compare."""
+    words = (text or "").lower().split()
+    if len(words) < FINGERPRINT_MIN_WORDS:
+        return None
+    n = FINGERPRINT_SHINGLE_WORDS
+    counts = Counter(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    # Weights are summed per hash byte value (8 updates per shingle instead of 64), then spread to bits
+    byte_weights = [[0] * 256 for _ in range(8)]
+    for shingle, count in counts.items():
+        for pos, value in enumerate(hashlib.blake2b(shingle.encode(), digest_size=8).digest()):
+            byte_weights[pos][value] += count
+    total = sum(counts.values())
+    fp = 0
+    for pos, weights in enumerate(byte_weights):
+        for bit in range(8):
+            ones = sum(w for value, w in enumerate(weights) if w and value >> bit & 1)
+            if 2 * ones > total:
+                fp |= 1 << (pos * 8 + bit)
+    return fp
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class FingerprintStore:
+    """Fingerprints of analyzed pages per topic, persisted next to the HTML cache index.
+
+    Topics are normalized topic strings. Every entry keeps the page's analysis result (relevance,
+    extracted reviews, links) and the analysis settings (models, prompt layout, language) it was
+    produced with; a page from an earlier run is only reused under identical settings.
+    The file is append-only JSONL: one line per entry, a torn last line is ignored on load.
+    """
+
+    def __init__(self, path: str = FINGERPRINT_FILE):
+        self.path = path
+        self.topics = None
+        self._torn_tail = False   # The file does not end with a newline (interrupted write)
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.topics is None:
+            self.topics = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        self._torn_tail = not line.endswith("\n")
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # Torn write of an interrupted run
+                        self.topics.setdefault(entry["topic"], []).append(entry)
+            except OSError:
+                pass
+        return self.topics
+
+    def _count(self, session_id: str, key: str):
+        stats = self.stats.setdefault(session_id, {"checked": 0, "skipped": 0, "reused": 0})
+        stats[key] += 1
+
+    def match(self, topic: str, fp: int, url: str, session_id: str, settings: dict,
+              reuse: bool = False) -> Optional[dict]:
+        """Closest analyzed page of the topic within FINGERPRINT_MAX_DISTANCE, or None.
+
+        Candidates are pages of this run and, with reuse, pages of earlier runs with the same settings.
+        """
+        with self._lock:
+            self._count(session_id, "checked")
+            best, best_distance = None, FINGERPRINT_MAX_DISTANCE + 1
+            for entry in self._load().get(topic, []):
+                if entry["session_id"] == session_id:
+                    if entry["url"] == url:
+                        continue
+                elif not reuse or entry.get("settings") != settings:
+                    continue
+                d = distance(fp, int(entry["fingerprint"], 16))
+                if d < best_distance:
+                    best, best_distance = entry, d
+            if best:
+                self._count(session_id, "skipped" if best["session_id"] == session_id else "reused")
+            return best
+
+    def add(self, topic: str, fp: int, url: str, session_id: str, settings: dict, result: dict):
+        entry = {"topic": topic, "fingerprint": f"{fp:016x}", "url": url, "session_id": session_id,
+                 "settings": settings,
+                 "is_relevant": bool(result["relevance"] and result["relevance"]["is_relevant"]),
+                 "reviews": result["reviews"], "links": result["links"]}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._load().setdefault(topic, []).append(entry)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n" + line if self._torn_tail else line)
+            self._torn_tail = False
+
+    def summary(self, session_id: str) -> dict:
+        with self._lock:
+            return dict(self.stats.get(session_id, {"checked": 0, "skipped": 0, "reused": 0}))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fingerprint_store() -> FingerprintStore:
+    """Process-wide store (shared by all sessions of a batch)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FingerprintStore()
+        return _store
@@ -1,36 +1,112 @@
 import os
 import hashlib
 import json
-from langchain_ollama import ChatOllama
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
-from const import (HTML_CACHE_DIR, NUM_CTX, DEFAULT_LLM_URL, 
+import threading
+from budget import get_budget
+from tokens import count_tokens, calibrate, hold_num_ctx
+from monitor import record_llm_call, OLLAMA_METRIC_KEYS
+from profiling import span
+from const import (HTML_CACHE_DIR, PROMPT_TEMPLATE_DIR, NUM_CTX, DEFAULT_LLM_URL, 
                    DEFAULT_LLM_MODEL, DEFAULT_REASONING_MODEL, DEFAULT_TEMPERATURE)
 
-# Search Instance
-search_wrapper = DuckDuckGoSearchAPIWrapper()
+# Search client, created on first use (runs with seed URLs never search)
+_search_wrapper = None
+_search_wrapper_lock = threading.Lock()
 
 
-def get_llm(config: dict, use_reasoning: bool = False):
-    """Factory to create LLM instances dynamically from the state config."""
+def get_search_wrapper():
+    """Process-wide DuckDuckGoSearchAPIWrapper."""
+    global _search_wrapper
+    with _search_wrapper_lock:
+        if _search_wrapper is None:
+            from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+
+            _search_wrapper = DuckDuckGoSearchAPIWrapper()
+        return _search_wrapper
+
+
+def get_model_name(config: dict, use_reasoning: bool = False):
+    """Resolves the model name for the standard or reasoning LLM from the state config."""
     model_key = "llm_reasoning_model" if use_reasoning else "llm_model"
     # Provide defaults in case config is partial
-    model_name = config.get(
+    return config.get(
         model_key, DEFAULT_REASONING_MODEL if use_reasoning else DEFAULT_LLM_MODEL)
+
+
+# LLM clients and their structured-output wrappers are reused across nodes, runs and threads
+_llm_clients = {}
+_llm_clients_lock = threading.Lock()
+
+
+def get_llm(config: dict, use_reasoning: bool = False, num_ctx: int = NUM_CTX):
+    """Factory to create LLM instances dynamically from the state config (cached per settings)."""
+    model_name = get_model_name(config, use_reasoning)
     base_url = config.get("llm_url", DEFAULT_LLM_URL)
     temp = config.get("llm_temperature", DEFAULT_TEMPERATURE)
 
-    return ChatOllama(
-        model=model_name,
-        base_url=base_url,
-        temperature=temp,
-        format="json",
-        num_ctx=NUM_CTX
-    )
+    key = (model_name, base_url, temp, num_ctx)
+    with _llm_clients_lock:
+        if key not in _llm_clients:
+            from langchain_ollama import ChatOllama
+
+            _llm_clients[key] = ChatOllama(
+                model=model_name,
+                base_url=base_url,
+                temperature=temp,
+                format="json",
+                num_ctx=num_ctx
+            )
+        return _llm_clients[key]
+
+
+def get_structured_llm(config: dict, schema, use_reasoning: bool = False, num_ctx: int = NUM_CTX):
+    """Cached structured-output wrapper of get_llm for a pydantic schema.
+
+    The wrapper returns {"raw", "parsed", "parsing_error"} so that invoke_llm can read Ollama's metrics.
+    """
+    key = (get_model_name(config, use_reasoning), config.get("llm_url", DEFAULT_LLM_URL),
+           config.get("llm_temperature", DEFAULT_TEMPERATURE), num_ctx, schema)
+    with _llm_clients_lock:
+        structured = _llm_clients.get(key)
+    if structured is None:
+        structured = get_llm(config, use_reasoning, num_ctx).with_structured_output(schema, include_raw=True)
+        with _llm_clients_lock:
+            _llm_clients[key] = structured
+    return structured
+
+
+def invoke_llm(config: dict, schema, prompt: str, num_ctx: int = NUM_CTX,
+               use_reasoning: bool = False, run_name: str = None):
+    """Runs one structured-output LLM call, records its Ollama metrics and charges it to the run budget."""
+    model = get_model_name(config, use_reasoning)
+    estimate = count_tokens(prompt, model)
+    prompt_tokens = estimate
+    num_ctx = hold_num_ctx(model, num_ctx)
+    llm = get_structured_llm(config, schema, use_reasoning=use_reasoning, num_ctx=num_ctx)
+    try:
+        with span(f"llm.{schema.__name__}"):
+            response = llm.invoke(prompt, config={"run_name": run_name} if run_name else None)
+        metadata = getattr(response.get("raw"), "response_metadata", None) or {}
+        metrics = {"run_name": run_name, "model": model,
+                   **{k: metadata[k] for k in OLLAMA_METRIC_KEYS if metadata.get(k) is not None}}
+        record_llm_call(metrics)
+        evaluated = metrics.get("prompt_eval_count")
+        if evaluated:
+            prompt_tokens = evaluated
+            # Ollama only counts the tokens it evaluated: a reused prompt prefix makes the count far
+            # too low, so such calls are not used for calibration
+            if evaluated >= estimate / 2:
+                calibrate(model, prompt, evaluated)
+        if response.get("parsing_error"):
+            raise response["parsing_error"]
+        return response["parsed"]
+    finally:
+        get_budget(config).charge_llm_call(prompt_tokens)
 
 
-def load_prompt(filename):
+def load_prompt(filename, template_dir=PROMPT_TEMPLATE_DIR):
     """Loads text from a template file in the prompt_template folder."""
-    path = f"prompt_template/{filename}"
+    path = os.path.join(template_dir, filename)
     if os.path.exists(path):
         with open(path, "r", encoding="utf-8") as f:
             return f.read()
@@ -0,0 +1,89 @@
+import threading
+from typing import List, Tuple
+from const import LANGUAGE_SHORT_TEXT_CHARS, LANGUAGE_MIN_CONFIDENCE
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+class LinguaDetector:
+    """lingua-language-detector: deterministic, fast, batch detection in parallel (Rust core)."""
+
+    name = "lingua"
+
+    def __init__(self):
+        from lingua import LanguageDetectorBuilder
+
+        # Low accuracy mode uses trigrams only: much faster and smaller, accurate on review-length texts
+        self._detector = LanguageDetectorBuilder.from_all_languages().with_low_accuracy_mode().build()
+
+    def detect_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        results = []
+        for values in self._detector.compute_language_confidence_values_in_parallel(texts):
+            top = values[0] if values else None
+            results.append((top.language.iso_code_639_1.name.lower(), top.value) if top else (None, 0.0))
+        return results
+
+
+class LangdetectDetector:
+    """Fallback on langdetect, seeded so that the same text always gets the same result."""
+
+    name = "langdetect"
+
+    def __init__(self):
+        from langdetect import DetectorFactory
+
+        DetectorFactory.seed = 0
+
+    def detect_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        from langdetect import detect_langs
+        from langdetect.lang_detect_exception import LangDetectException
+
+        results = []
+        for text in texts:
+            try:
+                top = detect_langs(text)[0]
+                results.append((top.lang.split("-")[0], top.prob))
+            except LangDetectException:
+                results.append((None, 0.0))
+        return results
+
+
+def get_detector():
+    """Process-wide detector: lingua if installed, else seeded langdetect."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            try:
+                _detector = LinguaDetector()
+            except ImportError:
+                _detector = LangdetectDetector()
+        return _detector
+
+
+def filter_by_language(reviews: List[dict], target: str) -> Tuple[List[dict], dict]:
+    """Drops reviews that are confidently written in another language than target.
+
+    Short-text policy: reviews under LANGUAGE_SHORT_TEXT_CHARS and detections below
+    LANGUAGE_MIN_CONFIDENCE are kept (detection is unreliable there; the LLM verification decides).
+    Returns the kept reviews and counts of the decisions.
+    """
+    target = target.lower()
+    stats = {"detector": get_detector().name, "checked": len(reviews), "rejected": 0,
+             "short_kept": 0, "uncertain_kept": 0}
+    long_idx = [i for i, rev in enumerate(reviews)
+                if len((rev.get("review_text") or "").strip()) >= LANGUAGE_SHORT_TEXT_CHARS]
+    stats["short_kept"] = len(reviews) - len(long_idx)
+    detected = dict(zip(long_idx, get_detector().detect_batch([reviews[i]["review_text"] for i in long_idx])))
+
+    kept = []
+    for i, rev in enumerate(reviews):
+        lang, confidence = detected.get(i, (target, 1.0))
+        if lang == target:
+            kept.append(rev)
+        elif confidence < LANGUAGE_MIN_CONFIDENCE:
+            stats["uncertain_kept"] += 1
+            kept.append(rev)
+        else:
+            stats["rejected"] += 1
+    return kept, stats
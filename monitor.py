@@ -1,88 +1,318 @@
 import os
 import time
+import atexit
+import random
+import bisect
 import threading
-import paramiko
+import subprocess
+from abc import ABC, abstractmethod
+from collections import deque
 from dotenv import load_dotenv
+from const import GPU_SAMPLE_INTERVAL_MS, GPU_SAMPLE_BUFFER, GPU_FAKE_WATTS
 
 load_dotenv()
 
+# nvidia-smi streams one power reading per GPU every GPU_SAMPLE_INTERVAL_MS
+NVIDIA_SMI_COMMAND = ("nvidia-smi --query-gpu=power.draw --format=csv,noheader,nounits "
+                      f"--loop-ms={GPU_SAMPLE_INTERVAL_MS}")
+GPU_SAMPLERS = ("ssh", "local", "fake", "none")
+# Per-call inference metrics reported by Ollama (durations in nanoseconds)
+OLLAMA_METRIC_KEYS = ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration",
+                      "load_duration", "total_duration")
 
-class GPUMonitor:
-    def __init__(self):
-        self.host = os.getenv("SSH_HOST")
-        self.user = os.getenv("SSH_USER")
-        self.password = os.getenv("SSH_PASSWORD")
-        self.wattage_readings = []
+
+class PowerSampler(ABC):
+    """Long-lived GPU power sampler with a timestamped ring buffer.
+
+    One sampler runs per process; steps query the readings of their own time window.
+    Subclasses implement _run(), which calls _add() for every reading until _stop_event is set.
+    """
+
+    def __init__(self, interval_ms: int = GPU_SAMPLE_INTERVAL_MS, buffer_size: int = GPU_SAMPLE_BUFFER):
+        self.interval = interval_ms / 1000
+        self._times = deque(maxlen=buffer_size)
+        self._watts = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
         self._stop_event = threading.Event()
         self._thread = None
-        self._ssh = None
 
-    def _connect(self):
-        try:
-            self._ssh = paramiko.SSHClient()
-            self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self._ssh.connect(self.host, username=self.user,
-                              password=self.password, timeout=5)
-            return True
-        except Exception as e:
-            print(f"  [GPU MONITOR] SSH Connection failed: {e}")
-            return False
+    def _add(self, watts: float, timestamp: float = None):
+        with self._lock:
+            self._times.append(timestamp or time.time())
+            self._watts.append(watts)
 
-    def _monitor_loop(self):
-        if not self._ssh:
-            return
+    @abstractmethod
+    def _run(self):
+        """Produces readings via _add() until _stop_event is set."""
 
-        while not self._stop_event.is_set():
-            try:
-                # nvidia-smi command to get current power draw in Watts
-                stdin, stdout, stderr = self._ssh.exec_command(
-                    "nvidia-smi --query-gpu=power.draw --format=csv,noheader,nounits")
-                output = stdout.read().decode().strip()
-                if output:
-                    self.wattage_readings.append(float(output))
-                time.sleep(0.1)
-            except Exception:
-                break
+    def _loop(self):
+        try:
+            self._run()
+        except Exception as e:
+            print(f"  [GPU MONITOR] Sampler stopped: {e}")
 
     def start(self):
-        if self._connect():
+        if self._thread is None:
             self._stop_event.clear()
-            self.wattage_readings = []
-            self._thread = threading.Thread(
-                target=self._monitor_loop, daemon=True)
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="gpu-sampler")
             self._thread.start()
+        return self
 
     def stop(self):
         self._stop_event.set()
         if self._thread:
             self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def samples(self, start: float, end: float) -> list:
+        """(timestamp, watts) readings taken between start and end.
+
+        A window shorter than the sampling interval gets the last reading before its end.
+        """
+        with self._lock:
+            times, watts = list(self._times), list(self._watts)
+        lo, hi = bisect.bisect_left(times, start), bisect.bisect_right(times, end)
+        if lo < hi:
+            return list(zip(times[lo:hi], watts[lo:hi]))
+        if hi and end - times[hi - 1] <= 2 * self.interval:
+            return [(times[hi - 1], watts[hi - 1])]
+        return []
+
+    def covers(self, start: float) -> bool:
+        """True if the buffer still holds the readings from start on (older ones are evicted)."""
+        with self._lock:
+            return bool(self._times) and self._times[0] <= start
+
+    def mean_power(self, start: float, end: float) -> float:
+        readings = self.samples(start, end)
+        return sum(w for _, w in readings) / len(readings) if readings else 0.0
+
+    def energy(self, start: float, end: float) -> float:
+        """Trapezoid-integrated energy in joules between start and end.
+
+        The first and last readings are held constant up to the window bounds.
+        """
+        readings = [(t, w) for t, w in self.samples(start, end)]
+        if not readings:
+            return 0.0
+        points = [(start, readings[0][1])] + [r for r in readings if start < r[0] < end] + [(end, readings[-1][1])]
+        return sum((t2 - t1) * (w1 + w2) / 2 for (t1, w1), (t2, w2) in zip(points, points[1:]))
+
+
+class CommandPowerSampler(PowerSampler):
+    """Reads the streaming nvidia-smi output line by line (one reading per line)."""
+
+    @abstractmethod
+    def _lines(self):
+        """Iterator over the output lines of the sampling command."""
+
+    def _run(self):
+        for line in self._lines():
+            if self._stop_event.is_set():
+                break
+            try:
+                self._add(float(line.strip()))
+            except ValueError:
+                continue
+
+
+class SSHPowerSampler(CommandPowerSampler):
+    """Runs `nvidia-smi --loop-ms` once over a single SSH session on the GPU host."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.host = os.getenv("SSH_HOST")
+        self.user = os.getenv("SSH_USER")
+        self.password = os.getenv("SSH_PASSWORD")
+        self._ssh = None
+
+    def _lines(self):
+        import paramiko
+
+        self._ssh = paramiko.SSHClient()
+        self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self._ssh.connect(self.host, username=self.user, password=self.password, timeout=5)
+        _, stdout, _ = self._ssh.exec_command(NVIDIA_SMI_COMMAND)
+        return iter(stdout.readline, "")
+
+    def stop(self):
+        self._stop_event.set()
         if self._ssh:
+            # Closing the session ends the remote nvidia-smi and unblocks readline
             self._ssh.close()
+            self._ssh = None
+        super().stop()
+
+
+class LocalPowerSampler(CommandPowerSampler):
+    """Runs `nvidia-smi --loop-ms` on this machine."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._process = None
+
+    def _lines(self):
+        self._process = subprocess.Popen(NVIDIA_SMI_COMMAND.split(), stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, text=True)
+        return iter(self._process.stdout.readline, "")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._process:
+            self._process.terminate()
+            self._process = None
+        super().stop()
 
-        if self.wattage_readings:
-            return sum(self.wattage_readings) / len(self.wattage_readings)
-        return 0.0
+
+class FakePowerSampler(PowerSampler):
+    """Synthetic readings around GPU_FAKE_WATTS for tests and runs without a GPU."""
+
+    def __init__(self, watts: float = GPU_FAKE_WATTS, jitter: float = 0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.watts = watts
+        self.jitter = jitter
+        self._random = random.Random(0)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._add(self.watts * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+
+class NullPowerSampler(PowerSampler):
+    """No GPU monitoring: every window reads 0 W."""
+
+    def _run(self):
+        pass
+
+    def start(self):
+        return self
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def create_sampler(kind: str = None) -> PowerSampler:
+    """Builds the sampler selected by GPU_SAMPLER (default: 'ssh' if SSH_HOST is set, else 'none')."""
+    kind = (kind or os.getenv("GPU_SAMPLER") or ("ssh" if os.getenv("SSH_HOST") else "none")).lower()
+    if kind not in GPU_SAMPLERS:
+        raise ValueError(f"Unknown GPU_SAMPLER '{kind}'. Choose from {GPU_SAMPLERS}.")
+    return {"ssh": SSHPowerSampler, "local": LocalPowerSampler,
+            "fake": FakePowerSampler, "none": NullPowerSampler}[kind]()
+
+
+def get_sampler() -> PowerSampler:
+    """Process-wide sampler, started on first use and stopped at exit."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = create_sampler().start()
+            atexit.register(_sampler.stop)
+        return _sampler
+
+
+# The innermost TrackStep of each thread collects the LLM calls made inside it
+_current = threading.local()
+
+
+def record_llm_call(metrics: dict):
+    """Attaches the metrics of one LLM call to the step running in this thread (if any)."""
+    step = getattr(_current, "step", None)
+    if step is not None:
+        step.llm_calls.append(metrics)
 
 
 class TrackStep:
     def __init__(self, step_name):
         self.step_name = step_name
-        self.monitor = GPUMonitor()
+        self.sampler = get_sampler()
         self.start_time = None
+        self.llm_calls = []
 
     def __enter__(self):
-        print(f"  [METRICS] Starting monitor for '{self.step_name}'...")
-        self.monitor.start()
+        print(f"  [METRICS] Tracking '{self.step_name}'...")
+        self._parent = getattr(_current, "step", None)
+        _current.step = self
         self.start_time = time.time()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        duration = time.time() - self.start_time
-        avg_wattage = self.monitor.stop()
+        end_time = time.time()
+        _current.step = self._parent
+        duration = end_time - self.start_time
+        avg_wattage = self.sampler.mean_power(self.start_time, end_time)
+        energy = self.sampler.energy(self.start_time, end_time)
         print(
-            f"  [METRICS] Step '{self.step_name}' finished. Duration: {duration:.2f}s, Avg GPU Power: {avg_wattage:.2f}W")
+            f"  [METRICS] Step '{self.step_name}' finished. Duration: {duration:.2f}s, "
+            f"Avg GPU Power: {avg_wattage:.2f}W, Energy: {energy:.1f}J, LLM calls: {len(self.llm_calls)}")
         self.result = {
             "step": self.step_name,
+            "start": self.start_time,
+            "end": end_time,
             "duration": duration,
-            "avg_gpu_power_watts": avg_wattage
+            "avg_gpu_power_watts": avg_wattage,
+            "energy_joules": energy,
+            "llm_calls": self.llm_calls
         }
+
+
+def window_energy(start: float, end: float, step: dict) -> float:
+    """Energy between start and end (inside the window of step): integrated while the sampler
+    still holds the readings, else the step's share of its own measured energy."""
+    sampler = get_sampler()
+    if sampler.covers(start):
+        return sampler.energy(start, end)
+    return step["energy_joules"] * (end - start) / step["duration"] if step["duration"] else 0.0
+
+
+def run_energy(step_metrics: list) -> float:
+    """Energy of a run in joules without double counting steps that overlapped (fan-out, pipeline).
+
+    Isolated steps use their own energy; groups of overlapping steps are integrated once over
+    their combined window. If the sampler buffer no longer holds that window (long runs), the
+    group's mean power (from the energies measured when its steps finished) is applied to it.
+    """
+    steps = sorted((m for m in step_metrics if "start" in m), key=lambda m: m["start"])
+    total = sum(m.get("energy_joules", m["duration"] * m["avg_gpu_power_watts"])
+                for m in step_metrics if "start" not in m)
+    group = []
+    for m in steps + [None]:
+        if group and (m is None or m["start"] >= max(g["end"] for g in group)):
+            start, end = group[0]["start"], max(g["end"] for g in group)
+            if len(group) == 1:
+                total += group[0]["energy_joules"]
+            elif get_sampler().covers(start):
+                total += get_sampler().energy(start, end)
+            else:
+                busy = sum(g["duration"] for g in group)
+                total += sum(g["energy_joules"] for g in group) * (end - start) / busy if busy else 0.0
+            group = []
+        if m is not None:
+            group.append(m)
+    return total
+
+
+def summarize_metrics(step_metrics: list, review_count: int) -> dict:
+    """Run-level energy and inference figures for the results summary."""
+    step_metrics = list(step_metrics)
+    calls = [c for m in step_metrics for c in m.get("llm_calls", [])]
+    duration = sum(m["duration"] for m in step_metrics)
+    energy = run_energy(step_metrics)
+    prompt_tokens = sum(c.get("prompt_eval_count", 0) for c in calls)
+    eval_tokens = sum(c.get("eval_count", 0) for c in calls)
+    prompt_seconds = sum(c.get("prompt_eval_duration", 0) for c in calls) / 1e9
+    eval_seconds = sum(c.get("eval_duration", 0) for c in calls) / 1e9
+    return {
+        "total_duration": duration,
+        # Duration-weighted: energy of all steps over their total duration
+        "total_avg_wattage": sum(m.get("energy_joules", 0) for m in step_metrics) / duration if duration else 0,
+        "total_energy_joules": energy,
+        "llm_calls": len(calls),
+        "prompt_tokens": prompt_tokens,
+        "eval_tokens": eval_tokens,
+        "load_seconds": sum(c.get("load_duration", 0) for c in calls) / 1e9,
+        "prompt_tokens_per_second": prompt_tokens / prompt_seconds if prompt_seconds else 0,
+        "eval_tokens_per_second": eval_tokens / eval_seconds if eval_seconds else 0,
+        "joules_per_review": energy / review_count if review_count else 0,
+        "joules_per_token": energy / (prompt_tokens + eval_tokens) if prompt_tokens + eval_tokens else 0,
+    }
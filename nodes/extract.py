@@ -1,19 +1,33 @@
 from monitor import TrackStep
+from profiling import span, profiled
 import os
 import json
+import threading
 import requests
+from functools import lru_cache
 from typing import List, Optional
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
 from langsmith import traceable
 from const import (HTML_CACHE_DIR, CACHE_INDEX_FILE, 
-                   MAX_FILTER_SNIPPET, MAX_EXTRACT_SNIPPET, MAX_DETECT_SNIPPET,
-                   DEFAULT_MAX_REVIEWS, FETCH_TIMEOUT_SECONDS, USER_AGENT_STRING)
-from helpers import load_prompt, get_llm, get_cache_path
+                   MAX_FILTER_TOKENS, MAX_DETECT_TOKENS,
+                   FILTER_OUTPUT_TOKENS, EXTRACT_OUTPUT_TOKENS, DETECT_OUTPUT_TOKENS,
+                   DEFAULT_MAX_REVIEWS, FETCH_TIMEOUT_SECONDS, USER_AGENT_STRING, PAGE_TEXT_CACHE_SIZE,
+                   DEFAULT_DEDUP, DEFAULT_PAGE_FINGERPRINT, DEFAULT_FINGERPRINT_REUSE, DEFAULT_PROMPT_LAYOUT)
+from helpers import invoke_llm, get_model_name, get_cache_path
+from budget import get_budget
+from dedup import get_dedup_index
+from fingerprint import simhash, get_fingerprint_store
+from nodes.prompts import get_prompt
+from tokens import fit_prompt
 from nodes.state import GraphState
+from nodes.frontier import URLFrontier
+from nodes.retrieval import normalize_query
 from nodes.models import PageRelevanceResult, Review, ExtractionResult, ReviewLinksDetection
 url_cache = {}
 global_cache_index = None
+# Guards the shared cache index when several URLs are processed in parallel (fan-out mode)
+cache_index_lock = threading.Lock()
 
 
 def get_cache_index():
@@ -36,14 +50,20 @@ def get_cache_index():
 
 def save_to_cache_index(url: str, filename: str):
     """Saves a URL-to-file mapping to the disk index and global variable."""
-    index = get_cache_index()
-    index[url] = filename
-    with open(CACHE_INDEX_FILE, "w", encoding="utf-8") as f:
-        json.dump(index, f, indent=2)
+    with cache_index_lock:
+        index = get_cache_index()
+        index[url] = filename
+        with open(CACHE_INDEX_FILE, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+
+
+# HTTP GET used for page fetches (replay.py swaps it to record or replay a run)
+http_get = requests.get
 
 
-def fetch_content(url: str):
-    """Fetches URL content with disk and in-memory caching."""
+@profiled("fetch")
+def fetch_content(url: str, config: dict = None):
+    """Fetches URL content with disk and in-memory caching (network bytes are charged to the run budget)."""
     if url in url_cache:
         return url_cache[url]
 
@@ -70,8 +90,10 @@ def fetch_content(url: str):
 
     print(f"  Fetching {url}...")
     try:
-        res = requests.get(url, timeout=FETCH_TIMEOUT_SECONDS, headers={
+        with span("fetch.network"):
+            res = http_get(url, timeout=FETCH_TIMEOUT_SECONDS, headers={
                            "User-Agent": USER_AGENT_STRING})
+        get_budget(config).charge("fetched_bytes", len(res.content))
         if res.status_code == 200:
             content = res.text
             with open(cache_path, "w", encoding="utf-8") as f:
@@ -87,6 +109,173 @@ def fetch_content(url: str):
     return None
 
 
+@lru_cache(maxsize=PAGE_TEXT_CACHE_SIZE)
+def clean_page(content: str) -> str:
+    """Strips boilerplate tags from raw HTML and returns the visible page text (memoized per page)."""
+    with span("clean_html"):
+        soup = BeautifulSoup(content, "html.parser")
+
+        removed_tags = ["script", "style", "header",
+                        "footer", "nav", "aside", "iframe", "svg"]
+        for element in soup(removed_tags):
+            element.decompose()
+
+        return soup.get_text(separator="\n", strip=True)
+
+
+def is_forbidden(url: str, config: dict) -> bool:
+    """True if the URL matches one of the configured forbidden domains/fragments."""
+    forbidden_urls = [f.lower().strip() for f in config.get("forbidden_urls", [])]
+    return any(forbidden in url.lower() for forbidden in forbidden_urls if forbidden)
+
+
+def analyze_page(url: str, page_text: str, query: str, config: dict, is_discovery: bool,
+                 topic: str = None) -> dict:
+    """Runs relevance check, review extraction and link discovery on one cleaned page.
+
+    Returns {"relevance": audit entry, "reviews": [...], "links": [...]}; reviews and links
+    stay empty for irrelevant pages. With page fingerprints enabled, a page near-identical to one
+    analyzed earlier in this run is skipped; with fingerprint reuse, one from an earlier run of the
+    topic with the same analysis settings reuses that run's result (no LLM calls in both cases).
+    """
+    fp = simhash(page_text) if config.get("fingerprint", DEFAULT_PAGE_FINGERPRINT) else None
+    topic = normalize_query(topic or query)
+    session_id = config.get("session_id")
+    settings = analysis_settings(config)
+    match = None
+    if fp is not None:
+        match = get_fingerprint_store().match(topic, fp, url, session_id, settings,
+                                              reuse=config.get("fingerprint_reuse", DEFAULT_FINGERPRINT_REUSE))
+
+    if match and match["session_id"] == session_id:
+        print(f"  [FINGERPRINT] Near-duplicate of {match['url']} (already analyzed in this run). Skipping.")
+        result = {"relevance": {"url": url, "is_relevant": False, "cache_id": os.path.basename(get_cache_path(url)),
+                                "duplicate_of": match["url"]},
+                  "reviews": [], "links": []}
+    elif match:
+        print(f"  [FINGERPRINT] Near-duplicate of {match['url']} (earlier run). Reusing its extraction.")
+        result = reuse_analysis(match, url, is_discovery, config)
+    else:
+        result = run_page_llms(url, page_text, query, config, is_discovery)
+        if fp is not None:
+            get_fingerprint_store().add(topic, fp, url, session_id, settings, result)
+
+    if result["reviews"] and config.get("dedup", DEFAULT_DEDUP):
+        # Duplicates from pagination/mirrors are dropped before they reach repair and verification
+        result["reviews"] = get_dedup_index(config).filter(result["reviews"])
+    return result
+
+
+def analysis_settings(config: dict) -> dict:
+    """Settings that determine a page's analysis result (stored results are only reused if they match)."""
+    return {"llm_model": get_model_name(config), "llm_reasoning_model": get_model_name(config, use_reasoning=True),
+            "prompt_layout": config.get("prompt_layout", DEFAULT_PROMPT_LAYOUT),
+            "language": config.get("language"), "disable_discovery": bool(config.get("disable_discovery"))}
+
+
+def reuse_analysis(entry: dict, url: str, is_discovery: bool, config: dict) -> dict:
+    """Analysis result of url taken over from a stored fingerprint entry of another page."""
+    cache_id = os.path.basename(get_cache_path(url))
+    result = {"relevance": {"url": url, "is_relevant": entry["is_relevant"], "cache_id": cache_id,
+                            "duplicate_of": entry["url"]},
+              "reviews": [], "links": []}
+    if not entry["is_relevant"]:
+        return result
+    result["reviews"] = [{**rev, "website_url": url, "cache_id": cache_id, "found_via_discovery": is_discovery}
+                         for rev in entry["reviews"]]
+    if not config.get("disable_discovery"):
+        result["links"] = list(entry["links"])
+    return result
+
+
+def run_page_llms(url: str, page_text: str, query: str, config: dict, is_discovery: bool) -> dict:
+    """The LLM part of analyze_page (relevance, extraction, link detection), before dedup."""
+    cache_id = os.path.basename(get_cache_path(url))
+    result = {"relevance": None, "reviews": [], "links": []}
+
+    # Templates & LLM
+    filter_page = get_prompt("02_filter_page.md", config)
+    filter_page_template, filter_page_schema = filter_page.template, filter_page.schema
+
+    # 0. Check Page Relevance
+    print("  Checking page relevance...")
+    filter_prompt, filter_ctx = fit_prompt(
+        filter_page_template, "page_snippet", page_text,
+        reserved_output=FILTER_OUTPUT_TOKENS, max_content_tokens=MAX_FILTER_TOKENS,
+        model=get_model_name(config, use_reasoning=True),
+        query=query, json_schema=filter_page_schema)
+
+    try:
+        # Dynamic LLM for filtering
+        relevance_response = invoke_llm(
+            config, PageRelevanceResult, filter_prompt, num_ctx=filter_ctx,
+            use_reasoning=True, run_name="Check-Page-Relevance")
+        is_rel = relevance_response and relevance_response.is_relevant
+        result["relevance"] = {"url": url, "is_relevant": is_rel, "cache_id": cache_id}
+
+        if not is_rel:
+            print(f"  [PAGE NOT RELEVANT] Skipping: {url}")
+            return result
+        print("  [PAGE RELEVANT] Proceeding...")
+    except Exception as e:
+        print(f"  Warning: Relevance check failed: {e}. Proceeding.")
+        result["relevance"] = {"url": url, "is_relevant": True, "cache_id": cache_id}
+
+    # 1. Extract Reviews
+    extract = get_prompt("03_extract_reviews.md", config)
+    extract_template, extract_schema = extract.template, extract.schema
+
+    print("  Extracting reviews...")
+    extract_prompt, extract_ctx = fit_prompt(
+        extract_template, "page_text", page_text,
+        reserved_output=EXTRACT_OUTPUT_TOKENS, model=get_model_name(config),
+        json_schema=extract_schema)
+
+    # Standard LLM for extraction
+    extract_response = invoke_llm(
+        config, ExtractionResult, extract_prompt, num_ctx=extract_ctx, run_name="Extract-Reviews")
+
+    if extract_response and extract_response.reviews:
+        for rev in extract_response.reviews:
+            rev_dict = rev.model_dump()
+            rev_dict["website_url"] = url
+            rev_dict["cache_id"] = cache_id
+            # Manual assignment - not predicted by LLM
+            rev_dict["found_via_discovery"] = is_discovery
+            result["reviews"].append(rev_dict)
+        print(f"  Extracted {len(result['reviews'])} new reviews.")
+    else:
+        print("  No reviews found on this page.")
+
+    # 2. Detect Links (optional check via config)
+    if config.get("disable_discovery"):
+        print("  Link discovery is disabled in config.")
+    else:
+        detect = get_prompt("04_detect_review_links.md", config)
+        detect_template, detect_schema = detect.template, detect.schema
+
+        print("  Detecting links...")
+        detect_prompt, detect_ctx = fit_prompt(
+            detect_template, "page_text", page_text,
+            reserved_output=DETECT_OUTPUT_TOKENS, max_content_tokens=MAX_DETECT_TOKENS,
+            model=get_model_name(config), base_url=url, json_schema=detect_schema)
+
+        # Standard LLM for detection
+        detect_response = invoke_llm(
+            config, ReviewLinksDetection, detect_prompt, num_ctx=detect_ctx, run_name="Discover-Review-Links")
+
+        if detect_response and detect_response.urls:
+            for l in detect_response.urls:
+                if not l:
+                    continue
+                full_url = urljoin(url, l)
+                # Respect forbidden URLs; the frontier drops visited/queued duplicates
+                if full_url.startswith('http') and not is_forbidden(full_url, config):
+                    result["links"].append(full_url)
+
+    return result
+
+
 @traceable(run_type="chain", name="Extract-and-Discover Node")
 def extract_and_detect_node(state: GraphState):
     with TrackStep("Extract and Detect") as tracker:
@@ -94,156 +283,64 @@ def extract_and_detect_node(state: GraphState):
         query = state["query"]
         config = state.get("config", {})
         max_reviews = state.get("max_reviews", config.get("max_reviews", DEFAULT_MAX_REVIEWS))
-        all_reviews = state.get("reviews", []) or []
+        review_count = state.get("review_count", 0)
 
-        if len(all_reviews) >= max_reviews:
+        if review_count >= max_reviews:
             print(
-                f"  [LIMIT] Already reached {len(all_reviews)}/{max_reviews}. Stopping.")
+                f"  [LIMIT] Already reached {review_count}/{max_reviews}. Stopping.")
             # Clear queue to stop graph
-            return {"temp_reviews": [], "found_review_urls": []}
+            frontier = URLFrontier.coerce(state.get("found_review_urls"))
+            frontier.clear()
+            return {"temp_reviews": [], "found_review_urls": frontier}
 
         # We process ONE URL from the queue
-        queue = state.get("found_review_urls", [])
-        visited_urls = state.get("visited_urls", []) or []
-        relevance_results = state.get("relevance_results", []) or []
-
-        # If queue is empty, we are done
-        if not queue:
+        frontier = URLFrontier.coerce(state.get("found_review_urls"))
+        # Append-only fields: the node only returns what it adds (see GraphState reducers)
+        visited_urls = []
+        relevance_results = []
+
+        # If queue is empty, we are done (pop skips URLs that were already visited).
+        # While a streaming search is still running, wait for its next results first.
+        frontier.wait_for_urls()
+        url = frontier.pop()
+        if not url:
             print("  Queue is empty. Moving on.")
-            return {"temp_reviews": []}
-
-        url = queue.pop(0)
-        if not url or url in visited_urls:
-            print(f"  Skipping (already visited or empty): {url}")
-            return {"found_review_urls": queue, "temp_reviews": []}
+            return {"found_review_urls": frontier, "temp_reviews": []}
+        frontier.mark_visited(url)
 
         # Safety check for forbidden URLs
-        forbidden_urls = [f.lower().strip() for f in config.get("forbidden_urls", [])]
-        if any(forbidden in url.lower() for forbidden in forbidden_urls if forbidden):
+        if is_forbidden(url, config):
             print(f"  [FORBIDDEN] Skip forbidden URL: {url}")
             # Mark it as visited to avoid redundant checks
-            new_visited = visited_urls + [url]
-            return {"found_review_urls": queue, "visited_urls": new_visited, "temp_reviews": []}
+            return {"found_review_urls": frontier, "visited_urls": [url], "temp_reviews": [], "page_urls": [url]}
 
         # Determine if URL was discovered via BFS or was part of seed/initial search
-        is_discovery = url not in state.get("seed_urls", [])
+        is_discovery = frontier.source_of(url) == "discovery"
 
         print(f"Processing URL: {url} (Discovery: {is_discovery})")
-        content = fetch_content(url)
+        content = fetch_content(url, config)
         visited_urls.append(url)
 
         new_batch = []
-        updated_queue = list(queue)
 
         if content:
-            # Save cache id
-            cache_path = get_cache_path(url)
-            cache_id = os.path.basename(cache_path)
-
-            soup = BeautifulSoup(content, "html.parser")
-
-            removed_tags = ["script", "style", "header",
-                            "footer", "nav", "aside", "iframe", "svg"]
-            for element in soup(removed_tags):
-                element.decompose()
-
-            page_text = soup.get_text(separator="\n", strip=True)
-
-            # Templates & LLM
-            filter_page_template = load_prompt("02_filter_page.md")
-            filter_page_schema = json.dumps(
-                PageRelevanceResult.model_json_schema(), indent=2)
-
-            # Dynamic LLM for filtering
-            llm_reasoning = get_llm(config, use_reasoning=True)
-            structured_llm_filter = llm_reasoning.with_structured_output(
-                PageRelevanceResult)
-
-            # 0. Check Page Relevance
-            print("  Checking page relevance...")
-            filter_prompt = filter_page_template.format(
-                query=query, page_snippet=page_text[:MAX_FILTER_SNIPPET], json_schema=filter_page_schema)
-            try:
-                relevance_response = structured_llm_filter.invoke(
-                    filter_prompt, config={"run_name": "Check-Page-Relevance"})
-                is_rel = relevance_response and relevance_response.is_relevant
-                relevance_results.append(
-                    {"url": url, "is_relevant": is_rel, "cache_id": cache_id})
-
-                if not is_rel:
-                    print(f"  [PAGE NOT RELEVANT] Skipping: {url}")
-                    return {"found_review_urls": updated_queue, "visited_urls": visited_urls, "relevance_results": relevance_results, "temp_reviews": []}
-                print("  [PAGE RELEVANT] Proceeding...")
-            except Exception as e:
-                print(f"  Warning: Relevance check failed: {e}. Proceeding.")
-                relevance_results.append(
-                    {"url": url, "is_relevant": True, "cache_id": cache_id})
-
-            # 1. Extract Reviews
-            extract_template = load_prompt("03_extract_reviews.md")
-            extract_schema = json.dumps(
-                ExtractionResult.model_json_schema(), indent=2)
-
-            # Standard LLM for extraction
-            llm = get_llm(config)
-            structured_llm_extract = llm.with_structured_output(
-                ExtractionResult)
-
-            print("  Extracting reviews...")
-            extract_prompt = extract_template.format(
-                page_text=page_text[:MAX_EXTRACT_SNIPPET], json_schema=extract_schema)
-            extract_response = structured_llm_extract.invoke(
-                extract_prompt, config={"run_name": "Extract-Reviews"})
-
-            if extract_response and extract_response.reviews:
-                for rev in extract_response.reviews:
-                    rev_dict = rev.model_dump()
-                    rev_dict["website_url"] = url
-                    rev_dict["cache_id"] = cache_id
-                    # Manual assignment - not predicted by LLM
-                    rev_dict["found_via_discovery"] = is_discovery
-                    new_batch.append(rev_dict)
-                print(f"  Extracted {len(new_batch)} new reviews.")
-            else:
-                print("  No reviews found on this page.")
-
-            # 2. Detect Links (optional check via config)
-            if state["config"].get("disable_discovery"):
-                print("  Link discovery is disabled in config.")
-            else:
-                detect_template = load_prompt("04_detect_review_links.md")
-                detect_schema = json.dumps(
-                    ReviewLinksDetection.model_json_schema(), indent=2)
-
-                # Standard LLM for detection
-                llm = get_llm(config)
-                structured_llm_detect = llm.with_structured_output(
-                    ReviewLinksDetection)
-
-                print("  Detecting links...")
-                detect_prompt = detect_template.format(
-                    page_text=page_text[:MAX_DETECT_SNIPPET], base_url=url, json_schema=detect_schema)
-                detect_response = structured_llm_detect.invoke(
-                    detect_prompt, config={"run_name": "Discover-Review-Links"})
-
-                if detect_response and detect_response.urls:
-                    for l in detect_response.urls:
-                        if not l:
-                            continue
-                        full_url = urljoin(url, l)
-                        if full_url.startswith('http') and full_url not in visited_urls and full_url not in updated_queue:
-                            # Respect forbidden URLs
-                            if not any(f in full_url.lower() for f in forbidden_urls):
-                                updated_queue.append(full_url)
-                    print(f"  Updated queue size: {len(updated_queue)}")
-
-    metrics = state.get("step_metrics", [])
-    metrics.append(tracker.result)
+            page = analyze_page(url, clean_page(content), query, config, is_discovery, state.get("topic"))
+            relevance_results.append(page["relevance"])
+            frontier.record_relevance(url, page["relevance"]["is_relevant"])
+
+            if not page["relevance"]["is_relevant"]:
+                return {"found_review_urls": frontier, "visited_urls": visited_urls, "relevance_results": relevance_results, "temp_reviews": [], "page_urls": [url]}
+
+            new_batch = page["reviews"]
+            if page["links"]:
+                frontier.extend(page["links"], depth=frontier.depth_of(url) + 1, source="discovery")
+                print(f"  Updated queue size: {len(frontier)}")
 
     return {
         "temp_reviews": new_batch,
-        "found_review_urls": updated_queue,
+        "page_urls": [url],
+        "found_review_urls": frontier,
         "visited_urls": visited_urls,
         "relevance_results": relevance_results,
-        "step_metrics": metrics
+        "step_metrics": [tracker.result]
     }
@@ -0,0 +1,124 @@
+from langgraph.types import Send
+from langsmith import traceable
+from nodes.state import GraphState, APPEND_ONLY_FIELDS
+from nodes.frontier import URLFrontier
+from nodes.extract import extract_and_detect_node
+from nodes.repair import repair_reviews_node
+from nodes.verify import verify_reviews_node
+from const import DEFAULT_MAX_REVIEWS, DEFAULT_FAN_OUT
+
+
+def schedule_node(state: GraphState):
+    """Takes up to `fan_out` unvisited URLs from the queue for the next superstep."""
+    config = state.get("config", {})
+    fan_out = max(1, int(config.get("fan_out", DEFAULT_FAN_OUT)))
+    frontier = URLFrontier.coerce(state.get("found_review_urls"))
+
+    batch = []
+    # While a streaming search is still running, wait for its next results first
+    frontier.wait_for_urls()
+    while len(batch) < fan_out:
+        url = frontier.pop()
+        if not url:
+            break
+        batch.append(url)
+
+    print(f"--- SCHEDULE: {len(batch)} URLs in parallel, {len(frontier)} left in queue ---")
+    return {"batch_urls": batch, "found_review_urls": frontier}
+
+
+def branch_frontier(frontier: URLFrontier, url: str) -> URLFrontier:
+    """Single-URL frontier of a branch; keeps the URL's depth and source (e.g. 'discovery') from the main queue."""
+    branch = URLFrontier()
+    branch.push(url, depth=frontier.depth_of(url), source=frontier.source_of(url))
+    return branch
+
+
+def dispatch_branches(state: GraphState):
+    """Map step: one Send per scheduled URL, each with its own single-URL frontier.
+
+    Append-only logs are shared read-only; branches never mutate them.
+    """
+    frontier = URLFrontier.coerce(state.get("found_review_urls"))
+    return [
+        Send("process_url", {
+            **state,
+            "branch_index": i,
+            "found_review_urls": branch_frontier(frontier, url),
+            "branch_depth": frontier.depth_of(url),
+            "temp_reviews": [],
+            "branch_results": [],
+        })
+        for i, url in enumerate(state.get("batch_urls", []))
+    ]
+
+
+@traceable(run_type="chain", name="Process-URL Branch")
+def process_url_node(branch: dict):
+    """Runs extract -> repair -> verify for a single URL and reports only what it added."""
+    url = branch["batch_urls"][branch["branch_index"]]
+    local = dict(branch)
+    added = {key: [] for key in APPEND_ONLY_FIELDS}
+
+    def run(node):
+        # Collect deltas of append-only fields instead of extending the shared lists
+        for key, value in node(local).items():
+            if key in added:
+                added[key].extend(value)
+            else:
+                local[key] = value
+
+    run(extract_and_detect_node)
+    if local.get("temp_reviews"):
+        run(repair_reviews_node)
+    run(verify_reviews_node)
+
+    return {"branch_results": [{
+        "index": branch["branch_index"],
+        "url": url,
+        "depth": branch.get("branch_depth", 0),
+        **added,
+        "discovered_urls": URLFrontier.coerce(local.get("found_review_urls")).pending(),
+    }]}
+
+
+def merge_branches_node(state: GraphState):
+    """Reduce step: merges branch results in scheduling order and caps reviews at max_reviews."""
+    config = state.get("config", {})
+    max_reviews = state.get("max_reviews", config.get("max_reviews", DEFAULT_MAX_REVIEWS))
+    current_count = state.get("review_count", 0)
+    frontier = URLFrontier.coerce(state.get("found_review_urls"))
+    # Deltas for the append-only logs
+    reviews, visited, relevance_results, metrics = [], [], [], []
+
+    dropped = 0
+    for result in sorted(state.get("branch_results", []), key=lambda r: r["index"]):
+        remaining = max(0, max_reviews - current_count - len(reviews))
+        reviews.extend(result["reviews"][:remaining])
+        dropped += max(0, len(result["reviews"]) - remaining)
+        for url in result["visited_urls"]:
+            if not frontier.is_visited(url):
+                visited.append(url)
+            frontier.mark_visited(url)
+        for rel in result["relevance_results"]:
+            frontier.record_relevance(rel["url"], rel["is_relevant"])
+        frontier.record_reviews(result["url"], len(result["reviews"]))
+        frontier.record_page_done(result["url"])
+        relevance_results.extend(result["relevance_results"])
+        metrics.extend(result["step_metrics"])
+        frontier.extend(result["discovered_urls"], depth=result["depth"] + 1, source="discovery")
+
+    if dropped:
+        print(f"  [LIMIT] Dropped {dropped} reviews from parallel branches to respect max_reviews.")
+    print(f"--- MERGE: {current_count + len(reviews)}/{max_reviews} reviews, queue size {len(frontier)} ---")
+
+    return {
+        "reviews": reviews,
+        "review_count": len(reviews),
+        "visited_urls": visited,
+        "relevance_results": relevance_results,
+        "step_metrics": metrics,
+        "found_review_urls": frontier,
+        "batch_urls": [],
+        "branch_results": [],
+    }
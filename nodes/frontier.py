@@ -0,0 +1,443 @@
+import heapq
+import functools
+import itertools
+import threading
+from collections import deque, defaultdict
+from typing import Iterable, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from const import (TRACKING_QUERY_PARAMS, TRACKING_QUERY_PREFIXES, DEFAULT_CRAWL_ORDER,
+                   DEFAULT_MAX_PAGES_PER_DOMAIN, DEFAULT_DOMAIN_PRUNE_AFTER, CRAWL_YIELD_PRIOR,
+                   CRAWL_DEPTH_DECAY, CRAWL_SOURCE_WEIGHTS)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+CRAWL_ORDERS = ("fifo", "best_first")
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalizes a URL so that trivially different spellings map to the same key.
+
+    Lowercases scheme and host, drops default ports, fragments, tracking parameters and
+    trailing slashes. Returns the stripped input unchanged if it is not an http(s) URL.
+    """
+    url = (url or "").strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parts.username:
+        host = f"{parts.username}{':' + parts.password if parts.password else ''}@{host}"
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    kept = [(k, v) for k, v in params
+            if k.lower() not in TRACKING_QUERY_PARAMS and not k.lower().startswith(TRACKING_QUERY_PREFIXES)]
+    # Only re-encode the query if a tracking parameter was actually removed
+    query = parts.query if len(kept) == len(params) else urlencode(kept)
+
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def get_domain(url: str) -> str:
+    """Returns the host of a URL without a leading 'www.' (used to group crawl statistics)."""
+    try:
+        host = urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def synchronized(method):
+    """Runs a frontier method under the frontier lock (search results may be pushed from another thread)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class URLFrontier:
+    """Crawl queue of canonical URLs backed by hashed enqueued/visited sets.
+
+    order='fifo' keeps plain BFS order in a deque. order='best_first' pops by the observed review
+    yield and relevance rate of each domain, the link depth and the discovery source. Every domain
+    keeps a heap ordered by the URL part of the score (depth, source), which never changes; the
+    domain part is applied when popping, so a change of domain statistics costs no re-scoring.
+    Both orders honour an optional per-domain page cap and prune domains that produced no
+    verified review after `prune_after` finished pages (fetched and verified, see record_page_done).
+    """
+
+    def __init__(self, urls: Iterable[str] = (), order: str = "fifo", source: str = "seed",
+                 max_pages_per_domain: int = 0, prune_after: int = 0):
+        if order not in CRAWL_ORDERS:
+            raise ValueError(f"Unknown crawl order '{order}'. Choose from {CRAWL_ORDERS}.")
+        self.order = order
+        self.max_pages_per_domain = max_pages_per_domain
+        self.prune_after = prune_after
+
+        self._queue = deque()
+        self._heaps = {}         # domain -> heap of (-url_weight, seq, url) (best_first)
+        self._seq = itertools.count()
+        self._pending = set()
+        self._enqueued = set()   # Every URL ever queued (pending or already popped)
+        self._visited = set()
+        self._in_flight = {}     # Popped but not marked visited yet (dict keeps pop order)
+        self._meta = {}          # url -> (depth, source)
+        self._pending_by_domain = defaultdict(set)
+        self.domains = defaultdict(lambda: {"popped": 0, "fetched": 0, "checked": 0, "relevant": 0, "verified": 0, "done": 0})
+        self.pruned_domains = set()
+        self._changes = None     # Operation log for incremental checkpoints (see track_changes)
+        self._lock = threading.RLock()
+        self._urls_available = threading.Condition(self._lock)
+        self._producers = 0      # Background producers (streaming search) that may still push URLs
+        self.stats = {
+            "enqueued": 0,
+            "canonicalized": 0,        # URLs rewritten by the canonicalizer
+            "duplicates_skipped": 0,   # Pushes of an URL that was already queued
+            "revisits_skipped": 0,     # Pushes/pops of an URL that was already processed
+            "domain_cap_skipped": 0,   # URLs dropped because their domain hit max_pages_per_domain
+            "pruned_skipped": 0,       # URLs dropped because their domain was pruned
+        }
+        self.extend(urls, source=source)
+
+    @classmethod
+    def from_config(cls, config: dict, urls: Iterable[str] = (), source: str = "seed") -> "URLFrontier":
+        """Builds a frontier with the crawl ordering settings of the state config."""
+        return cls(urls, order=config.get("crawl_order", DEFAULT_CRAWL_ORDER), source=source,
+                   max_pages_per_domain=config.get("max_pages_per_domain", DEFAULT_MAX_PAGES_PER_DOMAIN),
+                   prune_after=config.get("domain_prune_after", DEFAULT_DOMAIN_PRUNE_AFTER))
+
+    @classmethod
+    def coerce(cls, value) -> "URLFrontier":
+        """Returns value if it already is a frontier, otherwise builds one from a list of URLs."""
+        if isinstance(value, cls):
+            return value
+        return cls(value or [])
+
+    def _canonical(self, url: str) -> str:
+        canonical = canonicalize_url(url)
+        if canonical != (url or "").strip():
+            self.stats["canonicalized"] += 1
+        return canonical
+
+    def _is_blocked(self, domain: str) -> bool:
+        """True if the domain was pruned or reached its page cap (updates the skip counters)."""
+        if domain in self.pruned_domains:
+            self.stats["pruned_skipped"] += 1
+            return True
+        if self.max_pages_per_domain and self.domains[domain]["popped"] >= self.max_pages_per_domain:
+            self.stats["domain_cap_skipped"] += 1
+            return True
+        return False
+
+    def domain_weight(self, domain: str) -> float:
+        """Domain part of the score: review yield x relevance rate."""
+        stats = self.domains[domain]
+        # Laplace-smoothed estimates so that unseen domains start from an optimistic prior
+        review_yield = (stats["verified"] + CRAWL_YIELD_PRIOR) / (stats["done"] + 1)
+        relevance_rate = (stats["relevant"] + 1) / (stats["checked"] + 2)
+        return review_yield * relevance_rate
+
+    def url_weight(self, url: str) -> float:
+        """URL part of the score: depth decay x source weight."""
+        depth, source = self._meta.get(url, (0, "seed"))
+        return (CRAWL_DEPTH_DECAY ** depth) * CRAWL_SOURCE_WEIGHTS.get(source, 1.0)
+
+    def score(self, url: str) -> float:
+        """Expected value of fetching a URL: domain yield x relevance rate x depth decay x source weight."""
+        return self.domain_weight(get_domain(url)) * self.url_weight(url)
+
+    def _schedule(self, url: str, front: bool = False):
+        if self.order == "best_first":
+            heap = self._heaps.setdefault(get_domain(url), [])
+            heapq.heappush(heap, (-self.url_weight(url), next(self._seq), url))
+        elif front:
+            self._queue.appendleft(url)
+        else:
+            self._queue.append(url)
+
+    def _touch(self, domain: str):
+        """Applies changed statistics of a domain: pruning and the page cap drop its pending URLs."""
+        stats = self.domains[domain]
+        # Only finished pages count: a page in flight may still yield verified reviews
+        if self.prune_after and stats["verified"] == 0 and stats["done"] >= self.prune_after \
+                and domain not in self.pruned_domains:
+            print(f"  [FRONTIER] Pruning domain '{domain}': {stats['done']} pages without verified reviews.")
+            self.pruned_domains.add(domain)
+        if domain in self.pruned_domains:
+            dropped = self._pending_by_domain.pop(domain, set())
+            self._pending -= dropped
+            self._heaps.pop(domain, None)
+            self.stats["pruned_skipped"] += len(dropped)
+            return
+        if self.max_pages_per_domain and stats["popped"] >= self.max_pages_per_domain:
+            dropped = self._pending_by_domain.pop(domain, set())
+            self._pending -= dropped
+            self._heaps.pop(domain, None)
+            self.stats["domain_cap_skipped"] += len(dropped)
+
+    @synchronized
+    def push(self, url: str, depth: int = 0, source: str = "seed") -> bool:
+        """Queues a URL unless it (or an equivalent spelling) was queued or visited before."""
+        canonical = self._canonical(url)
+        if not canonical:
+            return False
+        if canonical in self._visited:
+            self.stats["revisits_skipped"] += 1
+            return False
+        if canonical in self._enqueued:
+            self.stats["duplicates_skipped"] += 1
+            return False
+        domain = get_domain(canonical)
+        if self._is_blocked(domain):
+            return False
+        self._enqueued.add(canonical)
+        self._pending.add(canonical)
+        self._pending_by_domain[domain].add(canonical)
+        self._meta[canonical] = (depth, source)
+        self._schedule(canonical)
+        self.stats["enqueued"] += 1
+        self._log("push", canonical, depth, source)
+        self._urls_available.notify_all()
+        return True
+
+    @synchronized
+    def extend(self, urls: Iterable[str], depth: int = 0, source: str = "seed") -> int:
+        """Queues several URLs, returns how many were new."""
+        return sum(1 for url in urls if self.push(url, depth=depth, source=source))
+
+    def _next_candidate(self) -> Optional[str]:
+        if self.order == "best_first":
+            best, best_key = None, None
+            for domain, heap in list(self._heaps.items()):
+                # Entries of URLs no longer pending (popped elsewhere, cleared) are dropped lazily
+                while heap and heap[0][2] not in self._pending:
+                    heapq.heappop(heap)
+                if not heap:
+                    del self._heaps[domain]
+                    continue
+                key = (heap[0][0] * self.domain_weight(domain), heap[0][1])
+                if best_key is None or key < best_key:
+                    best, best_key = domain, key
+            return heapq.heappop(self._heaps[best])[2] if best is not None else None
+        while self._queue:
+            url = self._queue.popleft()
+            if url in self._pending:
+                return url
+        return None
+
+    @synchronized
+    def pop(self) -> Optional[str]:
+        """Returns the next URL that has not been visited yet, or None if the queue is empty."""
+        while True:
+            url = self._next_candidate()
+            if url is None:
+                return None
+            domain = get_domain(url)
+            self._pending.discard(url)
+            self._pending_by_domain[domain].discard(url)
+            if url in self._visited:
+                self.stats["revisits_skipped"] += 1
+                continue
+            if self._is_blocked(domain):
+                continue
+            self._take(url, domain)
+            self._log("pop", url)
+            return url
+
+    def _take(self, url: str, domain: str):
+        """Hands a URL out; it counts towards the domain cap right away (parallel branches fetch later)."""
+        self._pending.discard(url)
+        self._pending_by_domain[domain].discard(url)
+        self._in_flight[url] = None
+        self.domains[domain]["popped"] += 1
+        if self.max_pages_per_domain and self.domains[domain]["popped"] >= self.max_pages_per_domain:
+            self._touch(domain)
+
+    @synchronized
+    def mark_visited(self, url: str):
+        """Records that a URL was fetched (counts towards its domain's page statistics)."""
+        canonical = canonicalize_url(url)
+        if canonical in self._visited:
+            return
+        self._visited.add(canonical)
+        self._in_flight.pop(canonical, None)
+        domain = get_domain(canonical)
+        self.domains[domain]["fetched"] += 1
+        self._touch(domain)
+        self._log("visit", canonical)
+
+    @synchronized
+    def record_relevance(self, url: str, is_relevant: bool):
+        """Feeds a page relevance decision into the domain statistics."""
+        domain = get_domain(canonicalize_url(url))
+        self.domains[domain]["checked"] += 1
+        self.domains[domain]["relevant"] += int(bool(is_relevant))
+        self._touch(domain)
+        self._log("relevance", url, bool(is_relevant))
+
+    @synchronized
+    def record_reviews(self, url: str, count: int):
+        """Feeds the number of verified reviews found on a page into the domain statistics."""
+        if count <= 0:
+            return
+        domain = get_domain(canonicalize_url(url))
+        self.domains[domain]["verified"] += count
+        self._touch(domain)
+        self._log("reviews", url, count)
+
+    @synchronized
+    def record_page_done(self, url: str):
+        """Records that a page went all the way through verification (or was dropped before it).
+
+        Called after record_reviews for the page; only finished pages count towards pruning.
+        """
+        domain = get_domain(canonicalize_url(url))
+        self.domains[domain]["done"] += 1
+        self._touch(domain)
+        self._log("done", url)
+
+    def depth_of(self, url: str) -> int:
+        return self._meta.get(canonicalize_url(url), (0, "seed"))[0]
+
+    def source_of(self, url: str) -> str:
+        """How a URL entered the frontier: 'seed', 'search' or 'discovery'."""
+        return self._meta.get(canonicalize_url(url), (0, "seed"))[1]
+
+    # --- Background producers (streaming search) ---
+
+    @property
+    def producing(self) -> bool:
+        return self._producers > 0
+
+    @synchronized
+    def open_producer(self):
+        """Registers a producer; the frontier counts as non-empty until it is closed."""
+        self._producers += 1
+
+    @synchronized
+    def close_producer(self):
+        self._producers -= 1
+        self._urls_available.notify_all()
+
+    @synchronized
+    def wait_for_urls(self, timeout: Optional[float] = None) -> bool:
+        """Blocks while nothing is pending but a producer is still running; True if URLs are pending."""
+        while not self._pending and self._producers:
+            if not self._urls_available.wait(timeout) and timeout is not None:
+                break
+        return bool(self._pending)
+
+    def is_visited(self, url: str) -> bool:
+        return canonicalize_url(url) in self._visited
+
+    @synchronized
+    def clear(self):
+        """Drops all pending URLs (visited/enqueued history is kept)."""
+        self._queue.clear()
+        self._heaps.clear()
+        self._pending.clear()
+        self._pending_by_domain.clear()
+        self._log("clear")
+
+    # --- Incremental checkpoint support ---
+
+    def _log(self, *op):
+        if self._changes is not None:
+            self._changes.append(list(op))
+
+    @property
+    def tracks_changes(self) -> bool:
+        return self._changes is not None
+
+    @synchronized
+    def track_changes(self) -> list:
+        """Starts logging state-changing operations; returns ops that rebuild the current state."""
+        snapshot = [["visit", url] for url in sorted(self._visited)]
+        snapshot += [["push", url, *self._meta.get(url, (0, "seed"))] for url in self.pending()]
+        self._changes = []
+        return snapshot
+
+    @synchronized
+    def drain_changes(self) -> list:
+        """Returns and resets the operations logged since the last call."""
+        changes, self._changes = self._changes or [], [] if self._changes is not None else None
+        return changes
+
+    @synchronized
+    def replay(self, ops: list):
+        """Re-applies logged operations (used when resuming from a checkpoint)."""
+        for op, *args in ops:
+            if op == "push":
+                self.push(args[0], depth=args[1], source=args[2])
+            elif op == "pop":
+                if args[0] in self._pending:
+                    self._take(args[0], get_domain(args[0]))
+            elif op == "visit":
+                self.mark_visited(args[0])
+            elif op == "relevance":
+                self.record_relevance(args[0], args[1])
+            elif op == "reviews":
+                self.record_reviews(args[0], args[1])
+            elif op == "done":
+                self.record_page_done(args[0])
+            elif op == "clear":
+                self.clear()
+
+    @synchronized
+    def requeue_in_flight(self) -> int:
+        """Puts URLs that were popped but never marked visited back in front of the queue.
+
+        Used after replaying a checkpoint: their processing was interrupted by the crash.
+        """
+        urls = list(self._in_flight)
+        for url in reversed(urls):
+            domain = get_domain(url)
+            self.domains[domain]["popped"] -= 1
+            self._pending.add(url)
+            self._pending_by_domain[domain].add(url)
+            self._schedule(url, front=True)
+        self._in_flight.clear()
+        return len(urls)
+
+    @synchronized
+    def pending(self):
+        """Pending URLs in the order they would be popped (best-first: by current score)."""
+        if self.order == "best_first":
+            entries = [(weight * self.domain_weight(domain), seq, url)
+                       for domain, heap in self._heaps.items() for weight, seq, url in heap if url in self._pending]
+            return [url for _, _, url in sorted(entries)]
+        return [url for url in self._queue if url in self._pending]
+
+    @synchronized
+    def summary(self) -> dict:
+        """Counters and per-domain statistics for the run summary."""
+        return {
+            **self.stats,
+            "order": self.order,
+            "pruned_domains": sorted(self.pruned_domains),
+            "domains": {d: dict(s) for d, s in self.domains.items()},
+        }
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __bool__(self):
+        # A running producer may still deliver URLs, so the crawl must not stop yet
+        return bool(self._pending) or self.producing
+
+    def __iter__(self):
+        return iter(self.pending())
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self._enqueued
@@ -1,11 +1,11 @@
-import json
 from langsmith import traceable
-from langchain_ollama import ChatOllama
 from monitor import TrackStep
-from helpers import load_prompt
+from helpers import invoke_llm, get_model_name
+from nodes.prompts import get_prompt
+from tokens import fit_prompt
 from nodes.state import GraphState
 from nodes.models import SearchQuery
-from const import NUM_CTX, DEFAULT_LLM_MODEL, DEFAULT_LLM_URL
+from const import QUERY_OUTPUT_TOKENS
 
 
 @traceable(run_type="llm")
@@ -15,23 +15,15 @@ def generate_query_node(state: GraphState):
         query = state["query"]
         config = state.get("config", {})
 
-        template = load_prompt("01_generate_query.md")
-        schema_str = json.dumps(SearchQuery.model_json_schema(), indent=2)
-        prompt = template.format(query=query, json_schema=schema_str)
+        query_prompt = get_prompt("01_generate_query.md", config)
+        template, schema_str = query_prompt.template, query_prompt.schema
+        prompt, num_ctx = fit_prompt(
+            template, "query", query, reserved_output=QUERY_OUTPUT_TOKENS,
+            model=get_model_name(config), json_schema=schema_str)
 
-        # Dynamic LLM configuration from state
-        llm = ChatOllama(
-            model=config.get("llm_model", DEFAULT_LLM_MODEL),
-            base_url=config.get("llm_url", DEFAULT_LLM_URL),
-            temperature=config.get("llm_temperature", 0),
-            format="json",
-            num_ctx=NUM_CTX
-        )
-
-        structured_llm = llm.with_structured_output(SearchQuery)
-        
         try:
-            response = structured_llm.invoke(prompt)
+            # Dynamic LLM configuration from state
+            response = invoke_llm(config, SearchQuery, prompt, num_ctx=num_ctx)
             refined_query = response.optimized_query
             # Remove any unwanted quotes if LLM produced them inside the JSON string
             refined_query = refined_query.replace('"', '').replace("'", "")
@@ -41,7 +33,4 @@ def generate_query_node(state: GraphState):
 
         print(f"Optimized Query: {refined_query}")
 
-    metrics = state.get("step_metrics", [])
-    metrics.append(tracker.result)
-
-    return {"query": refined_query, "step_metrics": metrics}
+    return {"query": refined_query, "step_metrics": [tracker.result]}
@@ -0,0 +1,203 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from langsmith import traceable
+from monitor import TrackStep
+from nodes.state import GraphState, APPEND_ONLY_FIELDS
+from nodes.frontier import URLFrontier
+from nodes.extract import fetch_content, clean_page, analyze_page, is_forbidden
+from nodes.repair import repair_reviews_node
+from nodes.verify import verify_reviews_node
+from budget import get_budget
+from const import DEFAULT_MAX_REVIEWS, PIPELINE_QUEUE_SIZE, PIPELINE_FETCH_WORKERS
+
+
+class PagePipeline:
+    """Asyncio pipeline: fetch/parse -> extract -> repair -> verify over different pages at once.
+
+    Stages are connected by bounded queues (backpressure), blocking work runs in a thread pool.
+    Only the event loop touches the frontier. Each finished page is committed as one update
+    that passes through the graph listeners; once max_reviews is reached all stages are
+    cancelled and pages still in flight are dropped; the same happens when a run budget runs out.
+    """
+
+    def __init__(self, state: dict, listeners: list = None):
+        self.state = state
+        self.config = state.get("config", {})
+        self.query = state["query"]
+        self.topic = state.get("topic")
+        self.frontier = URLFrontier.coerce(state.get("found_review_urls"))
+        self.max_reviews = state.get("max_reviews", self.config.get("max_reviews", DEFAULT_MAX_REVIEWS))
+        self.review_count = state.get("review_count", 0)
+        self.listeners = listeners or []
+        self.budget = get_budget(self.config)
+        self.fetch_workers = max(1, int(self.config.get("pipeline_fetch_workers", PIPELINE_FETCH_WORKERS)))
+        # Aggregated deltas of all committed pages
+        self.result = {key: [] for key in APPEND_ONLY_FIELDS}
+        self.result["review_count"] = 0
+        self.in_flight = 0
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def run(self) -> dict:
+        if self.review_count >= self.max_reviews:
+            print(f"  [LIMIT] Already reached {self.review_count}/{self.max_reviews}. Stopping.")
+            return self.result
+
+        self.executor = ThreadPoolExecutor(max_workers=self.fetch_workers + 3, thread_name_prefix="pipeline")
+        self.done = asyncio.Event()
+        self.wakeup = asyncio.Event()  # Set whenever a page finishes or queues new links
+        fetched, extracted, repaired = (asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE) for _ in range(3))
+
+        tasks = [asyncio.create_task(self.fetch_stage(fetched)) for _ in range(self.fetch_workers)]
+        tasks += [
+            asyncio.create_task(self.stage(self.extract_page, fetched, extracted)),
+            asyncio.create_task(self.stage(self.repair_page, extracted, repaired)),
+            asyncio.create_task(self.stage(self.verify_page, repaired, None)),
+        ]
+        try:
+            await self.done.wait()
+        finally:
+            if self.in_flight:
+                print(f"  [PIPELINE] Cancelling {self.in_flight} pages in flight.")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Calls already running in threads finish in the background; queued ones are dropped
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        return self.result
+
+    async def fetch_stage(self, outbox: asyncio.Queue):
+        """Pops URLs and fetches/cleans them; waits while the queue is empty but pages are in flight."""
+        while True:
+            if self.budget.exhausted():
+                self.done.set()
+                return
+            url = self.frontier.pop()
+            if url is None and self.frontier.producing:
+                # A streaming search may still deliver URLs
+                await self._call(self.frontier.wait_for_urls, 1.0)
+                continue
+            if url is None:
+                if not self.in_flight:
+                    self.done.set()
+                    return
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            self.in_flight += 1
+            page = {"url": url, "text": None, "reviews": [], "relevance": [], "metrics": []}
+            if is_forbidden(url, self.config):
+                print(f"  [FORBIDDEN] Skip forbidden URL: {url}")
+                self.commit(page)
+                continue
+
+            print(f"  [PIPELINE] Fetching {url}")
+            try:
+                content = await self._call(fetch_content, url, self.config)
+                page["text"] = await self._call(clean_page, content) if content else None
+            except Exception as e:
+                print(f"  [PIPELINE] Fetch failed for {url}: {e}")
+            await outbox.put(page)
+
+    async def stage(self, handler, inbox: asyncio.Queue, outbox: asyncio.Queue = None):
+        """Runs handler on every page of inbox; a failing page continues without reviews."""
+        while True:
+            page = await inbox.get()
+            try:
+                await handler(page)
+            except Exception as e:
+                print(f"  [PIPELINE] {handler.__name__} failed for {page['url']}: {e}")
+                page["reviews"] = []
+            if outbox is None:
+                self.commit(page)
+            else:
+                await outbox.put(page)
+
+    def _analyze(self, page: dict) -> dict:
+        with TrackStep("Extract and Detect") as tracker:
+            is_discovery = self.frontier.source_of(page["url"]) == "discovery"
+            result = analyze_page(page["url"], page["text"], self.query, self.config, is_discovery,
+                                  self.topic)
+        page["metrics"].append(tracker.result)
+        return result
+
+    async def extract_page(self, page: dict):
+        if not page["text"]:
+            return
+        result = await self._call(self._analyze, page)
+        page["relevance"].append(result["relevance"])
+        self.frontier.record_relevance(page["url"], result["relevance"]["is_relevant"])
+        page["reviews"] = result["reviews"]
+        if result["links"]:
+            # Queue discovered links right away so the fetch stage can start on them
+            self.frontier.extend(result["links"], depth=self.frontier.depth_of(page["url"]) + 1, source="discovery")
+            self.wakeup.set()
+
+    async def repair_page(self, page: dict):
+        if not page["reviews"]:
+            return
+        update = await self._call(repair_reviews_node, {
+            "query": self.query, "config": self.config, "temp_reviews": page["reviews"]})
+        page["reviews"] = update.get("temp_reviews", [])
+        page["metrics"].extend(update.get("step_metrics", []))
+
+    async def verify_page(self, page: dict):
+        if not page["reviews"]:
+            return
+        # Single verify worker: the review count cannot change while it runs, so the cap is exact
+        update = await self._call(verify_reviews_node, {
+            "query": self.query, "config": self.config, "temp_reviews": page["reviews"],
+            "max_reviews": self.max_reviews, "review_count": self.review_count})
+        page["reviews"] = update.get("reviews", [])
+        page["metrics"].extend(update.get("step_metrics", []))
+
+    def commit(self, page: dict):
+        """Applies a finished page: frontier statistics, listeners and the aggregated result."""
+        url, reviews = page["url"], page["reviews"]
+        self.frontier.mark_visited(url)
+        self.frontier.record_reviews(url, len(reviews))
+        self.frontier.record_page_done(url)
+        self.in_flight -= 1
+
+        update = {"reviews": reviews, "review_count": len(reviews), "visited_urls": [url],
+                  "relevance_results": page["relevance"], "step_metrics": page["metrics"]}
+        for listener in self.listeners:
+            update = listener.on_update("pipeline", self.state, update) or update
+        for key, value in update.items():
+            self.result[key] += value
+        # Listeners may drop reviews (late duplicates); streamed ones still count
+        self.review_count += update["review_count"]
+
+        print(f"  [PIPELINE] Done {url}: +{update['review_count']} reviews "
+              f"({self.review_count}/{self.max_reviews}), queue size {len(self.frontier)}")
+        self.wakeup.set()
+        if self.review_count >= self.max_reviews:
+            print(f"--- LIMIT REACHED ({self.review_count}/{self.max_reviews}). STOPPING PIPELINE. ---")
+            self.done.set()
+        elif self.budget.exhausted():
+            self.done.set()
+
+
+def run_pipeline(pipeline: PagePipeline) -> dict:
+    """Runs the pipeline to completion; inside a running event loop it gets its own loop in a worker thread."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(pipeline.run())
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-loop") as pool:
+        return pool.submit(lambda: asyncio.run(pipeline.run())).result()
+
+
+def make_pipeline_node(listeners: list = None):
+    """Builds the pipeline node; it reports every finished page to the listeners itself."""
+
+    @traceable(run_type="chain", name="Page Pipeline Node")
+    def pipeline_node(state: GraphState):
+        print("--- PAGE PIPELINE ---")
+        pipeline = PagePipeline(state, listeners)
+        result = run_pipeline(pipeline)
+        return {**result, "found_review_urls": pipeline.frontier, "temp_reviews": []}
+
+    return pipeline_node
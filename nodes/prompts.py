@@ -0,0 +1,107 @@
+import os
+import json
+import string
+import threading
+from typing import Dict, NamedTuple, Optional, Type
+from pydantic import BaseModel
+from helpers import load_prompt
+from const import PROMPT_TEMPLATE_DIR, DEFAULT_PROMPT_LAYOUT, PROMPT_LAYOUTS
+from nodes.models import (SearchQuery, PageRelevanceResult, ExtractionResult, ReviewLinksDetection,
+                          RepairCheck, RepairSearch, RepairResult, ReviewVerification)
+
+# Template file -> (output schema, placeholders the calling node fills in)
+PROMPT_SPECS = {
+    "01_generate_query.md": (SearchQuery, {"query", "json_schema"}),
+    "02_filter_page.md": (PageRelevanceResult, {"query", "page_snippet", "json_schema"}),
+    "03_extract_reviews.md": (ExtractionResult, {"page_text", "json_schema"}),
+    "04_detect_review_links.md": (ReviewLinksDetection, {"base_url", "page_text", "json_schema"}),
+    "05_review_completeness.md": (RepairCheck, {"query", "page_text", "review_text", "json_schema"}),
+    "06_repair_search_query.md": (RepairSearch, {"review_text", "history", "json_schema"}),
+    "07_repair_review.md": (RepairResult, {"query", "html_segments", "current_review_text", "json_schema"}),
+    "08_verify_reviews.md": (ReviewVerification, {"query", "review_text", "json_schema"}),
+}
+
+
+class CompiledPrompt(NamedTuple):
+    name: str
+    template: str                 # Template text in the requested layout
+    schema: str                   # Pre-serialized JSON schema of the output model
+    model: Type[BaseModel]
+
+
+def get_placeholders(template: str):
+    """Returns the set of format placeholders used in a template."""
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+
+def to_prefix_stable(template: str) -> str:
+    """Reorders a template so that static instructions and schema come first and variable content last.
+
+    A section starts at a line beginning with '**'. Sections holding placeholders other than
+    '{json_schema}' are moved behind the static ones; a trailing heading without body (the
+    answer cue, e.g. '**Optimized Search Query:**') stays at the very end.
+    """
+    sections = [[]]
+    for line in template.strip().splitlines():
+        if line.startswith("**") and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    blocks = ["\n".join(lines).strip() for lines in sections]
+
+    cue = None
+    if len(blocks) > 1 and "\n" not in blocks[-1] and not get_placeholders(blocks[-1]):
+        cue = blocks.pop()
+
+    static = [b for b in blocks if not get_placeholders(b) - {"json_schema"}]
+    variable = [b for b in blocks if get_placeholders(b) - {"json_schema"}]
+    return "\n\n".join(static + variable + ([cue] if cue else [])) + "\n"
+
+
+class PromptRegistry:
+    """Loads, validates and pre-compiles every prompt template and its output schema once."""
+
+    def __init__(self, template_dir: str = PROMPT_TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._prompts: Dict[tuple, CompiledPrompt] = {}
+
+        available = {f for f in os.listdir(template_dir) if f.endswith(".md")} if os.path.isdir(template_dir) else set()
+        missing = set(PROMPT_SPECS) - available
+        if missing:
+            raise FileNotFoundError(f"Missing prompt templates in '{template_dir}': {sorted(missing)}")
+        for unknown in sorted(available - set(PROMPT_SPECS)):
+            print(f"  [PROMPTS] Ignoring unregistered template: {unknown}")
+
+        for name, (model, fields) in PROMPT_SPECS.items():
+            template = load_prompt(name, template_dir)
+            unexpected = get_placeholders(template) - fields
+            if unexpected:
+                raise ValueError(f"Template '{name}' uses unknown placeholders: {sorted(unexpected)}")
+
+            schema = json.dumps(model.model_json_schema(), indent=2)
+            self._prompts[(name, "default")] = CompiledPrompt(name, template, schema, model)
+            self._prompts[(name, "prefix_stable")] = CompiledPrompt(
+                name, to_prefix_stable(template), schema, model)
+
+    def get(self, name: str, layout: str = DEFAULT_PROMPT_LAYOUT) -> CompiledPrompt:
+        """Returns the compiled prompt for a template in the given layout."""
+        if layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt layout '{layout}'. Choose from {PROMPT_LAYOUTS}.")
+        return self._prompts[(name, layout)]
+
+
+_registry: Optional[PromptRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Returns the process-wide prompt registry, loading it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry()
+    return _registry
+
+
+def get_prompt(name: str, config: dict) -> CompiledPrompt:
+    """Shortcut for nodes: compiled prompt in the layout selected by the state config."""
+    return get_prompt_registry().get(name, config.get("prompt_layout", DEFAULT_PROMPT_LAYOUT))
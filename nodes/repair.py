@@ -1,18 +1,23 @@
-import json
 import os
 import re
 from typing import List, Optional
 from bs4 import BeautifulSoup
 from langsmith import traceable
-from helpers import load_prompt, get_llm, get_cache_path
+from helpers import invoke_llm, get_model_name, get_cache_path
+from budget import get_budget
+from nodes.prompts import get_prompt
+from tokens import fit_prompt, count_tokens
 from monitor import TrackStep
+from profiling import profiled, span
 from nodes.state import GraphState
 from nodes.models import RepairCheck, RepairSearch, RepairResult
-from const import (MAX_REPAIR_CONTEXTS, MAX_REPAIR_CHARS, MAX_REPAIR_TOTAL_CHARS,
-                   MAX_SNIPPET_LEN, MAX_REPAIR_ATTEMPTS, REPAIR_SEARCH_DEPTH,
-                   REPAIR_CONTEXT_MIN_CHARS, MIN_REPAIR_LENGTH)
+from const import (MAX_REPAIR_CONTEXTS, MAX_REPAIR_CHARS, MAX_REPAIR_SEGMENT_TOKENS,
+                   MAX_CHECK_TOKENS, MAX_REPAIR_ATTEMPTS, REPAIR_SEARCH_DEPTH,
+                   REPAIR_CONTEXT_MIN_CHARS, MIN_REPAIR_LENGTH, CHECK_OUTPUT_TOKENS,
+                   REPAIR_SEARCH_OUTPUT_TOKENS, REPAIR_OUTPUT_TOKENS)
 
 
+@profiled("repair.get_contexts_for_term")
 def get_contexts_for_term(soup: BeautifulSoup, term: str, max_results: int = MAX_REPAIR_CONTEXTS, max_chars: int = MAX_REPAIR_CHARS) -> List[str]:
     """Finds up to max_results contexts around a specific unique term in the soup."""
     if not term:
@@ -52,23 +57,23 @@ def repair_reviews_node(state: GraphState):
         if not temp_reviews:
             return {"temp_reviews": []}
 
-        check_template = load_prompt("05_review_completeness.md")
-        search_template = load_prompt("06_repair_search_query.md")
-        repair_template = load_prompt("07_repair_review.md")
+        check_prompt_spec = get_prompt("05_review_completeness.md", config)
+        search_prompt_spec = get_prompt("06_repair_search_query.md", config)
+        repair_prompt_spec = get_prompt("07_repair_review.md", config)
 
-        # Dynamic LLMs
-        llm = get_llm(config)
-        llm_reasoning = get_llm(config, use_reasoning=True)
-
-        check_llm = llm_reasoning.with_structured_output(RepairCheck)
-        search_llm = llm.with_structured_output(RepairSearch)
-        repair_llm = llm.with_structured_output(RepairResult)
+        # Models used for token budgeting; LLMs are built per call with a fitting num_ctx
+        model_name = get_model_name(config)
+        reasoning_model_name = get_model_name(config, use_reasoning=True)
 
         repaired_batch = []
         repaired_count = 0
         discarded_count = 0
+        budget = get_budget(config)
 
-        for rev in temp_reviews:
+        for i, rev in enumerate(temp_reviews):
+            if budget.exhausted():
+                print(f"  [BUDGET] Dropping {len(temp_reviews) - i} reviews not yet checked.")
+                break
             url = rev.get("website_url")
             cache_path = get_cache_path(url)
 
@@ -76,7 +81,7 @@ def repair_reviews_node(state: GraphState):
                 repaired_batch.append(rev)
                 continue
 
-            with open(cache_path, "r", encoding="utf-8") as f:
+            with open(cache_path, "r", encoding="utf-8") as f, span("repair.parse_html"):
                 html_content = f.read()
                 soup = BeautifulSoup(html_content, "html.parser")
 
@@ -85,19 +90,19 @@ def repair_reviews_node(state: GraphState):
                     element.decompose()
 
             # 1. CHECK: Is it incomplete?
-            page_snippet = soup.get_text(separator="\n", strip=True)[
-                :MAX_SNIPPET_LEN]
-            check_prompt = check_template.format(
+            check_prompt, check_ctx = fit_prompt(
+                check_prompt_spec.template, "page_text", soup.get_text(separator="\n", strip=True),
+                reserved_output=CHECK_OUTPUT_TOKENS, max_content_tokens=MAX_CHECK_TOKENS,
+                model=reasoning_model_name,
                 query=query,
-                page_text=page_snippet,
                 review_text=rev["review_text"],
-                json_schema=json.dumps(
-                    RepairCheck.model_json_schema(), indent=2)
+                json_schema=check_prompt_spec.schema
             )
 
             try:
-                check_res = check_llm.invoke(
-                    check_prompt, config={"run_name": "Check-Review-Completeness"})
+                check_res = invoke_llm(
+                    config, RepairCheck, check_prompt, num_ctx=check_ctx,
+                    use_reasoning=True, run_name="Check-Review-Completeness")
                 if check_res.complete:
                     repaired_batch.append(rev)
                     continue
@@ -113,18 +118,20 @@ def repair_reviews_node(state: GraphState):
             success = False
 
             for attempt in range(1, MAX_REPAIR_ATTEMPTS + 1):
+                if budget.exhausted():
+                    break
                 print(f"    - Attempt {attempt}/{MAX_REPAIR_ATTEMPTS}...")
 
                 history_str = ", ".join(
                     [f'"{t}"' for t in failed_terms]) if failed_terms else "None"
-                search_prompt = search_template.format(
-                    review_text=current_text,
+                search_prompt, search_ctx = fit_prompt(
+                    search_prompt_spec.template, "review_text", current_text,
+                    reserved_output=REPAIR_SEARCH_OUTPUT_TOKENS, model=model_name,
                     history=history_str,
-                    json_schema=json.dumps(
-                        RepairSearch.model_json_schema(), indent=2)
+                    json_schema=search_prompt_spec.schema
                 )
-                search_res = search_llm.invoke(
-                    search_prompt, config={"run_name": f"Search-Attempt-{attempt}"})
+                search_res = invoke_llm(
+                    config, RepairSearch, search_prompt, num_ctx=search_ctx, run_name=f"Search-Attempt-{attempt}")
                 term = search_res.search_term
 
                 contexts = get_contexts_for_term(soup, term)
@@ -134,31 +141,33 @@ def repair_reviews_node(state: GraphState):
                     failed_terms.append(term)
                     continue
 
-                # Filter contexts to respect total character limit
+                # Filter contexts to respect the total token budget
                 filtered_contexts = []
-                total_chars = 0
+                total_tokens = 0
                 for ctx in contexts:
-                    if total_chars + len(ctx) > MAX_REPAIR_TOTAL_CHARS:
-                        print(f"      Total limit ({MAX_REPAIR_TOTAL_CHARS}) reached. Skipping remaining contexts.")
+                    ctx_tokens = count_tokens(ctx, model_name)
+                    if total_tokens + ctx_tokens > MAX_REPAIR_SEGMENT_TOKENS and filtered_contexts:
+                        print(f"      Token limit ({MAX_REPAIR_SEGMENT_TOKENS}) reached. Skipping remaining contexts.")
                         break
                     filtered_contexts.append(ctx)
-                    total_chars += len(ctx)
+                    total_tokens += ctx_tokens
 
                 # Use filtered contexts (Up to MAX_REPAIR_CONTEXTS)
                 context_str = "\n---\n".join(
                     [f"Source Segment {i+1}:\n{ctx}" for i, ctx in enumerate(filtered_contexts)])
 
-                repair_prompt = repair_template.format(
+                repair_prompt, repair_ctx = fit_prompt(
+                    repair_prompt_spec.template, "html_segments", context_str,
+                    reserved_output=REPAIR_OUTPUT_TOKENS, max_content_tokens=MAX_REPAIR_SEGMENT_TOKENS,
+                    model=model_name,
                     query=query,
-                    html_segments=context_str,
                     current_review_text=current_text,
-                    json_schema=json.dumps(
-                        RepairResult.model_json_schema(), indent=2)
+                    json_schema=repair_prompt_spec.schema
                 )
 
                 try:
-                    repair_res = repair_llm.invoke(
-                        repair_prompt, config={"run_name": f"Repair-Attempt-{attempt}"})
+                    repair_res = invoke_llm(
+                        config, RepairResult, repair_prompt, num_ctx=repair_ctx, run_name=f"Repair-Attempt-{attempt}")
                     current_text = repair_res.fixed_text
 
                     if repair_res.complete:
@@ -183,7 +192,4 @@ def repair_reviews_node(state: GraphState):
         print(
             f"\nFinal Repair results: {repaired_count} repaired, {discarded_count} discarded, {len(repaired_batch)} kept.")
 
-    metrics = state.get("step_metrics", [])
-    metrics.append(tracker.result)
-
-    return {"temp_reviews": repaired_batch, "step_metrics": metrics}
+    return {"temp_reviews": repaired_batch, "step_metrics": [tracker.result]}
@@ -1,9 +1,124 @@
+import os
+import json
 import time
+import hashlib
+import threading
 from langsmith import traceable
-from helpers import search_wrapper
+from helpers import get_search_wrapper
 from nodes.state import GraphState
+from nodes.frontier import URLFrontier
 from monitor import TrackStep
-from const import DEFAULT_RETRIEVER_MAX_RESULTS
+from const import (DEFAULT_RETRIEVER_MAX_RESULTS, SEARCH_CACHE_DIR, SEARCH_CACHE_TTL_SECONDS,
+                   SEARCH_PAGE_SIZE)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+def get_search_cache_path(query: str, max_results: int) -> str:
+    """Deterministic cache file for a (normalized query, max_results) pair."""
+    key = hashlib.md5(f"{normalize_query(query)}|{max_results}".encode()).hexdigest()
+    return os.path.join(SEARCH_CACHE_DIR, f"search_{key}.json")
+
+
+def load_cached_search(query: str, max_results: int, ttl: float):
+    """Returns cached search results younger than ttl seconds, or None."""
+    path = get_search_cache_path(query, max_results)
+    if not ttl or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    age = time.time() - entry.get("timestamp", 0)
+    if age > ttl:
+        print(f"  [SEARCH CACHE] Expired entry ({age / 3600:.1f}h old), searching again.")
+        return None
+    print(f"  [SEARCH CACHE] Hit for '{normalize_query(query)}' ({age / 3600:.1f}h old).")
+    return entry["results"]
+
+
+def save_cached_search(query: str, max_results: int, results: list):
+    os.makedirs(SEARCH_CACHE_DIR, exist_ok=True)
+    entry = {"query": normalize_query(query), "max_results": max_results,
+             "timestamp": time.time(), "results": results}
+    with open(get_search_cache_path(query, max_results), "w", encoding="utf-8") as f:
+        json.dump(entry, f, indent=2, ensure_ascii=False)
+
+
+def search_with_retry(search, max_retries: int = 3, wait_seconds: float = 2):
+    """Calls search() with exponential backoff; returns [] once all attempts failed."""
+    for attempt in range(1, max_retries + 1):
+        try:
+            print(f"  Attempting search (Attempt {attempt}/{max_retries})...")
+            results = search()
+            if results:
+                return results
+        except Exception as e:
+            print(f"  [SEARCH ERROR] Attempt {attempt} failed: {e}")
+            if attempt < max_retries:
+                print(f"    - Rate limit or connection issue suspected. Waiting {wait_seconds}s before retry...")
+                time.sleep(wait_seconds)
+                wait_seconds *= 2  # Exponential backoff
+            else:
+                print(f"    - [CRITICAL] All DuckDuckGo attempts failed. Returning empty results.")
+    return []
+
+
+def search_all(query: str, max_results: int) -> list:
+    """All results of one DuckDuckGo search (the search wrapper default)."""
+    return get_search_wrapper().results(query, max_results=max_results)
+
+
+def search_page(query: str, page: int, page_size: int = SEARCH_PAGE_SIZE) -> list:
+    """One page of DuckDuckGo text results in the format of the search wrapper's results()."""
+    from ddgs import DDGS
+
+    search_wrapper = get_search_wrapper()
+    with DDGS() as ddgs:
+        hits = ddgs.text(query, region=search_wrapper.region, safesearch=search_wrapper.safesearch,
+                         timelimit=search_wrapper.time, max_results=page_size, page=page,
+                         backend=search_wrapper.backend) or []
+    return [{"snippet": r["body"], "title": r["title"], "link": r["href"]} for r in hits]
+
+
+def filter_results(results: list, forbidden_urls: list) -> list:
+    """Drops hard-excluded and user-forbidden result links."""
+    filtered_results = []
+    for r in results:
+        link = r['link'].lower()
+        # Hardcoded exclusions + user exclusions
+        if "tripadvisor" in link:
+            continue
+
+        if any(forbidden in link for forbidden in forbidden_urls if forbidden):
+            print(f"  [FILTERED] Excluding forbidden URL: {r['link']}")
+            continue
+
+        filtered_results.append(r)
+    return filtered_results
+
+
+def stream_search(query: str, max_results: int, frontier: URLFrontier, forbidden_urls: list,
+                  first_page: list, ttl: float):
+    """Background producer: pushes further result pages into the frontier as they arrive."""
+    results = [{k: v for k, v in r.items() if k != "id"} for r in first_page]
+    try:
+        page = 2
+        while len(results) < max_results:
+            hits = search_with_retry(lambda: search_page(query, page))
+            if not hits:
+                break
+            results.extend(hits)
+            new = frontier.extend((r["link"] for r in filter_results(hits, forbidden_urls)), source="search")
+            print(f"  [SEARCH STREAM] Page {page}: {len(hits)} results, {new} new URLs queued.")
+            page += 1
+        if ttl:
+            save_cached_search(query, max_results, results[:max_results])
+    finally:
+        frontier.close_producer()
 
 
 @traceable(run_type="retriever")
@@ -16,61 +131,45 @@ def retrieval_node(state: GraphState):
         # Retrieval setting from config
         max_results = config.get("retriever_max_results", DEFAULT_RETRIEVER_MAX_RESULTS)
         forbidden_urls = [f.lower().strip() for f in config.get("forbidden_urls", [])]
+        ttl = config.get("search_cache_ttl", SEARCH_CACHE_TTL_SECONDS)
+        streaming = config.get("stream_search", False)
 
-        results = []
-        max_retries = 3
-        wait_seconds = 2
-
-        for attempt in range(1, max_retries + 1):
-            try:
-                print(f"  Attempting search (Attempt {attempt}/{max_retries})...")
-                results = search_wrapper.results(query, max_results=max_results)
-                if results:
-                    break
-            except Exception as e:
-                print(f"  [SEARCH ERROR] Attempt {attempt} failed: {e}")
-                if attempt < max_retries:
-                    print(f"    - Rate limit or connection issue suspected. Waiting {wait_seconds}s before retry...")
-                    time.sleep(wait_seconds)
-                    wait_seconds *= 2  # Exponential backoff
-                else:
-                    print(f"    - [CRITICAL] All DuckDuckGo attempts failed. Returning empty results.")
-                    results = []
-
-        print(f"DuckDuckGo found {len(results)} results.")
+        found_review_urls = URLFrontier.from_config(config)
+        results = load_cached_search(query, max_results, ttl)
+        stream = results is None and streaming
+        if stream:
+            # Only the first page is awaited; the rest is pushed into the frontier in the background
+            results = search_with_retry(lambda: search_page(query, 1))
+        elif results is None:
+            results = search_with_retry(lambda: search_all(query, max_results))
+            if results and ttl:
+                save_cached_search(query, max_results, results)
+
+        print(f"DuckDuckGo found {len(results)} results{' (first page)' if stream else ''}.")
         for idx, r in enumerate(results):
             print(f"  {idx+1}. {r['link']}")
 
-        filtered_results = []
-        for r in results:
-            link = r['link'].lower()
-            # Hardcoded exclusions + user exclusions
-            if "tripadvisor" in link:
-                continue
-            
-            if any(forbidden in link for forbidden in forbidden_urls if forbidden):
-                print(f"  [FILTERED] Excluding forbidden URL: {r['link']}")
-                continue
-            
-            filtered_results.append(r)
-
+        filtered_results = filter_results(results, forbidden_urls)
         print(f"Remaining after filter: {len(filtered_results)}")
 
         relevant_ids = []
-        found_review_urls = []
         for idx, result in enumerate(filtered_results):
             rid = f"result_{idx+1}"
             result["id"] = rid
             relevant_ids.append(rid)
-            found_review_urls.append(result['link'])
+            found_review_urls.push(result['link'], source="search")
+        if found_review_urls.stats["duplicates_skipped"]:
+            print(f"  [DEDUP] {found_review_urls.stats['duplicates_skipped']} search results point to the same page.")
 
-    metrics = state.get("step_metrics", [])
-    metrics.append(tracker.result)
+        if stream and results:
+            found_review_urls.open_producer()
+            threading.Thread(target=stream_search, daemon=True, name="search-stream",
+                             args=(query, max_results, found_review_urls, forbidden_urls, results, ttl)).start()
 
     return {
         "retrieved_content": filtered_results,
         "relevant_ids": relevant_ids,
-        "seed_urls": found_review_urls,
+        "seed_urls": found_review_urls.pending(),
         "found_review_urls": found_review_urls,
-        "step_metrics": metrics
+        "step_metrics": [tracker.result]
     }
@@ -1,17 +1,114 @@
-from typing import TypedDict, List, Optional, Any
+import operator
+from collections.abc import Sequence
+from typing import TypedDict, List, Optional, Any, Annotated, get_type_hints
+from nodes.frontier import URLFrontier
+
+
+class AppendLog(Sequence):
+    """Immutable append-only list whose versions share structure.
+
+    Appending creates a new head that points to the previous log, so a step costs
+    O(len(delta)) instead of copying everything collected so far. Old versions stay valid,
+    which matters because LangGraph keeps several copies of a channel value around.
+    """
+    __slots__ = ("_prev", "_chunk", "_len", "_flat")
+
+    def __init__(self, items=(), prev: "AppendLog" = None):
+        self._prev = prev
+        self._chunk = tuple(items)
+        self._len = (prev._len if prev is not None else 0) + len(self._chunk)
+        self._flat = None  # Flattened items, built on first indexing (versions never change)
+
+    def extended(self, items) -> "AppendLog":
+        """Returns a new log with items appended (self is left untouched)."""
+        items = tuple(items or ())
+        return AppendLog(items, self) if items else self
+
+    def _chunks(self):
+        chunks, node = [], self
+        while node is not None:
+            chunks.append(node._chunk)
+            node = node._prev
+        return reversed(chunks)
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            yield from chunk
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if self._flat is None:
+            self._flat = tuple(self)
+        return list(self._flat[index]) if isinstance(index, slice) else self._flat[index]
+
+    def __eq__(self, other):
+        return isinstance(other, (list, tuple, AppendLog)) and list(self) == list(other)
+
+    def __repr__(self):
+        return f"AppendLog({list(self)!r})"
+
+    def __reduce__(self):
+        # Serialize flat so that long chains do not hit the recursion limit
+        return (AppendLog, (list(self),))
+
+
+def append_only(left: Optional[Sequence], right: Optional[Sequence]) -> AppendLog:
+    """Reducer for append-only logs: nodes return only new entries, which are appended in O(delta)."""
+    base = left if isinstance(left, AppendLog) else AppendLog(left or ())
+    return base.extended(right)
+
+
+def add_branch_results(left: Optional[List[dict]], right: Optional[List[dict]]) -> List[dict]:
+    """Reducer for parallel branch outputs: appends results, an empty update resets the channel."""
+    if not right:
+        return []
+    return (left or []) + right
 
 
 class GraphState(TypedDict):
     query: str
+    topic: str                   # Topic as given by the user (query gets refined by the LLM)
     max_reviews: int
     retrieved_content: List[dict]
     relevant_ids: List[str]
-    reviews: List[dict]           # Final, verified reviews
+    # Append-only logs: nodes return only new entries, the reducer appends them
+    reviews: Annotated[List[dict], append_only]           # Final, verified reviews
+    review_count: Annotated[int, operator.add]            # Number of accepted reviews (incl. streamed ones)
     # Currently being processed (extract -> repair -> verify)
     temp_reviews: List[dict]
+    page_urls: List[str]         # Pages of the current batch; verify reports them finished to the frontier
     seed_urls: List[str]         # Initial URLs (seed or search results)
-    found_review_urls: List[str]  # Queue for BFS discovery
-    visited_urls: List[str]       # History of processed URLs
-    relevance_results: List[dict]  # Audit log of URLs checked
-    step_metrics: List[dict]      # GPU/Time metrics
+    found_review_urls: URLFrontier  # Queue for BFS discovery (canonical URLs)
+    visited_urls: Annotated[List[str], append_only]       # History of processed URLs
+    relevance_results: Annotated[List[dict], append_only]  # Audit log of URLs checked
+    step_metrics: Annotated[List[dict], append_only]      # GPU/Time metrics
     config: dict                  # Global settings from CLI/Env
+    # Fan-out mode: URLs of the current superstep and the outputs of their parallel branches
+    batch_urls: List[str]
+    branch_results: Annotated[List[dict], add_branch_results]
+
+
+APPEND_ONLY_FIELDS = ("reviews", "visited_urls", "relevance_results", "step_metrics")
+
+
+def get_reducers() -> dict:
+    """Returns the reducer function of every annotated GraphState field."""
+    reducers = {}
+    for key, hint in get_type_hints(GraphState, include_extras=True).items():
+        for meta in getattr(hint, "__metadata__", ()):
+            if callable(meta):
+                reducers[key] = meta
+    return reducers
+
+
+def apply_update(state: dict, update: dict) -> dict:
+    """Applies a node update to a plain state dict the way LangGraph does, honouring reducers."""
+    reducers = get_reducers()
+    for key, value in (update or {}).items():
+        if key in reducers and key in state:
+            state[key] = reducers[key](state[key], value)
+        else:
+            state[key] = value
+    return state
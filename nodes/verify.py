@@ -1,12 +1,25 @@
-import json
+from collections import Counter
 from typing import List
-from langdetect import detect
 from langsmith import traceable
-from helpers import load_prompt, get_llm
+from helpers import invoke_llm, get_model_name
+from language import filter_by_language
+from budget import get_budget
+from nodes.prompts import get_prompt
+from tokens import fit_prompt
 from nodes.state import GraphState
+from nodes.frontier import URLFrontier
 from nodes.models import ReviewVerification
 from monitor import TrackStep
-from const import DEFAULT_MAX_REVIEWS
+from profiling import span
+from const import DEFAULT_MAX_REVIEWS, VERIFY_OUTPUT_TOKENS
+
+
+def finish_pages(state: GraphState):
+    """Reports the pages of the batch as finished (after their verified reviews were recorded)."""
+    frontier = state.get("found_review_urls")
+    if isinstance(frontier, URLFrontier):
+        for url in state.get("page_urls") or []:
+            frontier.record_page_done(url)
 
 
 @traceable(run_type="chain", name="Review Verification Node")
@@ -16,32 +29,48 @@ def verify_reviews_node(state: GraphState):
         query = state["query"]
         config = state.get("config", {})
         temp_reviews = state.get("temp_reviews", [])
-        all_reviews = state.get("reviews", []) or []
 
         if not temp_reviews:
-            return {"temp_reviews": []}
+            finish_pages(state)
+            return {"temp_reviews": [], "page_urls": []}
 
-        template = load_prompt("08_verify_reviews.md")
-        json_schema = json.dumps(
-            ReviewVerification.model_json_schema(), indent=2)
+        # --- Language Filtering (before the LLM, so other-language reviews cost no GPU time) ---
+        lang_rejected_count = 0
+        target_lang = config.get("language")
+        if target_lang and target_lang.lower() != "none":
+            with span("verify.language_filter"):
+                temp_reviews, lang_stats = filter_by_language(temp_reviews, target_lang)
+            lang_rejected_count = lang_stats["rejected"]
+            if lang_rejected_count or lang_stats["uncertain_kept"]:
+                print(f"  [LANGUAGE] Rejected {lang_rejected_count} reviews not matching '{target_lang}' "
+                      f"({lang_stats['uncertain_kept']} uncertain and {lang_stats['short_kept']} short kept, "
+                      f"{lang_stats['detector']}).")
 
-        # Dynamic LLM for verification (using reasoning model)
-        llm_reasoning = get_llm(config, use_reasoning=True)
-        structured_llm = llm_reasoning.with_structured_output(ReviewVerification)
+        verify_prompt = get_prompt("08_verify_reviews.md", config)
+        template, json_schema = verify_prompt.template, verify_prompt.schema
+
+        model_name = get_model_name(config, use_reasoning=True)
 
         verified_batch = []
         rejected_count = 0
-
-        for rev in temp_reviews:
-            prompt = template.format(
+        budget = get_budget(config)
+
+        for i, rev in enumerate(temp_reviews):
+            if budget.exhausted():
+                print(f"  [BUDGET] Dropping {len(temp_reviews) - i} reviews not yet verified.")
+                break
+            prompt, num_ctx = fit_prompt(
+                template, "review_text", rev["review_text"],
+                reserved_output=VERIFY_OUTPUT_TOKENS, model=model_name,
                 query=query,
-                review_text=rev["review_text"],
                 json_schema=json_schema
             )
 
             try:
-                res = structured_llm.invoke(
-                    prompt, config={"run_name": "Verify-Review-Authenticity"})
+                # Dynamic LLM for verification (using reasoning model)
+                res = invoke_llm(
+                    config, ReviewVerification, prompt, num_ctx=num_ctx,
+                    use_reasoning=True, run_name="Verify-Review-Authenticity")
                 if res.is_authentic:
                     verified_batch.append(rev)
                 else:
@@ -55,30 +84,17 @@ def verify_reviews_node(state: GraphState):
         print(
             f"\nFinal Verification results: {len(verified_batch)} authentic, {rejected_count} rejected.")
 
-    # --- Language Filtering ---
-    target_lang = config.get("language")
-    if target_lang and target_lang.lower() != "none":
-        lang_filtered_batch = []
-        lang_rejected_count = 0
-        for rev in verified_batch:
-            try:
-                detected = detect(rev["review_text"])
-                if detected == target_lang:
-                    lang_filtered_batch.append(rev)
-                else:
-                    lang_rejected_count += 1
-            except:
-                # If detection fails, we skip it to be safe
-                lang_rejected_count += 1
-        
-        if lang_rejected_count > 0:
-            print(f"  [LANGUAGE] Rejected {lang_rejected_count} reviews not matching '{target_lang}'.")
-        verified_batch = lang_filtered_batch
+    # Feed the observed per-page yield back into the crawl frontier (drives best-first ordering)
+    frontier = state.get("found_review_urls")
+    if isinstance(frontier, URLFrontier):
+        for url, count in Counter(rev.get("website_url") for rev in verified_batch).items():
+            frontier.record_reviews(url, count)
+    finish_pages(state)
 
     # Merge verified batch into global reviews (Respecting limit precisely)
     config = state.get("config", {})
     max_req = state.get("max_reviews", config.get("max_reviews", DEFAULT_MAX_REVIEWS))
-    current_count = len(all_reviews)
+    current_count = state.get("review_count", 0)
     remaining_slots = max_req - current_count
 
     if remaining_slots <= 0:
@@ -86,13 +102,11 @@ def verify_reviews_node(state: GraphState):
     else:
         actual_to_add = verified_batch[:remaining_slots]
 
-    updated_reviews = all_reviews + actual_to_add
-
     if len(verified_batch) > remaining_slots and remaining_slots > 0:
         print(
             f"  [LIMIT] Capped additions to {remaining_slots} to respect max_reviews.")
 
-    metrics = state.get("step_metrics", [])
-    metrics.append(tracker.result)
-
-    return {"reviews": updated_reviews, "temp_reviews": [], "step_metrics": metrics}
+    # Append-only: only the newly accepted reviews are returned (see GraphState reducers)
+    return {"reviews": actual_to_add, "review_count": len(actual_to_add), "temp_reviews": [], "page_urls": [],
+            "step_metrics": [{**tracker.result, "language_rejected": lang_rejected_count,
+                              "llm_rejected": rejected_count}]}
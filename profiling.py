@@ -0,0 +1,161 @@
+import os
+import math
+import time
+import bisect
+import threading
+from contextlib import nullcontext
+from functools import wraps
+from const import PROFILE_BUCKET_MIN_SECONDS, PROFILE_BUCKET_MAX_SECONDS, PROFILE_BUCKETS_PER_DOUBLING
+
+PROMETHEUS_FILE = "profile.prom"
+PROFILE_QUANTILES = (0.5, 0.95, 0.99)
+
+# Log-spaced upper bounds shared by all histograms (relative quantile error < 2^(1/n) - 1)
+BUCKET_BOUNDS = [PROFILE_BUCKET_MIN_SECONDS * 2 ** (i / PROFILE_BUCKETS_PER_DOUBLING)
+                 for i in range(int(math.log2(PROFILE_BUCKET_MAX_SECONDS / PROFILE_BUCKET_MIN_SECONDS)
+                                    * PROFILE_BUCKETS_PER_DOUBLING) + 1)]
+
+_enabled = False
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: constant memory, approximate quantiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation inside the bucket holding the q-th observation, clamped to min/max."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i else 0.0
+                upper = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                value = lower + (upper - lower) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.count if self.count else 0.0,
+            "min_seconds": self.min if self.count else 0.0,
+            "max_seconds": self.max,
+            **{f"p{round(q * 100)}_seconds": self.quantile(q) for q in PROFILE_QUANTILES},
+        }
+
+
+class Profiler:
+    """Process-wide registry of span histograms."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def snapshot(self) -> dict:
+        """{span: {count, total/mean/min/max, p50/p95/p99}} in seconds."""
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: one histogram per span plus p50/p95/p99 gauges."""
+        lines = ["# HELP absa_span_seconds Latency of profiled spans.",
+                 "# TYPE absa_span_seconds histogram"]
+        quantiles = ["# HELP absa_span_quantile_seconds Estimated latency quantiles of profiled spans.",
+                     "# TYPE absa_span_quantile_seconds gauge"]
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for i, (bound, n) in enumerate(zip(BUCKET_BOUNDS + [math.inf], h.counts)):
+                    cumulative += n
+                    # Only whole doublings are exported to keep the file small
+                    if bound == math.inf or i % PROFILE_BUCKETS_PER_DOUBLING == 0:
+                        le = "+Inf" if bound == math.inf else f"{bound:.6g}"
+                        lines.append(f'absa_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'absa_span_seconds_sum{{span="{name}"}} {h.total:.6f}')
+                lines.append(f'absa_span_seconds_count{{span="{name}"}} {h.count}')
+                quantiles += [f'absa_span_quantile_seconds{{span="{name}",quantile="{q}"}} {h.quantile(q):.6f}'
+                              for q in PROFILE_QUANTILES]
+        return "\n".join(lines + quantiles) + "\n"
+
+    def write_prometheus(self, folder_path: str) -> str:
+        os.makedirs(folder_path, exist_ok=True)
+        path = os.path.join(folder_path, PROMETHEUS_FILE)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        return path
+
+
+profiler = Profiler()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        profiler.observe(self.name, time.perf_counter() - self.start)
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def span(name: str):
+    """Times the enclosed block into the histogram `name`; a shared no-op context when profiling is off."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def profiled(name: str):
+    """Decorator form of span() for whole functions."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,399 @@
+"""Offline record/replay of complete runs for benchmarking.
+
+record  runs a topic against the live services and stores every search result, fetched page and
+        Ollama request/response in a cassette folder (Ollama is recorded through a local proxy).
+replay  runs the same topic offline: a local stand-in server answers the Ollama API and the page
+        fetches from the cassette, with configurable synthetic latency.
+
+Usage:
+  python replay.py record "Italian restaurants in Berlin" --cassette _replay/berlin --max_reviews 20
+  python replay.py replay --cassette _replay/berlin --llm_scale 1.0 --fetch_ms 200
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from urllib.parse import urlparse, parse_qs, quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from const import (DEFAULT_MAX_REVIEWS, REPLAY_CASSETTE_DIR, REPLAY_LLM_MS, REPLAY_LLM_SCALE,
+                   REPLAY_FETCH_MS, REPLAY_SEARCH_MS, PROMPT_TEMPLATE_DIR)
+
+LLM_FILE = "llm.jsonl"
+FETCH_FILE = "fetch.jsonl"
+SEARCH_FILE = "search.jsonl"
+META_FILE = "meta.json"
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Cassette:
+    """Recorded interactions of one run: append-only JSONL files keyed per interaction kind."""
+
+    FILES = {"llm": LLM_FILE, "fetch": FETCH_FILE, "search": SEARCH_FILE}
+
+    def __init__(self, path: str):
+        # Absolute, since runs change into an isolated working directory
+        self.path = os.path.abspath(path)
+        self.entries = {kind: {} for kind in self.FILES}
+        self.misses = {kind: 0 for kind in self.FILES}
+        self._lock = threading.Lock()
+        for kind, filename in self.FILES.items():
+            file_path = os.path.join(path, filename)
+            if os.path.exists(file_path):
+                with open(file_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self.entries[kind][entry["key"]] = entry
+
+    def add(self, kind: str, key: str, entry: dict):
+        entry = {"key": key, **entry}
+        with self._lock:
+            self.entries[kind][key] = entry
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, self.FILES[kind]), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def get(self, kind: str, key: str):
+        entry = self.entries[kind].get(key)
+        if entry is None:
+            with self._lock:
+                self.misses[kind] += 1
+        return entry
+
+    def save_meta(self, meta: dict):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+    def load_meta(self) -> dict:
+        with open(os.path.join(self.path, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+class Latency:
+    """Synthetic latency added by the replay server (LLM: fixed ms plus a share of the recorded duration)."""
+
+    def __init__(self, llm_ms: float = REPLAY_LLM_MS, llm_scale: float = REPLAY_LLM_SCALE,
+                 fetch_ms: float = REPLAY_FETCH_MS, search_ms: float = REPLAY_SEARCH_MS):
+        self.llm_ms = llm_ms
+        self.llm_scale = llm_scale
+        self.fetch_ms = fetch_ms
+        self.search_ms = search_ms
+
+    def llm_seconds(self, recorded_ns: int) -> float:
+        return self.llm_ms / 1000 + self.llm_scale * recorded_ns / 1e9
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def request_key(path: str, body: bytes) -> str:
+    """Stable key of an Ollama API request; sampling options and keep_alive are ignored.
+
+    Token-based context sizing may pick another num_ctx when pages are processed in another
+    order, so options must not prevent a match.
+    """
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        payload = {"raw": body.decode("utf-8", "replace")}
+    if isinstance(payload, dict):
+        payload = {k: v for k, v in payload.items() if k not in ("options", "keep_alive")}
+    canonical = json.dumps([path, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def recorded_duration(lines: list) -> int:
+    """total_duration (ns) reported in the final NDJSON chunk of a recorded response."""
+    for line in reversed(lines):
+        try:
+            return int(json.loads(line).get("total_duration") or 0)
+        except (ValueError, AttributeError):
+            continue
+    return 0
+
+
+class ReplayServer:
+    """Local stand-in for Ollama (and, when replaying, for the fetched websites).
+
+    record: forwards every Ollama request to `upstream` and stores the response lines.
+    replay: answers Ollama requests and GET /fetch?url=... from the cassette.
+    """
+
+    def __init__(self, cassette: Cassette, mode: str, upstream: str = None, latency: Latency = None):
+        self.cassette = cassette
+        self.mode = mode
+        self.upstream = (upstream or "").rstrip("/")
+        self.latency = latency or Latency()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="replay-server")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/fetch?"):
+                    return server.serve_page(self)
+                server.serve_llm(self, b"")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                server.serve_llm(self, body)
+
+        return Handler
+
+    def serve_llm(self, handler, body: bytes):
+        key = request_key(handler.path, body)
+        if self.mode == "record":
+            res = requests.request(handler.command, self.upstream + handler.path, data=body or None,
+                                   headers={"Content-Type": "application/json"}, timeout=None)
+            entry = {"path": handler.path, "request": body.decode("utf-8", "replace"), "status": res.status_code,
+                     "content_type": res.headers.get("Content-Type", "application/json"),
+                     "lines": res.text.splitlines()}
+            self.cassette.add("llm", key, entry)
+        else:
+            entry = self.cassette.get("llm", key)
+            if entry is None:
+                print(f"  [REPLAY] No recorded response for {handler.command} {handler.path}")
+                message = json.dumps({"error": "request not recorded in cassette"}).encode()
+                return handler._send(404, message, "application/json")
+            time.sleep(self.latency.llm_seconds(recorded_duration(entry["lines"])))
+        payload = "".join(line + "\n" for line in entry["lines"]).encode()
+        handler._send(entry["status"], payload, entry["content_type"])
+
+    def serve_page(self, handler):
+        url = parse_qs(urlparse(handler.path).query).get("url", [""])[0]
+        entry = self.cassette.get("fetch", url)
+        time.sleep(self.latency.fetch_ms / 1000)
+        if entry is None:
+            return handler._send(404, b"", "text/plain")
+        handler._send(entry["status"], entry["text"].encode("utf-8"), "text/html; charset=utf-8")
+
+
+class Recorder:
+    """Fetch and search hooks that call the live services and store their results."""
+
+    def __init__(self, cassette: Cassette, http_get, search_all, search_page):
+        self.cassette = cassette
+        self._http_get, self._search_all, self._search_page = http_get, search_all, search_page
+
+    def http_get(self, url, **kwargs):
+        res = self._http_get(url, **kwargs)
+        self.cassette.add("fetch", url, {"status": res.status_code, "text": res.text})
+        return res
+
+    def search_all(self, query, max_results):
+        results = self._search_all(query, max_results)
+        self.cassette.add("search", search_key("all", query, max_results), {"results": results})
+        return results
+
+    def search_page(self, query, page, **kwargs):
+        results = self._search_page(query, page, **kwargs)
+        self.cassette.add("search", search_key("page", query, page), {"results": results})
+        return results
+
+
+class Player:
+    """Fetch and search hooks served from the cassette (pages go through the replay server)."""
+
+    def __init__(self, cassette: Cassette, server: ReplayServer, latency: Latency):
+        self.cassette = cassette
+        self.server = server
+        self.latency = latency
+
+    def http_get(self, url, **kwargs):
+        return requests.get(f"{self.server.url}/fetch?url={quote(url, safe='')}", **kwargs)
+
+    def _search(self, key: str) -> list:
+        time.sleep(self.latency.search_ms / 1000)
+        entry = self.cassette.get("search", key)
+        return entry["results"] if entry else []
+
+    def search_all(self, query, max_results):
+        return self._search(search_key("all", query, max_results))
+
+    def search_page(self, query, page, **kwargs):
+        return self._search(search_key("page", query, page))
+
+
+def search_key(kind: str, query: str, arg: int) -> str:
+    return json.dumps([kind, query, arg], ensure_ascii=False)
+
+
+@contextlib.contextmanager
+def hooks(backend):
+    """Routes page fetches and searches through backend (a Recorder or Player)."""
+    from nodes import extract, retrieval
+
+    saved = (extract.http_get, retrieval.search_all, retrieval.search_page)
+    extract.http_get, retrieval.search_all, retrieval.search_page = (
+        backend.http_get, backend.search_all, backend.search_page)
+    try:
+        yield backend
+    finally:
+        extract.http_get, retrieval.search_all, retrieval.search_page = saved
+
+
+@contextlib.contextmanager
+def isolated_workdir():
+    """Runs in an empty working directory (cold page/search caches, results kept out of the repo)."""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="absa_replay_") as workdir:
+        os.symlink(os.path.join(ROOT, PROMPT_TEMPLATE_DIR), os.path.join(workdir, PROMPT_TEMPLATE_DIR))
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous)
+
+
+def peak_rss_mb() -> float:
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_graph(topic: str, max_reviews: int, config: dict) -> dict:
+    """Invokes the compiled graph once and returns throughput figures of the run."""
+    from absa_agent import create_graph, build_initial_state, get_stop_reason
+    from budget import get_budget
+
+    app = create_graph(config)
+    state = build_initial_state(topic, max_reviews, config)
+    start = time.perf_counter()
+    final_state = app.invoke(state)
+    seconds = time.perf_counter() - start
+
+    pages = len(final_state.get("visited_urls", []))
+    reviews = final_state.get("review_count", 0)
+    llm_calls = int(get_budget(config).used["llm_calls"])
+    return {
+        "seconds": seconds,
+        "pages": pages,
+        "reviews": reviews,
+        "llm_calls": llm_calls,
+        "pages_per_sec": pages / seconds if seconds else 0,
+        "reviews_per_sec": reviews / seconds if seconds else 0,
+        "llm_calls_per_review": llm_calls / reviews if reviews else 0,
+        "peak_rss_mb": peak_rss_mb(),
+        "stop_reason": get_stop_reason(final_state),
+    }
+
+
+def record(topic: str, cassette_path: str, max_reviews: int, config: dict = None) -> dict:
+    """Runs topic against the live services and stores everything needed to replay it."""
+    from absa_agent import DEFAULT_CONFIG
+    from nodes import extract, retrieval
+
+    config = dict(config or DEFAULT_CONFIG)
+    cassette = Cassette(cassette_path)
+    server = ReplayServer(cassette, "record", upstream=config["llm_url"]).start()
+    recorder = Recorder(cassette, extract.http_get, retrieval.search_all, retrieval.search_page)
+    cassette.save_meta({"topic": topic, "max_reviews": max_reviews,
+                        "config": {k: v for k, v in config.items() if k not in ("llm_url", "session_id")}})
+    try:
+        with hooks(recorder), isolated_workdir():
+            report = run_graph(topic, max_reviews, {**config, "llm_url": server.url, "session_id": "record"})
+    finally:
+        server.stop()
+    print(f"  [RECORD] {sum(len(e) for e in cassette.entries.values())} interactions saved to {cassette_path}")
+    return report
+
+
+def replay(cassette_path: str, latency: Latency = None, config_overrides: dict = None) -> dict:
+    """Re-runs a recorded topic offline and returns its throughput report."""
+    latency = latency or Latency()
+    cassette = Cassette(cassette_path)
+    meta = cassette.load_meta()
+    server = ReplayServer(cassette, "replay", latency=latency).start()
+    config = {**meta["config"], **(config_overrides or {}), "llm_url": server.url, "session_id": "replay"}
+    try:
+        with hooks(Player(cassette, server, latency)), isolated_workdir():
+            report = run_graph(meta["topic"], meta["max_reviews"], config)
+    finally:
+        server.stop()
+    report["misses"] = dict(cassette.misses)
+    report["latency"] = latency.as_dict()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a live run or replay it offline")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    rec = sub.add_parser("record", help="Run a topic live and record it")
+    rec.add_argument("topic")
+    rec.add_argument("--cassette", default=os.path.join(REPLAY_CASSETTE_DIR, "default"))
+    rec.add_argument("--max_reviews", type=int, default=DEFAULT_MAX_REVIEWS)
+
+    rep = sub.add_parser("replay", help="Replay a recorded run offline")
+    rep.add_argument("--cassette", default=os.path.join(REPLAY_CASSETTE_DIR, "default"))
+    rep.add_argument("--llm_ms", type=float, default=REPLAY_LLM_MS, help="Fixed latency per LLM call (ms)")
+    rep.add_argument("--llm_scale", type=float, default=REPLAY_LLM_SCALE,
+                     help="Share of the recorded Ollama duration added per LLM call (1.0 = as recorded)")
+    rep.add_argument("--fetch_ms", type=float, default=REPLAY_FETCH_MS, help="Latency per page fetch (ms)")
+    rep.add_argument("--search_ms", type=float, default=REPLAY_SEARCH_MS, help="Latency per search (ms)")
+    rep.add_argument("--fan_out", type=int)
+    rep.add_argument("--pipeline", action="store_true")
+    rep.add_argument("--json", action="store_true", help="Print only the JSON report (used by the benchmarks)")
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        report = record(args.topic, args.cassette, args.max_reviews)
+        print(json.dumps(report, indent=2))
+        return
+
+    # Replays must not reach the GPU host or LangSmith
+    os.environ.setdefault("GPU_SAMPLER", "none")
+    os.environ["LANGSMITH_TRACING"] = os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    overrides = {"pipeline": True} if args.pipeline else {}
+    if args.fan_out:
+        overrides["fan_out"] = args.fan_out
+    latency = Latency(args.llm_ms, args.llm_scale, args.fetch_ms, args.search_ms)
+    if args.json:
+        with contextlib.redirect_stdout(sys.stderr):
+            report = replay(args.cassette, latency, overrides)
+        print(json.dumps(report))
+    else:
+        report = replay(args.cassette, latency, overrides)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
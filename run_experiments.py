@@ -1,6 +1,8 @@
-import subprocess
 import sys
 import os
+import argparse
+from batch import BatchRunner
+from absa_agent import DEFAULT_CONFIG
 
 # Top 20 America Cities (Corrected Population-based List)
 CITIES = [
@@ -10,51 +12,39 @@ CITIES = [
     "Indianapolis", "San Francisco", "Seattle", "Denver", "Oklahoma City"
 ]
 
-def run_experiment(city):
-    """Runs the absa_agent.py script for a specific city."""
-    print(f"\n{'='*50}")
-    print(f"RUNNING EXPERIMENT FOR: {city}")
-    print(f"{'='*50}\n")
-    
-    # Define the topic
-    topic = f"Restaurants in {city}"
-    
-    # Generate session ID
-    session_id = f"restaurants_{city.lower().replace(' ', '_')}"
-    
-    # Define the command
-    # Using sys.executable to ensure we use the same environment
-    cmd = [
-        sys.executable, 
-        "absa_agent.py", 
-        topic,
-        "--id", session_id,
-        "--max_reviews", "50",  # 50 reviews per experiment
-        "--language", "en",      # Explicitly English
-        "--forbidden_urls", "opentable.com"
-    ]
-    
-    try:
-        # Run the process and wait for completion
-        # Using subprocess.run to keep each experiment isolated
-        result = subprocess.run(cmd, check=True)
-        print(f"\n[SUCCESS] Completed experiment for {city}")
-    except subprocess.CalledProcessError as e:
-        print(f"\n[ERROR] Experiment for {city} failed with exit code {e.returncode}")
-    except Exception as e:
-        print(f"\n[FATAL] An unexpected error occurred: {e}")
+
+def get_experiment_topics():
+    """Maps the session ID of each city experiment to its topic."""
+    return {f"restaurants_{city.lower().replace(' ', '_')}": f"Restaurants in {city}" for city in CITIES}
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Runs the restaurant experiments for all cities")
+    # One city at a time by default: the GPU power sampler measures the whole GPU, so concurrent
+    # sessions would each be charged the others' energy (energy_joules, joules_per_review, --max_joules)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of cities processed at the same time (1 = one after another; "
+                             "with more, the per-city energy figures include the other cities' GPU load)")
+    args = parser.parse_args()
+
     if not os.path.exists("absa_agent.py"):
         print("Error: absa_agent.py not found in the current directory.")
         sys.exit(1)
-        
+
+    config = {
+        **DEFAULT_CONFIG,
+        "max_reviews": 50,               # 50 reviews per experiment
+        "language": "en",                # Explicitly English
+        "forbidden_urls": ["opentable.com"],
+    }
+
     print(f"Starting experiments for {len(CITIES)} cities...")
-    
-    for city in CITIES:
-        run_experiment(city)
-        
-    print("\nAll experiments completed.")
+
+    # One process, one compiled graph; each city is its own session with results/<session_id>
+    runner = BatchRunner(config, concurrency=args.concurrency)
+    report = runner.run(get_experiment_topics(), max_reviews=config["max_reviews"], batch_id="restaurants")
+
+    print(f"\nAll experiments completed ({report['succeeded']}/{report['topics']} succeeded).")
 
 if __name__ == "__main__":
     main()
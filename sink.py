@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+from const import STREAM_FSYNC_EVERY, STREAM_FSYNC_SECONDS
+
+STREAM_FILE = "reviews.jsonl"
+
+
+class ReviewSink:
+    """Streams accepted reviews to '<folder>/reviews.jsonl', one JSON object per line.
+
+    Every batch is flushed right away so that consumers can tail the file; fsync is batched
+    (every `fsync_every` reviews or `fsync_seconds`). Used as a graph listener, the sink takes
+    the reviews out of the node update, so they are not kept in the graph state.
+    """
+
+    def __init__(self, folder_path: str, fsync_every: int = STREAM_FSYNC_EVERY,
+                 fsync_seconds: float = STREAM_FSYNC_SECONDS):
+        self.path = os.path.join(folder_path, STREAM_FILE)
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self.count = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def open(self, reviews=()):
+        """Starts a new stream; reviews restored from a checkpoint are written first."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self.count = 0
+        self.write(reviews)
+        self.sync()
+        return self
+
+    def write(self, reviews):
+        """Appends a batch of reviews and flushes it to the OS."""
+        if not reviews:
+            return
+        lines = "".join(json.dumps(rev, ensure_ascii=False) + "\n" for rev in reviews)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            self.count += len(reviews)
+            self._unsynced += len(reviews)
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        if self._file:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def on_update(self, node: str, state: dict, update: dict):
+        """Graph listener: writes newly accepted reviews and drops them from the update."""
+        if update and update.get("reviews"):
+            self.write(update["reviews"])
+            return {**update, "reviews": []}
+        return None
+
+
+class SessionSinks:
+    """Graph listener for several concurrent runs: routes reviews to the sink of each run's session."""
+
+    def __init__(self):
+        self.sinks = {}
+
+    def open(self, session_id: str, folder_path: str) -> ReviewSink:
+        self.sinks[session_id] = ReviewSink(folder_path).open()
+        return self.sinks[session_id]
+
+    def close(self, session_id: str):
+        """Closes and forgets the sink of a finished (or failed) run."""
+        sink = self.sinks.pop(session_id, None)
+        if sink:
+            sink.close()
+
+    def on_update(self, node: str, state: dict, update: dict):
+        sink = self.sinks.get(state["config"].get("session_id"))
+        return sink.on_update(node, state, update) if sink else None
@@ -0,0 +1,252 @@
+"""Columnar results store: one SQLite partition per session, mergeable into a single store.
+
+Every run (with --results_store) writes 'results/<session_id>/results.sqlite' with the tables
+reviews, step_metrics, relevance and sessions. Filter columns (session_id, domain, stars, ...)
+are real indexed columns; fields without a column are kept as JSON in 'extra'.
+
+Usage:
+  python store.py merge [--root results] [--out results/merged.sqlite] [--compact]
+  python store.py compact results/merged.sqlite
+  python store.py query --session restaurants_berlin --domain tripadvisor.com --min_stars 4 [--db ...]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from contextlib import closing
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+from nodes.frontier import get_domain
+from const import RESULTS_DIR, RESULTS_STORE_FILE, RESULTS_MERGED_FILE, RESULTS_STORE_BATCH
+
+# Table -> typed columns after session_id (everything else of a row goes to 'extra')
+TABLES = {
+    "sessions": ("topic", "saved_at", "summary"),
+    "reviews": ("domain", "website_url", "cache_id", "found_via_discovery", "stars", "review_title",
+                "review_text", "extra"),
+    "step_metrics": ("step", "start", "end", "duration", "avg_gpu_power_watts", "energy_joules", "llm_calls",
+                     "prompt_tokens", "eval_tokens", "extra"),
+    "relevance": ("domain", "url", "is_relevant", "cache_id", "duplicate_of"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, topic TEXT, saved_at REAL, summary TEXT);
+CREATE TABLE IF NOT EXISTS reviews (
+    session_id TEXT NOT NULL, domain TEXT, website_url TEXT, cache_id TEXT, found_via_discovery INTEGER,
+    stars INTEGER, review_title TEXT, review_text TEXT, extra TEXT);
+CREATE TABLE IF NOT EXISTS step_metrics (
+    session_id TEXT NOT NULL, step TEXT, [start] REAL, [end] REAL, duration REAL, avg_gpu_power_watts REAL,
+    energy_joules REAL, llm_calls INTEGER, prompt_tokens INTEGER, eval_tokens INTEGER, extra TEXT);
+CREATE TABLE IF NOT EXISTS relevance (
+    session_id TEXT NOT NULL, domain TEXT, url TEXT, is_relevant INTEGER, cache_id TEXT, duplicate_of TEXT);
+CREATE INDEX IF NOT EXISTS reviews_session_domain_stars ON reviews (session_id, domain, stars);
+CREATE INDEX IF NOT EXISTS reviews_domain_stars ON reviews (domain, stars);
+CREATE INDEX IF NOT EXISTS step_metrics_session ON step_metrics (session_id, step);
+CREATE INDEX IF NOT EXISTS relevance_session_domain ON relevance (session_id, domain);
+"""
+
+
+def partition_path(session_id: str, root: str = RESULTS_DIR) -> str:
+    return os.path.join(root, session_id, RESULTS_STORE_FILE)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Connection with the schema in place (created on first use)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _insert_sql(table: str) -> str:
+    columns = ("session_id",) + TABLES[table]
+    # Quoted: 'start' and 'end' are SQL keywords
+    return (f"INSERT INTO {table} ({', '.join(f'[{c}]' for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})")
+
+
+def _extra(row: dict, known: Iterable[str]) -> Optional[str]:
+    rest = {k: v for k, v in row.items() if k not in known}
+    return json.dumps(rest, ensure_ascii=False) if rest else None
+
+
+def review_row(session_id: str, rev: dict) -> tuple:
+    url = rev.get("website_url")
+    return (session_id, get_domain(url) if url else None, url, rev.get("cache_id"),
+            int(bool(rev.get("found_via_discovery"))), rev.get("stars"), rev.get("review_title"),
+            rev.get("review_text"), _extra(rev, TABLES["reviews"]))
+
+
+def metric_row(session_id: str, metric: dict) -> tuple:
+    calls = metric.get("llm_calls") or []
+    return (session_id, metric.get("step"), metric.get("start"), metric.get("end"), metric.get("duration"),
+            metric.get("avg_gpu_power_watts"), metric.get("energy_joules"), len(calls),
+            sum(c.get("prompt_eval_count") or 0 for c in calls), sum(c.get("eval_count") or 0 for c in calls),
+            _extra(metric, ("step", "start", "end", "duration", "avg_gpu_power_watts", "energy_joules")))
+
+
+def relevance_row(session_id: str, rel: dict) -> tuple:
+    url = rel.get("url")
+    return (session_id, get_domain(url) if url else None, url, int(bool(rel.get("is_relevant"))),
+            rel.get("cache_id"), rel.get("duplicate_of"))
+
+
+def _insert_batched(conn: sqlite3.Connection, table: str, rows: Iterable[tuple]) -> int:
+    sql, count, rows = _insert_sql(table), 0, iter(rows)
+    while True:
+        batch = list(islice(rows, RESULTS_STORE_BATCH))
+        if not batch:
+            return count
+        conn.executemany(sql, batch)
+        count += len(batch)
+
+
+def write_session(path: str, session_id: str, topic: Optional[str], reviews: Iterable[dict],
+                  step_metrics: List[dict], relevance_results: List[dict], summary: dict) -> dict:
+    """Replaces the rows of session_id in the store at path (one transaction; reviews may be a stream)."""
+    with closing(connect(path)) as conn, conn:
+        for table in TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+        conn.execute(_insert_sql("sessions"), (session_id, topic, time.time(), json.dumps(summary, default=str)))
+        counts = {
+            "reviews": _insert_batched(conn, "reviews", (review_row(session_id, r) for r in reviews)),
+            "step_metrics": _insert_batched(conn, "step_metrics", (metric_row(session_id, m) for m in step_metrics)),
+            "relevance": _insert_batched(conn, "relevance", (relevance_row(session_id, r) for r in relevance_results)),
+        }
+    return counts
+
+
+def iter_jsonl(path: str) -> Iterator[dict]:
+    """Reviews of a streamed 'reviews.jsonl', one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def find_partitions(root: str = RESULTS_DIR, sessions: Optional[List[str]] = None) -> List[str]:
+    """Partition files under root; with sessions given only theirs are opened (partition pruning)."""
+    if sessions:
+        paths = [partition_path(sid, root) for sid in sessions]
+    else:
+        paths = [os.path.join(root, name, RESULTS_STORE_FILE) for name in sorted(os.listdir(root))
+                 if os.path.isdir(os.path.join(root, name))] if os.path.isdir(root) else []
+    return [p for p in paths if os.path.exists(p)]
+
+
+def merge(partitions: List[str], out: str = RESULTS_MERGED_FILE) -> dict:
+    """Copies the sessions of all partitions into out; sessions already merged at the same save are skipped."""
+    stats = {"partitions": len(partitions), "merged": 0, "unchanged": 0}
+    with closing(connect(out)) as conn:
+        merged_at = dict(conn.execute("SELECT session_id, saved_at FROM sessions"))
+        for path in partitions:
+            conn.execute("ATTACH DATABASE ? AS src", (path,))
+            try:
+                sessions = [row for row in conn.execute("SELECT session_id, saved_at FROM src.sessions")
+                            if merged_at.get(row[0]) != row[1]]
+                if not sessions:
+                    stats["unchanged"] += 1
+                    continue
+                with conn:
+                    for session_id, _ in sessions:
+                        for table in TABLES:
+                            conn.execute(f"DELETE FROM main.{table} WHERE session_id = ?", (session_id,))
+                            conn.execute(f"INSERT INTO main.{table} SELECT * FROM src.{table} WHERE session_id = ?",
+                                         (session_id,))
+                stats["merged"] += len(sessions)
+            finally:
+                conn.execute("DETACH DATABASE src")
+    return stats
+
+
+def compact(path: str):
+    """Rebuilds the file without free pages and refreshes the query planner statistics."""
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+
+
+def query(paths: List[str], table: str = "reviews", sessions: Optional[List[str]] = None,
+          domains: Optional[List[str]] = None, min_stars: Optional[int] = None, max_stars: Optional[int] = None,
+          limit: Optional[int] = None) -> Iterator[dict]:
+    """Streams the matching rows of table from the given stores; filters run inside SQLite (indexed)."""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'. Choose from {tuple(TABLES)}.")
+    where, params = [], []
+    if sessions:
+        where.append(f"session_id IN ({', '.join('?' for _ in sessions)})")
+        params += sessions
+    if domains:
+        if "domain" not in TABLES[table]:
+            raise ValueError(f"Table '{table}' has no domain column.")
+        where.append(f"domain IN ({', '.join('?' for _ in domains)})")
+        params += [d.lower() for d in domains]
+    for op, value in ((">=", min_stars), ("<=", max_stars)):
+        if value is not None:
+            if table != "reviews":
+                raise ValueError("Star filters only apply to the reviews table.")
+            where.append(f"stars {op} ?")
+            params.append(value)
+    sql = f"SELECT * FROM {table}" + (f" WHERE {' AND '.join(where)}" if where else "")
+
+    remaining = limit
+    for path in paths:
+        if remaining is not None and remaining <= 0:
+            return
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(sql + (f" LIMIT {int(remaining)}" if remaining is not None else ""), params)
+            for row in cursor:
+                if remaining is not None:
+                    remaining -= 1
+                yield dict(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_merge = sub.add_parser("merge", help="Merge the per-session partitions into one store")
+    p_merge.add_argument("--root", default=RESULTS_DIR)
+    p_merge.add_argument("--sessions", nargs="+", help="Only merge these sessions")
+    p_merge.add_argument("--out", default=RESULTS_MERGED_FILE)
+    p_merge.add_argument("--compact", action="store_true", help="VACUUM and ANALYZE the merged store afterwards")
+
+    p_compact = sub.add_parser("compact", help="VACUUM and ANALYZE a store file")
+    p_compact.add_argument("path")
+
+    p_query = sub.add_parser("query", help="Print matching rows as JSON lines")
+    p_query.add_argument("--table", choices=TABLES, default="reviews")
+    p_query.add_argument("--db", nargs="+", help="Store files (default: the partitions of --root)")
+    p_query.add_argument("--root", default=RESULTS_DIR)
+    p_query.add_argument("--session", nargs="+")
+    p_query.add_argument("--domain", nargs="+")
+    p_query.add_argument("--min_stars", type=int)
+    p_query.add_argument("--max_stars", type=int)
+    p_query.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        stats = merge(find_partitions(args.root, args.sessions), args.out)
+        if args.compact:
+            compact(args.out)
+        print(f"  [STORE] {stats['merged']} sessions merged into {args.out} "
+              f"({stats['partitions']} partitions, {stats['unchanged']} unchanged).")
+    elif args.command == "compact":
+        before = os.path.getsize(args.path)
+        compact(args.path)
+        print(f"  [STORE] {args.path}: {before / 1e6:.1f} MB -> {os.path.getsize(args.path) / 1e6:.1f} MB")
+    else:
+        paths = args.db or find_partitions(args.root, args.session)
+        try:
+            for row in query(paths, args.table, args.session, args.domain, args.min_stars, args.max_stars,
+                             args.limit):
+                sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+        except ValueError as e:
+            parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nodes.frontier import URLFrontier  # noqa: E402
+
+URLS = ["https://a.com/1", "https://a.com/2", "https://a.com/3"]
+
+
+def test_fetched_page_does_not_prune_before_verification():
+    frontier = URLFrontier(URLS, prune_after=1)
+    url = frontier.pop()
+    frontier.mark_visited(url)
+    assert "a.com" not in frontier.pruned_domains
+
+    frontier.record_reviews(url, 5)
+    frontier.record_page_done(url)
+    assert "a.com" not in frontier.pruned_domains
+    assert frontier.pop() == "https://a.com/2"
+
+
+def test_in_flight_pages_do_not_count_towards_pruning():
+    frontier = URLFrontier(URLS, prune_after=2)
+    first, second = frontier.pop(), frontier.pop()
+    frontier.mark_visited(first)
+    frontier.mark_visited(second)
+    assert "a.com" not in frontier.pruned_domains
+
+    frontier.record_page_done(first)
+    frontier.record_reviews(second, 3)
+    frontier.record_page_done(second)
+    assert "a.com" not in frontier.pruned_domains
+
+
+def test_finished_pages_without_reviews_prune_the_domain():
+    frontier = URLFrontier(URLS, prune_after=1)
+    url = frontier.pop()
+    frontier.mark_visited(url)
+    frontier.record_page_done(url)
+    assert "a.com" in frontier.pruned_domains
+    assert frontier.pop() is None
+
+
+def test_replay_restores_finished_pages():
+    frontier = URLFrontier(URLS, prune_after=1)
+    frontier.track_changes()
+    url = frontier.pop()
+    frontier.mark_visited(url)
+    frontier.record_page_done(url)
+
+    restored = URLFrontier(URLS, prune_after=1)
+    restored.replay(frontier.drain_changes())
+    assert "a.com" in restored.pruned_domains
+
+
+def test_best_first_heap_does_not_grow_with_stats_changes():
+    frontier = URLFrontier([f"https://a.com/{i}" for i in range(200)] + ["https://b.com/1"], order="best_first")
+    for _ in range(20):
+        url = frontier.pop()
+        frontier.mark_visited(url)
+        frontier.record_relevance(url, True)
+        frontier.record_reviews(url, 2)
+        frontier.record_page_done(url)
+    assert sum(len(heap) for heap in frontier._heaps.values()) == len(frontier) == 181
+    expected = frontier.pending()[0]
+    assert frontier.pop() == expected
@@ -0,0 +1,118 @@
+import math
+import threading
+from const import (NUM_CTX, MIN_NUM_CTX, DEFAULT_CHARS_PER_TOKEN,
+                   TOKEN_SAFETY_MARGIN, TOKENIZER_PATH)
+
+# Upper bound of characters per token, used to pre-cut huge texts before tokenizing
+MAX_CHARS_PER_TOKEN = 8
+# Weight of a new observation when calibrating the estimator against Ollama's counts
+CALIBRATION_ALPHA = 0.2
+
+_chars_per_token = {}
+_calibration_lock = threading.Lock()
+_tokenizer = None
+_tokenizer_loaded = False
+# Largest context window requested per model so far (see hold_num_ctx)
+_num_ctx_held = {}
+_num_ctx_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """Loads the optional local tokenizer (TOKENIZER_PATH) once; returns None if unavailable."""
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+
+    _tokenizer_loaded = True
+    if TOKENIZER_PATH:
+        try:
+            from tokenizers import Tokenizer
+            _tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+        except Exception as e:
+            print(f"  [TOKENS] Could not load tokenizer '{TOKENIZER_PATH}': {e}. Using estimator.")
+    return _tokenizer
+
+
+def calibrate(model: str, prompt: str, prompt_eval_count: int):
+    """Refines the chars-per-token ratio of a model from a prompt token count reported by Ollama."""
+    if not prompt or not prompt_eval_count:
+        return
+    observed = min(max(len(prompt) / prompt_eval_count, 1.0), MAX_CHARS_PER_TOKEN)
+    with _calibration_lock:
+        current = _chars_per_token.get(model, DEFAULT_CHARS_PER_TOKEN)
+        _chars_per_token[model] = current + CALIBRATION_ALPHA * (observed - current)
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Counts tokens with the local tokenizer, or estimates them from the calibrated ratio."""
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text).ids)
+    ratio = _chars_per_token.get(model, DEFAULT_CHARS_PER_TOKEN)
+    return math.ceil(len(text) / ratio)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = None) -> str:
+    """Cuts text so that it holds at most max_tokens tokens."""
+    if not text or max_tokens <= 0:
+        return ""
+
+    # Cheap pre-cut so that huge pages are never tokenized in full
+    text = text[:max_tokens * MAX_CHARS_PER_TOKEN]
+    tokenizer = get_tokenizer()
+    if tokenizer:
+        encoding = tokenizer.encode(text)
+        if len(encoding.ids) <= max_tokens:
+            return text
+        return text[:encoding.offsets[max_tokens - 1][1]]
+
+    ratio = _chars_per_token.get(model, DEFAULT_CHARS_PER_TOKEN)
+    return text[:int(max_tokens * ratio)]
+
+
+def pick_num_ctx(needed_tokens: int) -> int:
+    """Returns the smallest power-of-two context window (>= MIN_NUM_CTX) that holds needed_tokens.
+
+    Windows are bucketed so Ollama only reallocates its KV cache for a handful of sizes.
+    """
+    num_ctx = MIN_NUM_CTX
+    while num_ctx < needed_tokens and num_ctx < NUM_CTX:
+        num_ctx *= 2
+    return min(num_ctx, NUM_CTX)
+
+
+def hold_num_ctx(model: str, num_ctx: int) -> int:
+    """Context window to request from model: at least the largest one requested before.
+
+    Ollama reloads a model (and drops its prompt cache) whenever num_ctx changes, so per model
+    the window only grows during a process instead of following every prompt.
+    """
+    with _num_ctx_lock:
+        num_ctx = max(num_ctx, _num_ctx_held.get(model, 0))
+        _num_ctx_held[model] = num_ctx
+        return num_ctx
+
+
+def fit_prompt(template: str, fill_field: str, content: str, reserved_output: int,
+               max_content_tokens: int = None, model: str = None, **fields):
+    """Formats a template so that template, schema and content fit into NUM_CTX minus reserved output.
+
+    Only `fill_field` is shortened. Returns the prompt and the smallest num_ctx that holds it.
+    """
+    content = content or ""
+    base_tokens = count_tokens(template.format(**{fill_field: ""}, **fields), model)
+    available = int((NUM_CTX - reserved_output) / (1 + TOKEN_SAFETY_MARGIN)) - base_tokens
+    if max_content_tokens is not None:
+        available = min(available, max_content_tokens)
+
+    if available <= 0:
+        print(f"  [TOKENS] Prompt without '{fill_field}' already exceeds the context budget.")
+        fitted = ""
+    else:
+        fitted = truncate_to_tokens(content, available, model)
+
+    prompt = template.format(**{fill_field: fitted}, **fields)
+    needed = math.ceil(count_tokens(prompt, model) * (1 + TOKEN_SAFETY_MARGIN)) + reserved_output
+    return prompt, pick_num_ctx(needed)